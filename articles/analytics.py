@@ -0,0 +1,197 @@
+"""
+Buffered article view counters.
+
+``record_view`` only increments an in-process counter keyed by (workspace,
+article, day). Every ``FLUSH_INTERVAL`` seconds (and at interpreter exit)
+the counters are written with one multi-row upsert per batch that adds to
+ArticleDailyViews, so a popular article costs one statement per flush
+rather than one UPDATE per read, and several processes can flush into the
+same rows.
+
+Top-N lists come from ReadRanking: after a flush, the workspaces that got
+views have their ranking recomputed, at most once per RANKING_INTERVAL
+seconds per process. Rankings older than RANKING_MAX_AGE are recomputed on
+read, and the rank_articles command recomputes every workspace.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.db import close_old_connections, connections, router, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from config.sharding import use_workspace
+from .models import Article, ArticleDailyViews, ReadRanking
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 5.0
+# Rows per INSERT; 4 parameters each keeps us under SQLite's 999 limit
+UPSERT_BATCH = 200
+
+RANKING_DAYS = 7
+RANKING_SIZE = 50
+RANKING_INTERVAL = 60
+RANKING_MAX_AGE = timedelta(hours=1)
+
+
+def _upsert(counts):
+    using = router.db_for_write(ArticleDailyViews)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    table = quote(ArticleDailyViews._meta.db_table)
+    columns = ", ".join(quote(column) for column in ("workspace_id", "article_id", "day", "views"))
+
+    # Sorted, so concurrent flushes lock rows in the same order
+    rows = sorted(counts.items())
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH):
+            batch = rows[start:start + UPSERT_BATCH]
+            params = []
+            for (workspace_id, article_id, day), views in batch:
+                params += [workspace_id, article_id, connection.ops.adapt_datefield_value(day), views]
+            # ON CONFLICT ... DO UPDATE: PostgreSQL and SQLite 3.24+
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) VALUES "
+                + ", ".join(["(%s, %s, %s, %s)"] * len(batch))
+                + f" ON CONFLICT ({quote('article_id')}, {quote('day')}) DO UPDATE"
+                f" SET {quote('views')} = {table}.{quote('views')} + EXCLUDED.{quote('views')}",
+                params
+            )
+
+
+class ViewCounter:
+
+    def __init__(self, interval=FLUSH_INTERVAL):
+        self.interval = interval
+        self.counts = Counter()
+        self.ranked_at = {}
+        self.lock = threading.Lock()
+        self.flusher = None
+
+    def increment(self, workspace_id, article_id, amount=1):
+        key = (workspace_id, article_id, timezone.now().date())
+        with self.lock:
+            self.counts[key] += amount
+            self._ensure_flusher()
+
+    def flush(self):
+        """Write the buffered counts. Returns how many views were written."""
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+
+        if not counts:
+            return 0
+
+        try:
+            _upsert(counts)
+        except Exception:
+            logger.exception("Could not flush %d view counters; keeping them", len(counts))
+            with self.lock:
+                self.counts.update(counts)
+            return 0
+
+        self._rerank({workspace_id for workspace_id, _, _ in counts})
+        return sum(counts.values())
+
+    def _rerank(self, workspace_ids):
+        now = time.monotonic()
+        for workspace_id in workspace_ids:
+            if now - self.ranked_at.get(workspace_id, float("-inf")) < RANKING_INTERVAL:
+                continue
+            self.ranked_at[workspace_id] = now
+            try:
+                refresh_ranking(workspace_id)
+            except Exception:
+                logger.exception("Ranking workspace %s failed", workspace_id)
+
+    def _ensure_flusher(self):
+        if self.flusher is None or not self.flusher.is_alive():
+            self.flusher = threading.Thread(target=self._run, daemon=True)
+            self.flusher.start()
+
+    def _run(self):
+        stop = threading.Event()
+        while not stop.wait(self.interval):
+            close_old_connections()
+            self.flush()
+
+
+counter = ViewCounter()
+atexit.register(counter.flush)
+
+
+def record_view(article):
+    counter.increment(article.workspace_id, article.pk)
+
+
+def article_views(article_id, days=30):
+    """Total views of an article and its daily counts for the last ``days`` days."""
+    rows = ArticleDailyViews.objects.filter(article_id=article_id)
+    since = timezone.now().date() - timedelta(days=days - 1)
+    return {
+        "total": rows.aggregate(total=Sum("views"))["total"] or 0,
+        "daily": [
+            {"day": day.isoformat(), "views": views}
+            for day, views in rows.filter(day__gte=since).order_by("day").values_list("day", "views")
+        ],
+    }
+
+
+# ---------------- RANKING ---------------- #
+
+def refresh_ranking(workspace_id):
+    since = timezone.now().date() - timedelta(days=RANKING_DAYS - 1)
+    top = ArticleDailyViews.objects.filter(
+        workspace_id=workspace_id,
+        day__gte=since
+    ).values("article_id").annotate(total=Sum("views")).order_by("-total", "article_id")
+
+    ranking, _ = ReadRanking.objects.update_or_create(
+        workspace_id=workspace_id,
+        defaults={
+            "entries": [[row["article_id"], row["total"]] for row in top[:RANKING_SIZE]],
+            "computed_at": timezone.now(),
+        }
+    )
+    return ranking
+
+
+def refresh_all_rankings():
+    """Recompute the ranking of every workspace with recent views. Returns how many."""
+    since = timezone.now().date() - timedelta(days=RANKING_DAYS - 1)
+    workspace_ids = set(
+        ArticleDailyViews.objects.filter(day__gte=since).values_list(
+            "workspace_id", flat=True
+        ).distinct()
+    )
+    # Workspaces whose views have all aged out get an empty ranking
+    workspace_ids.update(ReadRanking.objects.values_list("workspace_id", flat=True))
+    for workspace_id in workspace_ids:
+        refresh_ranking(workspace_id)
+    return len(workspace_ids)
+
+
+def top_articles(workspace_id, limit=10):
+    """The workspace's most read articles this week, with their current titles."""
+    ranking = ReadRanking.objects.filter(workspace_id=workspace_id).first()
+    if ranking is None or timezone.now() - ranking.computed_at > RANKING_MAX_AGE:
+        ranking = refresh_ranking(workspace_id)
+
+    entries = ranking.entries[:limit * 2]
+    with use_workspace(workspace_id):
+        titles = dict(
+            Article.objects.filter(
+                pk__in=[article_id for article_id, _ in entries],
+                current_version__isnull=False
+            ).values_list("pk", "title")
+        )
+    return [
+        {"article_id": article_id, "title": titles[article_id], "views": views}
+        for article_id, views in entries
+        if article_id in titles
+    ][:limit]
@@ -0,0 +1,261 @@
+"""
+Async versions of the article read/create endpoints.
+
+These run natively on the ASGI stack: database access goes through
+Django's async ORM and the Drive upload through an async HTTP client, so a
+single worker can keep many slow Drive calls in flight instead of holding
+a thread per request. DRF function views are sync-only, so these are plain
+Django views that authenticate the JWT bearer token themselves.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.exceptions import AuthenticationFailed
+
+from apps.users.authentication import WorkspaceJWTAuthentication
+from config.sharding import get_by_pk, on_shard, shards_for
+from apps.workspaces.models import WorkspaceMembership
+from apps.workspaces.permissions import EDIT_ROLES, get_workspace_role
+from .analytics import record_view
+from .models import Article
+from .rendering import rendered_html
+from .services import EditConflict, acreate_new_version
+
+
+MAX_PAGE_SIZE = 200
+
+
+async def _authenticate(request):
+    """Return the JWT user, or None. Only bearer tokens are accepted, which
+    is why these views can be CSRF-exempt."""
+    # Sub-requests of a batch (config.batch) arrive authenticated
+    user = getattr(request, "_force_auth_user", None)
+    if user is not None:
+        return user
+
+    try:
+        result = await sync_to_async(WorkspaceJWTAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+def _unauthorized():
+    return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+
+def _json_object(request):
+    """``(data, None)`` for a JSON object body, else ``(None, 400 response)``."""
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return None, JsonResponse({"detail": "Invalid JSON."}, status=400)
+    if not isinstance(data, dict):
+        return None, JsonResponse({"detail": "Expected a JSON object."}, status=400)
+
+    for field in ("title", "content", "change_summary", "folder_id"):
+        if data.get(field) is not None and not isinstance(data[field], str):
+            return None, JsonResponse({field: ["Not a valid string."]}, status=400)
+    return data, None
+
+
+def _as_id(value):
+    """An id given as a number or a string of digits, else None."""
+    if type(value) is int and value >= 0:
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+
+async def _workspace_role(user, workspace_id):
+    """The user's role, from the token's claims when it carries them."""
+    if getattr(user, "workspace_roles", None) is not None:
+        return get_workspace_role(user, workspace_id)
+    return await sync_to_async(get_workspace_role)(user, workspace_id)
+
+
+def _article_json(article, version=None, html=None):
+    data = {
+        "id": article.id,
+        "workspace": article.workspace_id,
+        "title": article.title,
+        "excerpt": article.excerpt,
+        "status": article.status,
+        "created_at": article.created_at.isoformat(),
+        "updated_at": article.updated_at.isoformat(),
+    }
+    if version is not None:
+        data["current_version"] = {
+            "id": version.id,
+            "version_number": version.version_number,
+            "title": version.title,
+            "content": version.content,
+            "drive_link": version.drive_link,
+        }
+        if html is not None:
+            data["current_version"]["html"] = html
+    return data
+
+
+@require_GET
+async def article_list(request):
+    user = await _authenticate(request)
+    if user is None:
+        return _unauthorized()
+
+    try:
+        limit = min(int(request.GET.get("limit", 50)), MAX_PAGE_SIZE)
+    except ValueError:
+        limit = 50
+
+    workspace = request.GET.get("workspace")
+    if workspace and not workspace.isdigit():
+        return JsonResponse({"detail": "workspace must be an id."}, status=400)
+
+    # Memberships live on default and articles on their workspace's shard,
+    # so resolve the workspace ids first (from the token when it carries
+    # them) instead of joining
+    roles = getattr(user, "workspace_roles", None)
+    if roles is not None:
+        workspace_ids = list(roles)
+    else:
+        workspace_ids = [
+            workspace_id
+            async for workspace_id in WorkspaceMembership.objects.filter(
+                user=user
+            ).values_list("workspace_id", flat=True)
+        ]
+    if workspace:
+        workspace_ids = [w for w in workspace_ids if w == int(workspace)]
+
+    found = []
+    for alias, ids in (await sync_to_async(shards_for)(workspace_ids)).items():
+        shard_articles = on_shard(Article.objects.all(), alias).filter(workspace_id__in=ids)
+        found += [article async for article in shard_articles[:limit]]
+
+    # Each shard's page is newest first; merge them
+    found.sort(key=lambda article: article.created_at, reverse=True)
+    results = [_article_json(article) for article in found[:limit]]
+    return JsonResponse({"results": results})
+
+
+@require_GET
+async def article_detail(request, pk):
+    user = await _authenticate(request)
+    if user is None:
+        return _unauthorized()
+
+    article = await sync_to_async(get_by_pk)(Article, pk)
+    is_member = (
+        article is not None
+        and await _workspace_role(user, article.workspace_id) is not None
+    )
+    if not is_member:
+        return JsonResponse({"detail": "Not found."}, status=404)
+
+    record_view(article)
+    version = await article.versions.filter(is_current=True).afirst()
+    html = None
+    if version is not None:
+        html = await sync_to_async(rendered_html)(version, article.workspace_id)
+
+    return JsonResponse(_article_json(article, version, html))
+
+
+@csrf_exempt
+@require_POST
+async def article_create(request):
+    user = await _authenticate(request)
+    if user is None:
+        return _unauthorized()
+
+    data, error = _json_object(request)
+    if error is not None:
+        return error
+
+    workspace_id = _as_id(data.get("workspace"))
+    if workspace_id is None:
+        return JsonResponse({"workspace": ["A valid integer is required."]}, status=400)
+    if await _workspace_role(user, workspace_id) not in EDIT_ROLES:
+        return JsonResponse({"detail": "Not allowed in this workspace."}, status=403)
+
+    article = await Article.objects.acreate(
+        workspace_id=workspace_id,
+        created_by=user
+    )
+
+    version = None
+    if data.get("title"):
+        try:
+            version = await acreate_new_version(
+                article,
+                data["title"],
+                data.get("content") or "",
+                user,
+                summary=data.get("change_summary") or "",
+                folder_id=data.get("folder_id")
+            )
+        except Exception:
+            # The upload runs outside any transaction; don't leave an
+            # article without a version behind
+            await article.adelete()
+            raise
+
+    return JsonResponse(_article_json(article, version), status=201)
+
+
+@csrf_exempt
+@require_POST
+async def version_create(request, pk):
+    user = await _authenticate(request)
+    if user is None:
+        return _unauthorized()
+
+    data, error = _json_object(request)
+    if error is not None:
+        return error
+
+    if not data.get("title"):
+        return JsonResponse({"title": ["This field is required."]}, status=400)
+
+    # The version the editor started from; omitted, the edit is applied to
+    # whatever is current
+    base_version = data.get("base_version")
+    if base_version is not None and (type(base_version) is not int or base_version < 0):
+        return JsonResponse({"base_version": ["A valid integer is required."]}, status=400)
+
+    article = await sync_to_async(get_by_pk)(Article, pk)
+    can_edit = (
+        article is not None
+        and await _workspace_role(user, article.workspace_id) in EDIT_ROLES
+    )
+    if not can_edit:
+        return JsonResponse({"detail": "Not found."}, status=404)
+
+    try:
+        version = await acreate_new_version(
+            article,
+            data["title"],
+            data.get("content") or "",
+            user,
+            summary=data.get("change_summary") or "",
+            folder_id=data.get("folder_id"),
+            base_version=base_version
+        )
+    except EditConflict as exc:
+        current = exc.current
+        return JsonResponse({
+            "detail": str(exc),
+            "current_version": current and {
+                "version_number": current.version_number,
+                "title": current.title,
+                "content": current.content,
+            },
+            "conflicts": exc.conflicts,
+        }, status=409)
+
+    return JsonResponse(_article_json(article, version), status=201)
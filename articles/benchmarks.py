@@ -0,0 +1,174 @@
+"""
+Benchmark scenarios for the hot article/workspace paths.
+
+Each scenario is a callable taking a ``random.Random`` and a prepared
+context; ``run_scenario`` times it and counts its queries. Results are
+plain dicts so they can be dumped to JSON and compared across commits.
+"""
+import random
+import statistics
+import threading
+import time
+
+from django.db import OperationalError, connection
+
+from apps.workspaces.models import Workspace, WorkspaceMembership
+from config.profiling import QueryRecorder
+from config.sharding import each_shard, get_by_pk, use_workspace
+
+from .models import Article, ArticleVersion
+from .serializers import ArticleSerializer
+from .services import create_new_version
+
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def build_context():
+    article_ids = []
+    for shard in each_shard(Article.objects.values_list("id", flat=True)):
+        article_ids.extend(shard[:10000])
+    return {
+        "workspace_ids": list(Workspace.objects.values_list("id", flat=True)[:1000]),
+        "article_ids": article_ids,
+        "memberships": list(
+            WorkspaceMembership.objects.values_list("user_id", "workspace_id")[:10000]
+        ),
+    }
+
+
+# ---------------- SCENARIOS ---------------- #
+
+@scenario("article_list")
+def article_list(rng, context):
+    workspace_id = rng.choice(context["workspace_ids"])
+    with use_workspace(workspace_id):
+        articles = Article.objects.filter(workspace_id=workspace_id).prefetch_related("tags")[:50]
+        return ArticleSerializer(articles, many=True).data
+
+
+@scenario("version_create")
+def version_create(rng, context):
+    # The version file goes to the configured ``versions`` storage; run with
+    # VERSION_STORAGE=local (or the fake Drive server) to keep network time
+    # out of the numbers.
+    article = get_by_pk(Article, rng.choice(context["article_ids"]))
+    return create_new_version(
+        article, f"Benchmark edit {rng.randrange(10 ** 6)}", "benchmark", None
+    )
+
+
+@scenario("permission_check")
+def permission_check(rng, context):
+    user_id, workspace_id = rng.choice(context["memberships"])
+    return WorkspaceMembership.objects.filter(
+        user_id=user_id,
+        workspace_id=workspace_id,
+        role__in=[WorkspaceMembership.Role.OWNER, WorkspaceMembership.Role.EDITOR],
+    ).exists()
+
+
+@scenario("search")
+def search(rng, context):
+    workspace_id = rng.choice(context["workspace_ids"])
+    term = rng.choice(["release", "policy", "deploy", "cache", "audit"])
+    with use_workspace(workspace_id):
+        return list(
+            ArticleVersion.objects.filter(
+                is_current=True,
+                article__workspace_id=workspace_id,
+                title__icontains=term,
+            ).values("article_id", "title")[:20]
+        )
+
+
+# ---------------- RUNNER ---------------- #
+
+def run_scenario(name, iterations, warmup=5, seed=0, context=None):
+    func = SCENARIOS[name]
+    rng = random.Random(seed)
+    context = context if context is not None else build_context()
+
+    for _ in range(warmup):
+        func(rng, context)
+
+    latencies = []
+    queries = []
+    for _ in range(iterations):
+        recorder = QueryRecorder()
+        with recorder.record():
+            start = time.perf_counter()
+            func(rng, context)
+            latencies.append((time.perf_counter() - start) * 1000)
+        queries.append(recorder.count)
+
+    return {
+        "iterations": iterations,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p90_ms": round(percentile(latencies, 90), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "max_ms": round(max(latencies), 3),
+        "queries_p50": percentile(queries, 50),
+        "queries_max": max(queries),
+    }
+
+
+def run_concurrent(names, threads, duration, seed=0, context=None):
+    """
+    Run the given scenarios from ``threads`` threads for ``duration``
+    seconds and report throughput. Each thread uses its own connection, so
+    this exercises the database's locking rather than Python's.
+    """
+    context = context if context is not None else build_context()
+    deadline = time.perf_counter() + duration
+    totals = {"ops": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        ops = errors = 0
+        try:
+            while time.perf_counter() < deadline:
+                try:
+                    SCENARIOS[rng.choice(names)](rng, context)
+                    ops += 1
+                except OperationalError:
+                    # "database is locked" and friends
+                    errors += 1
+        finally:
+            connection.close()
+            with lock:
+                totals["ops"] += ops
+                totals["errors"] += errors
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+    return {
+        "threads": threads,
+        "duration_s": duration,
+        "scenarios": list(names),
+        "ops": totals["ops"],
+        "errors": totals["errors"],
+        "ops_per_s": round(totals["ops"] / duration, 1),
+    }
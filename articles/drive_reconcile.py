@@ -0,0 +1,206 @@
+"""
+Drive metadata reconciliation.
+
+Walks every ArticleVersion with a ``drive_file_id`` (on every shard, in
+primary-key order) and asks Drive whether the file still exists. Lookups
+go out as batch requests of up to DRIVE_BATCH_LIMIT calls, at most
+``concurrency`` batches in flight, paced by a token bucket so the job stays
+under the project's Drive quota.
+
+A file that is gone (404) or in the trash gets ``drive_missing_at`` set; a
+file that reappears has it cleared, and a changed ``webViewLink`` is copied
+to ``drive_link``. Progress is checkpointed in DriveReconcileRun after
+every window of batches, so a killed run resumes where it stopped.
+"""
+import asyncio
+import logging
+import random
+import time
+
+from django.utils import timezone
+
+from config.sharding import all_aliases
+from .models import ArticleVersion, DriveReconcileRun
+from .services import DRIVE_BATCH_LIMIT, get_drive_files_batch_async
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 4
+# Drive's default quota is 12,000 queries per minute per project
+DEFAULT_RATE = 150
+MAX_ATTEMPTS = 5
+RETRY_STATUSES = {403, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Allows ``rate`` calls per second on average, bursts up to ``capacity``."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, count=1):
+        # Waiters queue on the lock, so they are served in order
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= count:
+                    self.tokens -= count
+                    return
+                await asyncio.sleep((count - self.tokens) / self.rate)
+
+
+def _retryable(status, body):
+    if status is None:
+        return True
+    if status == 403:
+        # Permission errors are final; only quota errors are worth a retry
+        reasons = {
+            error.get("reason")
+            for error in body.get("error", {}).get("errors", [])
+        }
+        return bool(reasons & {"rateLimitExceeded", "userRateLimitExceeded"})
+    return status in RETRY_STATUSES
+
+
+class Reconciler:
+
+    def __init__(self, run, batch_size=DRIVE_BATCH_LIMIT, concurrency=DEFAULT_CONCURRENCY,
+                 rate=DEFAULT_RATE, on_progress=None):
+        self.run = run
+        self.batch_size = min(batch_size, DRIVE_BATCH_LIMIT)
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate, capacity=max(rate, self.batch_size))
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.on_progress = on_progress
+
+    async def _lookup(self, file_ids):
+        """Drive's ``(status, body)`` per file id, retrying throttled calls."""
+        results = {}
+        pending = list(dict.fromkeys(file_ids))
+
+        for attempt in range(MAX_ATTEMPTS):
+            if attempt:
+                await asyncio.sleep(min(2 ** attempt, 30) * (0.5 + random.random()))
+
+            await self.bucket.acquire(len(pending))
+            async with self.semaphore:
+                try:
+                    replies = await get_drive_files_batch_async(pending)
+                except Exception as exc:
+                    logger.warning("Drive batch failed (attempt %d): %s", attempt + 1, exc)
+                    continue
+
+            retry = []
+            for file_id, (status, body) in zip(pending, replies):
+                results[file_id] = (status, body)
+                if _retryable(status, body):
+                    retry.append(file_id)
+            pending = retry
+            if not pending:
+                break
+
+        return results
+
+    def _apply(self, rows, results, now):
+        """Returns the versions to update and bumps the run's counters."""
+        run = self.run
+        changed = []
+
+        for pk, file_id, link, missing_at in rows:
+            status, body = results.get(file_id, (None, {}))
+            run.checked += 1
+
+            if status == 404 or (status == 200 and body.get("trashed")):
+                run.missing += 1
+                if missing_at is None:
+                    changed.append(ArticleVersion(
+                        pk=pk, drive_link=link, drive_missing_at=now, updated_at=now
+                    ))
+            elif status == 200:
+                new_link = body.get("webViewLink") or link
+                if missing_at is not None:
+                    run.restored += 1
+                if new_link != link:
+                    run.relinked += 1
+                if missing_at is not None or new_link != link:
+                    changed.append(ArticleVersion(
+                        pk=pk, drive_link=new_link, drive_missing_at=None, updated_at=now
+                    ))
+            else:
+                run.errors += 1
+
+        return changed
+
+    async def _reconcile_alias(self, alias):
+        versions = ArticleVersion.objects.using(alias).filter(
+            drive_file_id__gt=""
+        ).order_by("pk").values_list("pk", "drive_file_id", "drive_link", "drive_missing_at")
+        window = self.batch_size * self.concurrency
+        last_id = self.run.positions.get(alias, 0)
+
+        while True:
+            rows = [row async for row in versions.filter(pk__gt=last_id)[:window]]
+            if not rows:
+                break
+
+            file_ids = [row[1] for row in rows]
+            batches = [
+                file_ids[start:start + self.batch_size]
+                for start in range(0, len(file_ids), self.batch_size)
+            ]
+            results = {}
+            for found in await asyncio.gather(*(self._lookup(batch) for batch in batches)):
+                results.update(found)
+
+            changed = self._apply(rows, results, timezone.now())
+            if changed:
+                await ArticleVersion.objects.using(alias).abulk_update(
+                    changed, ["drive_link", "drive_missing_at", "updated_at"]
+                )
+
+            last_id = rows[-1][0]
+            self.run.positions[alias] = last_id
+            await self.run.asave()
+
+            if self.on_progress:
+                self.on_progress(self.run)
+
+    async def reconcile(self):
+        try:
+            for alias in all_aliases():
+                await self._reconcile_alias(alias)
+        except Exception as exc:
+            self.run.status = DriveReconcileRun.Status.FAILED
+            self.run.error = str(exc)
+            await self.run.asave()
+            raise
+
+        self.run.status = DriveReconcileRun.Status.DONE
+        self.run.finished_at = timezone.now()
+        await self.run.asave()
+        return self.run
+
+
+def resume_or_start(restart=False):
+    """The newest unfinished run, or a new one."""
+    unfinished = DriveReconcileRun.objects.exclude(status=DriveReconcileRun.Status.DONE)
+    run = None if restart else unfinished.order_by("-pk").first()
+    if restart:
+        unfinished.update(status=DriveReconcileRun.Status.FAILED, error="Superseded")
+    if run is None:
+        return DriveReconcileRun.objects.create()
+
+    run.status = DriveReconcileRun.Status.RUNNING
+    run.error = ""
+    run.save(update_fields=["status", "error", "updated_at"])
+    return run
+
+
+async def reconcile_drive(run, **options):
+    return await Reconciler(run, **options).reconcile()
@@ -0,0 +1,421 @@
+"""
+Document text extraction and search indexing.
+
+New documents get a DocumentExtraction job (signals). ``ExtractionRunner``
+(the extract_documents command) claims pending jobs and parses each file
+in its own worker process, at most ``workers`` at a time, outside the
+request path. Every worker is killed after ``time_limit`` seconds and is
+capped at ``memory_limit`` bytes of address space (articles.extractors).
+
+The worker writes the text to a temporary file. The runner streams it into
+the search index as overlapping TextChunk rows, a batch at a time, so
+neither process holds a large document's text in memory. Text is cached
+by the file's SHA-256: a file whose bytes were extracted before is indexed
+without starting a worker.
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, router
+from django.db.models import Exists, F, Min, OuterRef, Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from config.sharding import each_shard, get_by_pk, on_shard, shard_for
+from . import extractors
+from .models import Document, DocumentExtraction, ExtractedText, TextChunk
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+TIME_LIMIT = 60
+MEMORY_LIMIT = 512 * 1024 * 1024
+MAX_FILE_SIZE = 200 * 1024 * 1024
+MAX_CHARS = 5_000_000
+MAX_ATTEMPTS = 3
+
+CHUNK_CHARS = 2000
+# Repeated at the start of the next chunk so matches can span a boundary
+CHUNK_OVERLAP = 100
+CHUNK_BATCH = 200
+
+HASH_BLOCK = 1024 * 1024
+POLL_INTERVAL = 0.05
+IDLE_INTERVAL = 2.0
+
+Status = DocumentExtraction.Status
+
+
+def enqueue(document):
+    DocumentExtraction.objects.update_or_create(
+        document_id=document.pk,
+        defaults={
+            "workspace_id": document.workspace_id,
+            "status": Status.PENDING,
+            "attempts": 0,
+            "error": "",
+        }
+    )
+
+
+def enqueue_missing():
+    """Create jobs for documents that have none. Returns how many."""
+    known = set(DocumentExtraction.objects.values_list("document_id", flat=True))
+    created = 0
+    for documents in each_shard(Document.objects.only("pk", "workspace_id")):
+        missing = [
+            DocumentExtraction(document_id=document.pk, workspace_id=document.workspace_id)
+            for document in documents.iterator()
+            if document.pk not in known
+        ]
+        DocumentExtraction.objects.bulk_create(missing, batch_size=1000, ignore_conflicts=True)
+        created += len(missing)
+    return created
+
+
+# ---------------- CACHE + INDEX ---------------- #
+
+def _chunks(handle):
+    """Overlapping CHUNK_CHARS slices of an open text file, with their new characters."""
+    tail = ""
+    while True:
+        block = handle.read(CHUNK_CHARS - len(tail))
+        if not block:
+            break
+        text = tail + block
+        yield text, len(block)
+        tail = text[-CHUNK_OVERLAP:]
+
+
+def index_text(sha256, text_path, truncated=False):
+    """Stream an extracted text file into the index under ``sha256``."""
+    extracted, created = ExtractedText.objects.get_or_create(sha256=sha256)
+    if not created:
+        if extracted.complete:
+            return extracted
+        # A runner died mid-write; start the chunks over
+        extracted.chunks.all().delete()
+
+    position = 0
+    chars = 0
+    batch = []
+    with open(text_path, encoding="utf-8") as handle:
+        for text, added in _chunks(handle):
+            batch.append(TextChunk(extracted=extracted, position=position, text=text))
+            position += 1
+            chars += added
+            if len(batch) >= CHUNK_BATCH:
+                TextChunk.objects.bulk_create(batch)
+                batch = []
+    TextChunk.objects.bulk_create(batch)
+
+    extracted.chunk_count = position
+    extracted.char_count = chars
+    extracted.truncated = truncated
+    extracted.complete = True
+    extracted.save()
+    return extracted
+
+
+def _stage(document, directory):
+    """
+    Copy/locate the file and hash it. Returns ``(path, sha256)``; the path
+    is the storage's own file when it has one.
+    """
+    storage = document.file.storage
+    digest = hashlib.sha256()
+
+    try:
+        path = storage.path(document.file.name)
+    except NotImplementedError:
+        path = os.path.join(directory, "source")
+        with document.file.open("rb") as source, open(path, "wb") as target:
+            while block := source.read(HASH_BLOCK):
+                digest.update(block)
+                target.write(block)
+        return path, digest.hexdigest()
+
+    with open(path, "rb") as source:
+        while block := source.read(HASH_BLOCK):
+            digest.update(block)
+    return path, digest.hexdigest()
+
+
+# ---------------- RUNNER ---------------- #
+
+def _finish(job, status, error="", sha256=None):
+    job.status = status
+    job.error = error[:2000]
+    job.finished_at = timezone.now()
+    if sha256 is not None:
+        job.sha256 = sha256
+    job.save(update_fields=["status", "error", "finished_at", "sha256"])
+
+
+def _retry_or_fail(job, error):
+    if job.attempts < MAX_ATTEMPTS:
+        job.status = Status.PENDING
+        job.error = error[:2000]
+        job.save(update_fields=["status", "error"])
+    else:
+        _finish(job, Status.FAILED, error)
+
+
+class _Task:
+
+    def __init__(self, job, process, directory, out_path, sha256):
+        self.job = job
+        self.process = process
+        self.directory = directory
+        self.out_path = out_path
+        self.sha256 = sha256
+        self.started = time.monotonic()
+
+
+class ExtractionRunner:
+
+    def __init__(self, workers=DEFAULT_WORKERS, time_limit=TIME_LIMIT,
+                 memory_limit=MEMORY_LIMIT, max_chars=MAX_CHARS):
+        self.workers = workers
+        self.time_limit = time_limit
+        self.memory_limit = memory_limit
+        self.max_chars = max_chars
+        # spawn: a forked child would inherit the parent's DB connections
+        # and background threads
+        self.context = multiprocessing.get_context("spawn")
+        self.tasks = []
+        self.stats = {status: 0 for status in Status.values}
+
+    def claim(self):
+        """Atomically take the oldest pending (or abandoned) job."""
+        stale = timezone.now() - timedelta(seconds=self.time_limit * 5)
+        candidates = DocumentExtraction.objects.filter(
+            Q(status=Status.PENDING) | Q(status=Status.RUNNING, started_at__lt=stale)
+        ).order_by("id").values_list("pk", "status", "started_at")
+
+        for pk, status, started_at in candidates[:20]:
+            # Compare-and-set: only one runner wins a given job
+            claimed = DocumentExtraction.objects.filter(
+                pk=pk, status=status, started_at=started_at
+            ).update(
+                status=Status.RUNNING,
+                started_at=timezone.now(),
+                attempts=F("attempts") + 1
+            )
+            if claimed:
+                return DocumentExtraction.objects.get(pk=pk)
+        return None
+
+    def _record(self, job, status, **kwargs):
+        _finish(job, status, **kwargs)
+        self.stats[status] += 1
+
+    def start(self, job):
+        """Start a worker for ``job``, or finish it straight away."""
+        document = get_by_pk(Document, job.document_id)
+        if document is None:
+            job.delete()
+            return
+
+        mime_type = extractors.resolve_type(document.mime_type, document.file.name)
+        if not extractors.supports(mime_type):
+            self._record(job, Status.UNSUPPORTED, error=f"No extractor for {mime_type}")
+            return
+        if document.file_size > MAX_FILE_SIZE:
+            self._record(job, Status.FAILED, error="File too large")
+            return
+
+        directory = tempfile.mkdtemp(prefix="extract-")
+        try:
+            path, sha256 = _stage(document, directory)
+        except OSError as exc:
+            shutil.rmtree(directory, ignore_errors=True)
+            _retry_or_fail(job, f"Could not read file: {exc}")
+            return
+
+        if ExtractedText.objects.filter(sha256=sha256, complete=True).exists():
+            shutil.rmtree(directory, ignore_errors=True)
+            self._record(job, Status.DONE, sha256=sha256)
+            return
+
+        out_path = os.path.join(directory, "text")
+        process = self.context.Process(
+            target=extractors.run,
+            args=(path, mime_type, out_path),
+            kwargs={
+                "cpu_seconds": self.time_limit,
+                "memory_bytes": self.memory_limit,
+                "max_chars": self.max_chars,
+            },
+            daemon=True
+        )
+        process.start()
+        self.tasks.append(_Task(job, process, directory, out_path, sha256))
+
+    def _complete(self, task):
+        job = task.job
+        code = task.process.exitcode
+        error_path = task.out_path + ".error"
+        error = ""
+        if os.path.exists(error_path):
+            with open(error_path, encoding="utf-8") as handle:
+                error = handle.read()
+
+        if code == extractors.OK:
+            try:
+                index_text(
+                    task.sha256,
+                    task.out_path,
+                    truncated=os.path.exists(task.out_path + ".truncated")
+                )
+            except IntegrityError:
+                # Another runner indexed the same content concurrently
+                pass
+            self._record(job, Status.DONE, sha256=task.sha256)
+        elif code == extractors.UNSUPPORTED:
+            self._record(job, Status.UNSUPPORTED, error=error)
+        elif code == extractors.LIMIT_EXCEEDED:
+            self._record(job, Status.FAILED, error=error)
+        elif code is not None and code < 0:
+            # Killed: our wall-clock limit, RLIMIT_CPU (SIGXCPU) or the OOM killer
+            self._record(job, Status.FAILED, error=error or f"Worker killed by signal {-code}")
+        else:
+            _retry_or_fail(job, error or f"Worker exited with {code}")
+
+    def reap(self):
+        running = []
+        for task in self.tasks:
+            if task.process.is_alive():
+                if time.monotonic() - task.started <= self.time_limit:
+                    running.append(task)
+                    continue
+                task.process.kill()
+                task.process.join()
+                self._record(task.job, Status.FAILED, error="Time limit exceeded")
+            else:
+                task.process.join()
+                self._complete(task)
+            shutil.rmtree(task.directory, ignore_errors=True)
+        self.tasks = running
+
+    def run(self, once=False):
+        """
+        Process jobs until interrupted, or until the queue is empty when
+        ``once`` is set. Returns counts per final status.
+        """
+        try:
+            while True:
+                self.reap()
+
+                claimed = False
+                while len(self.tasks) < self.workers:
+                    job = self.claim()
+                    if job is None:
+                        break
+                    claimed = True
+                    try:
+                        self.start(job)
+                    except Exception as exc:
+                        logger.exception("Extraction of document %s failed", job.document_id)
+                        _retry_or_fail(job, str(exc))
+
+                if not self.tasks and not claimed:
+                    if once:
+                        break
+                    time.sleep(IDLE_INTERVAL)
+                else:
+                    time.sleep(POLL_INTERVAL)
+        finally:
+            for task in self.tasks:
+                task.process.kill()
+                task.process.join()
+                shutil.rmtree(task.directory, ignore_errors=True)
+                # Back to the queue for the next runner
+                task.job.status = Status.PENDING
+                task.job.save(update_fields=["status"])
+
+        return self.stats
+
+
+# ---------------- SEARCH ---------------- #
+
+# Full-text indexes on TextChunk.text (migration 0014_textchunk_search)
+_FULL_TEXT = {
+    "sqlite": (
+        "SELECT rowid FROM articles_textchunk_fts WHERE articles_textchunk_fts MATCH %s"
+    ),
+    "postgresql": (
+        "SELECT id FROM articles_textchunk "
+        "WHERE to_tsvector('simple', text) @@ phraseto_tsquery('simple', %s)"
+    ),
+}
+
+
+def _matching_chunks(query):
+    """TextChunks containing the words of ``query`` in order."""
+    vendor = connections[router.db_for_read(TextChunk) or DEFAULT_DB_ALIAS].vendor
+    if vendor == "sqlite":
+        # One FTS5 phrase; quoting keeps the query's own syntax inert
+        params = ['"' + query.replace('"', '""') + '"']
+    elif vendor == "postgresql":
+        params = [query]
+    else:
+        return TextChunk.objects.filter(text__icontains=query)
+    return TextChunk.objects.filter(pk__in=RawSQL(_FULL_TEXT[vendor], params))
+
+
+def _snippet(text, query):
+    lowered = text.lower()
+    start = lowered.find(query.lower())
+    if start < 0:
+        # The index matches words, so punctuation between them may differ
+        start = max(lowered.find(query.split()[0].lower()), 0)
+    return text[max(start - 80, 0):start + len(query) + 80]
+
+
+def search_documents(workspace_id, query, limit=20):
+    """Documents in the workspace whose extracted text contains the words of ``query``."""
+    query = " ".join(query.split())
+    if not query:
+        return []
+
+    matches = _matching_chunks(query)
+    jobs = DocumentExtraction.objects.filter(
+        workspace_id=workspace_id,
+        status=Status.DONE
+    ).filter(
+        Exists(matches.filter(extracted_id=OuterRef("sha256"), extracted__complete=True))
+    ).order_by("-id").values_list("document_id", "sha256")[:limit]
+    jobs = list(jobs)
+    if not jobs:
+        return []
+
+    names = dict(
+        on_shard(Document.objects.all(), shard_for(workspace_id)).filter(
+            pk__in=[document_id for document_id, _ in jobs]
+        ).values_list("pk", "file")
+    )
+    # The first matching chunk of every text, in one query: chunks are
+    # inserted in order, so the lowest id is the lowest position
+    first_chunks = matches.filter(
+        extracted_id__in={sha256 for _, sha256 in jobs}
+    ).values("extracted_id").annotate(first=Min("pk")).values("first")
+    snippets = dict(
+        TextChunk.objects.filter(pk__in=first_chunks).values_list("extracted_id", "text")
+    )
+
+    return [
+        {
+            "document": document_id,
+            "name": os.path.basename(names[document_id]),
+            "snippet": _snippet(snippets[sha256], query) if sha256 in snippets else "",
+        }
+        for document_id, sha256 in jobs
+        if document_id in names
+    ]
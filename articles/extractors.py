@@ -0,0 +1,167 @@
+"""
+Text extractors for uploaded documents.
+
+This module runs inside the extraction worker processes started by
+articles.extraction, so it must not import Django. ``run`` is the process
+entry point: it applies the CPU and memory limits, then writes the file's
+text to ``out_path``. The exit code tells the parent what happened.
+"""
+import fnmatch
+import os
+import sys
+import zipfile
+from xml.etree import ElementTree
+
+OK = 0
+ERROR = 1
+UNSUPPORTED = 3
+LIMIT_EXCEEDED = 4
+
+READ_SIZE = 64 * 1024
+
+# Office formats are zip archives of XML: (members holding text, paragraph tags)
+_OFFICE_MEMBERS = {
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": (
+        ["word/document.xml", "word/header*.xml", "word/footer*.xml", "word/footnotes.xml"],
+        {"p"},
+    ),
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation": (
+        ["ppt/slides/slide*.xml", "ppt/notesSlides/notesSlide*.xml"],
+        {"p"},
+    ),
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": (
+        ["xl/sharedStrings.xml"],
+        {"si"},
+    ),
+    "application/vnd.oasis.opendocument.text": (["content.xml"], {"p", "h"}),
+    "application/vnd.oasis.opendocument.presentation": (["content.xml"], {"p", "h"}),
+    "application/vnd.oasis.opendocument.spreadsheet": (["content.xml"], {"p"}),
+}
+
+_EXTENSIONS = {
+    ".pdf": "application/pdf",
+    ".txt": "text/plain",
+    ".md": "text/markdown",
+    ".csv": "text/csv",
+    ".json": "application/json",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".odt": "application/vnd.oasis.opendocument.text",
+    ".odp": "application/vnd.oasis.opendocument.presentation",
+    ".ods": "application/vnd.oasis.opendocument.spreadsheet",
+}
+
+_TEXT_TYPES = {"application/json", "application/xml", "application/csv"}
+
+
+class Unsupported(Exception):
+    pass
+
+
+def resolve_type(mime_type, name=""):
+    """The mime type to extract as, falling back to the file extension."""
+    mime_type = (mime_type or "").split(";")[0].strip().lower()
+    if _extractor(mime_type) is None:
+        mime_type = _EXTENSIONS.get(os.path.splitext(name)[1].lower(), mime_type)
+    return mime_type
+
+
+def supports(mime_type):
+    return _extractor(mime_type) is not None
+
+
+def _extractor(mime_type):
+    if mime_type.startswith("text/") or mime_type in _TEXT_TYPES:
+        return _plain_text
+    if mime_type == "application/pdf":
+        return _pdf
+    if mime_type in _OFFICE_MEMBERS:
+        return _office
+    return None
+
+
+# ---------------- EXTRACTORS ---------------- #
+
+def _plain_text(path, mime_type):
+    with open(path, encoding="utf-8", errors="replace") as handle:
+        while True:
+            block = handle.read(READ_SIZE)
+            if not block:
+                break
+            yield block
+
+
+def _pdf(path, mime_type):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise Unsupported("pypdf is not installed")
+
+    for page in PdfReader(path).pages:
+        text = page.extract_text() or ""
+        if text:
+            yield text + "\n"
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _office(path, mime_type):
+    patterns, paragraphs = _OFFICE_MEMBERS[mime_type]
+
+    with zipfile.ZipFile(path) as archive:
+        names = sorted(archive.namelist())
+        for pattern in patterns:
+            for name in fnmatch.filter(names, pattern):
+                with archive.open(name) as member:
+                    # iterparse + clear keeps memory flat on large documents
+                    for _, element in ElementTree.iterparse(member):
+                        if _local_name(element.tag) in paragraphs:
+                            yield "".join(element.itertext()) + "\n"
+                            element.clear()
+
+
+# ---------------- WORKER ENTRY POINT ---------------- #
+
+def _apply_limits(cpu_seconds, memory_bytes):
+    try:
+        import resource
+    except ImportError:
+        return  # not available on Windows; the parent's wall-clock limit still applies
+
+    if cpu_seconds:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    if memory_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+
+
+def run(path, mime_type, out_path, cpu_seconds=None, memory_bytes=None, max_chars=None):
+    _apply_limits(cpu_seconds, memory_bytes)
+
+    written = 0
+    try:
+        with open(out_path, "w", encoding="utf-8") as out:
+            for piece in _extractor(mime_type)(path, mime_type):
+                if max_chars is not None and written + len(piece) > max_chars:
+                    out.write(piece[:max_chars - written])
+                    # Marks the text as cut short for the parent
+                    open(out_path + ".truncated", "w").close()
+                    break
+                out.write(piece)
+                written += len(piece)
+    except Unsupported as exc:
+        _fail(out_path, str(exc), UNSUPPORTED)
+    except MemoryError:
+        _fail(out_path, "Memory limit exceeded", LIMIT_EXCEEDED)
+    except Exception as exc:
+        _fail(out_path, f"{type(exc).__name__}: {exc}", ERROR)
+
+    sys.exit(OK)
+
+
+def _fail(out_path, message, code):
+    with open(out_path + ".error", "w", encoding="utf-8") as handle:
+        handle.write(message)
+    sys.exit(code)
@@ -0,0 +1,190 @@
+"""
+A minimal in-process stand-in for the Google Drive REST API, for
+benchmarks and local runs (set DRIVE_API_URL to its address). Responses
+are delayed by ``latency`` seconds to mimic a slow remote service.
+
+Besides uploads it answers ``files.get`` (metadata and ``alt=media``
+downloads), deletes and batch requests (``/batch/drive/v3``), so the
+storage backend and the Drive reconciliation job can run against it.
+With ``calls_per_second`` set, calls over that rate get 429 responses.
+"""
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeDriveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        if "alt=media" in self.path:
+            self._send_media()
+            return
+        status, payload = self.server.get_file(self.path)
+        self._send_json(payload, status)
+
+    def do_DELETE(self):
+        match = re.match(r"/drive/v3/files/([^/?]+)", self.path)
+        if match is None or self.server.files.pop(match.group(1), None) is None:
+            self._send_json(_error(404, "File not found"), 404)
+            return
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _send_media(self):
+        status, payload = self.server.get_file(self.path)
+        if status != 200:
+            self._send_json(payload, status)
+            return
+
+        content = self.server.contents.get(payload["id"], b"")
+        start, end = 0, len(content) - 1
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2) or end), end)
+        body = content[start:end + 1]
+
+        self.send_response(206 if match else 200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        if match:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(content)}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        time.sleep(self.server.latency)
+
+        if self.path.startswith("/upload/drive/v3/files"):
+            self._send_json(self.server.add_file(content=_upload_content(body)))
+        elif self.path.startswith("/batch/drive/v3"):
+            self._send_batch(body)
+        else:
+            self._send_json(_error(404, "Not found"), 404)
+
+    def _send_batch(self, body):
+        match = re.search(r"boundary=\"?([^\";]+)", self.headers.get("Content-Type", ""))
+        if match is None:
+            self._send_json(_error(400, "Missing boundary"), 400)
+            return
+
+        self.server.batches += 1
+        boundary = "batch_" + uuid.uuid4().hex
+        out = []
+        for part in body.decode().split("--" + match.group(1)):
+            head, _, request = part.replace("\r\n", "\n").partition("\n\n")
+            content_id = re.search(r"Content-ID:\s*<([^>]+)>", head, re.IGNORECASE)
+            if content_id is None or not request.strip():
+                continue
+            path = request.strip().split("\n")[0].split(" ")[1]
+            status, payload = self.server.get_file(path)
+            out.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id.group(1)}>\r\n\r\n"
+                f"HTTP/1.1 {status} {self.responses.get(status, ('',))[0]}\r\n"
+                "Content-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{json.dumps(payload)}\r\n"
+            )
+        out.append(f"--{boundary}--")
+
+        payload = "".join(out).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/mixed; boundary={boundary}")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def _upload_content(body):
+    # multipart/related: JSON metadata part, then the media part
+    parts = body.split(b"\r\n--")
+    if len(parts) < 2:
+        return b""
+    return parts[1].split(b"\r\n\r\n", 1)[-1]
+
+
+def _error(code, message):
+    return {"error": {"code": code, "message": message}}
+
+
+class FakeDriveServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Benchmarks open hundreds of connections at once
+    request_queue_size = 128
+
+    def __init__(self, latency=0.0, port=0, calls_per_second=None):
+        super().__init__(("127.0.0.1", port), FakeDriveHandler)
+        self.latency = latency
+        self.calls_per_second = calls_per_second
+        self.files = {}
+        self.contents = {}
+        self.batches = 0
+        self.calls = 0
+        self.throttled = 0
+        self.lock = threading.Lock()
+        self.window = (0, 0)
+
+    def add_file(self, file_id=None, content=b""):
+        file_id = file_id or uuid.uuid4().hex
+        self.contents[file_id] = content
+        self.files[file_id] = {
+            "id": file_id,
+            "trashed": False,
+            "size": str(len(content)),
+            "webViewLink": f"https://drive.google.com/file/d/{file_id}/view",
+        }
+        return self.files[file_id]
+
+    def _throttled(self):
+        with self.lock:
+            self.calls += 1
+            if self.calls_per_second is None:
+                return False
+            second, count = self.window
+            now = int(time.monotonic())
+            count = count + 1 if now == second else 1
+            self.window = (now, count)
+            if count > self.calls_per_second:
+                self.throttled += 1
+                return True
+            return False
+
+    def get_file(self, path):
+        """``(status, payload)`` for a ``GET /drive/v3/files/<id>`` path."""
+        if self._throttled():
+            return 429, _error(429, "Rate Limit Exceeded")
+
+        match = re.match(r"/drive/v3/files/([^/?]+)", path)
+        entry = self.files.get(match.group(1)) if match else None
+        if entry is None:
+            return 404, _error(404, "File not found")
+        return 200, entry
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from config.sharding import each_shard
+from ...models import Article
+from ...services import refresh_current_versions
+
+
+class Command(BaseCommand):
+    help = "Copy each article's current version pointer, title and excerpt onto the article."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workspace", type=int)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        articles = Article.objects.all()
+        if options["workspace"]:
+            articles = articles.filter(workspace_id=options["workspace"])
+
+        count = 0
+        for shard in each_shard(articles):
+            count += refresh_current_versions(shard, options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Updated {count} articles"))
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncRequestFactory, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ... import async_views
+from ...fake_drive import FakeDriveServer
+from ...models import Article
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare version-creation throughput of thread-per-request handling "
+        "against the async endpoint, with Drive replaced by a local fake that "
+        "answers after --drive-latency seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument(
+            "--threads", type=int, default=8,
+            help="Threads of the thread-per-request baseline (a sync worker's --threads)."
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=100,
+            help="In-flight requests on the single async event loop."
+        )
+        parser.add_argument("--drive-latency", type=float, default=0.2)
+        parser.add_argument("--output", help="Write results JSON to this file.")
+
+    def handle(self, *args, **options):
+        # One editor per article: concurrent edits of one article would
+        # measure merge retries and conflicts instead of throughput
+        editors = {}
+        for pk, user_id in Article.objects.filter(
+            workspace__memberships__role__in=async_views.EDIT_ROLES
+        ).order_by("pk").values_list("pk", "workspace__memberships__user").iterator():
+            editors.setdefault(pk, user_id)
+            if len(editors) == options["requests"]:
+                break
+        targets = list(editors.items())
+        if not targets:
+            raise CommandError("No editable articles; run generate_dataset first.")
+
+        users = User.objects.in_bulk({user_id for _, user_id in targets})
+        tokens = {
+            user_id: str(AccessToken.for_user(user))
+            for user_id, user in users.items()
+        }
+        factory = AsyncRequestFactory()
+
+        def build(index):
+            pk, user_id = targets[index % len(targets)]
+            request = factory.post(
+                f"/api/articles/async/{pk}/versions/",
+                data=json.dumps({"title": f"Benchmark {index}", "content": "benchmark"}),
+                content_type="application/json",
+                headers={"Authorization": f"Bearer {tokens[user_id]}"},
+            )
+            return request, pk
+
+        drive = FakeDriveServer(latency=options["drive_latency"]).start()
+        total = options["requests"]
+
+        with override_settings(DRIVE_API_URL=drive.url, DRIVE_API_TOKEN="fake"):
+            # Baseline: each request occupies a thread for its whole duration
+            def blocking(index):
+                request, pk = build(index)
+                return async_to_sync(async_views.version_create)(request, pk=pk).status_code
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+                sync_statuses = list(pool.map(blocking, range(total)))
+            sync_elapsed = time.perf_counter() - start
+
+            # Async: one event loop overlaps the Drive calls
+            async def run_async():
+                semaphore = asyncio.Semaphore(options["concurrency"])
+
+                async def one(index):
+                    async with semaphore:
+                        request, pk = build(index)
+                        response = await async_views.version_create(request, pk=pk)
+                        return response.status_code
+
+                return await asyncio.gather(*(one(i) for i in range(total)))
+
+            start = time.perf_counter()
+            async_statuses = async_to_sync(run_async)()
+            async_elapsed = time.perf_counter() - start
+
+        drive.shutdown()
+
+        report = {
+            "requests": total,
+            "drive_latency_s": options["drive_latency"],
+            "thread_per_request": {
+                "threads": options["threads"],
+                "elapsed_s": round(sync_elapsed, 3),
+                "requests_per_s": round(total / sync_elapsed, 1),
+                "errors": sum(1 for code in sync_statuses if code >= 400),
+            },
+            "async": {
+                "concurrency": options["concurrency"],
+                "elapsed_s": round(async_elapsed, 3),
+                "requests_per_s": round(total / async_elapsed, 1),
+                "errors": sum(1 for code in async_statuses if code >= 400),
+            },
+        }
+
+        self.stdout.write(json.dumps(report, indent=2))
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
@@ -0,0 +1,60 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from ...benchmarks import SCENARIOS, build_context, run_concurrent
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure throughput of a mixed read/write workload from several threads. "
+        "Run once per DB_PROFILE / SQLITE_TUNING setting to compare them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scenario", action="append", choices=sorted(SCENARIOS),
+            help="Scenario in the mix (repeatable). "
+                 "Defaults to version_create, article_list and permission_check."
+        )
+        parser.add_argument("--threads", type=int, action="append")
+        parser.add_argument("--duration", type=float, default=10.0)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write results JSON to this file.")
+
+    def handle(self, *args, **options):
+        context = build_context()
+        if not context["article_ids"]:
+            raise CommandError("No data to benchmark; run generate_dataset first.")
+
+        names = options["scenario"] or [
+            "version_create", "article_list", "permission_check",
+        ]
+        settings_dict = connection.settings_dict
+        report = {
+            "database": connection.vendor,
+            "options": {
+                key: str(value) for key, value in settings_dict["OPTIONS"].items()
+            },
+            "conn_max_age": settings_dict["CONN_MAX_AGE"],
+            "runs": [],
+        }
+
+        for threads in options["threads"] or [1, 4, 16]:
+            result = run_concurrent(
+                names,
+                threads,
+                options["duration"],
+                seed=options["seed"],
+                context=context,
+            )
+            report["runs"].append(result)
+            self.stdout.write(
+                f"threads={threads:<3} {result['ops_per_s']:>9.1f} ops/s "
+                f"errors={result['errors']}"
+            )
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
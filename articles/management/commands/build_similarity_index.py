@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from ...similarity import rebuild
+
+
+class Command(BaseCommand):
+    help = "Compute MinHash signatures for the current version of every article."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workspace", type=int)
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        count = rebuild(options["workspace"], options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} articles"))
@@ -0,0 +1,52 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from config.sharding import shard_for
+from ...models import VersionRetentionPolicy
+from ...retention import DEFAULT_BATCH_SIZE, compact_all, compact_workspace
+
+
+class Command(BaseCommand):
+    help = "Apply version retention policies, pruning history in bounded batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workspace", type=int, help="Only this workspace.")
+        parser.add_argument(
+            "--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+            help="Articles per transaction."
+        )
+        parser.add_argument(
+            "--pause", type=float, default=0,
+            help="Seconds to sleep between batches."
+        )
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        kwargs = {
+            "batch_size": options["batch_size"],
+            "dry_run": options["dry_run"],
+            "pause": options["pause"],
+        }
+
+        if options["workspace"]:
+            try:
+                policy = VersionRetentionPolicy.objects.using(
+                    shard_for(options["workspace"])
+                ).get(workspace_id=options["workspace"])
+            except VersionRetentionPolicy.DoesNotExist:
+                raise CommandError("That workspace has no retention policy.")
+            reports = [compact_workspace(policy, **kwargs)]
+        else:
+            reports = compact_all(**kwargs)
+
+        characters = files = 0
+        for report in reports:
+            characters += report["characters_reclaimed"]
+            files += report["files_deleted"]
+            self.stdout.write(json.dumps(report))
+
+        verb = "Would reclaim" if options["dry_run"] else "Reclaimed"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {characters} characters and {files} stored files"
+        ))
@@ -0,0 +1,54 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from ...extraction import (
+    DEFAULT_WORKERS, MAX_CHARS, MEMORY_LIMIT, TIME_LIMIT, ExtractionRunner, enqueue_missing,
+)
+
+
+class Command(BaseCommand):
+    help = "Extract text from uploaded documents into the search index."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=DEFAULT_WORKERS,
+            help="Extraction processes running at once."
+        )
+        parser.add_argument(
+            "--time-limit", type=int, default=TIME_LIMIT,
+            help="Seconds before a worker is killed."
+        )
+        parser.add_argument(
+            "--memory-limit", type=int, default=MEMORY_LIMIT // (1024 * 1024),
+            help="Address-space limit per worker, in MB."
+        )
+        parser.add_argument(
+            "--max-chars", type=int, default=MAX_CHARS,
+            help="Characters indexed per document; the rest is dropped."
+        )
+        parser.add_argument(
+            "--enqueue-missing", action="store_true",
+            help="First queue documents uploaded before extraction existed."
+        )
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Exit when the queue is empty instead of waiting for new jobs."
+        )
+
+    def handle(self, *args, **options):
+        if options["enqueue_missing"]:
+            self.stdout.write(f"Queued {enqueue_missing()} documents")
+
+        runner = ExtractionRunner(
+            workers=options["workers"],
+            time_limit=options["time_limit"],
+            memory_limit=options["memory_limit"] * 1024 * 1024,
+            max_chars=options["max_chars"]
+        )
+        try:
+            stats = runner.run(once=options["once"])
+        except KeyboardInterrupt:
+            stats = runner.stats
+
+        self.stdout.write(self.style.SUCCESS(json.dumps(stats)))
@@ -0,0 +1,224 @@
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.workspaces.models import Workspace, WorkspaceMembership
+from apps.workspaces.sharding import mirror_reference_rows, place_workspace
+from config.sharding import shards_for
+from ...models import Article, ArticleVersion, Tag
+from ...services import refresh_current_versions
+
+
+WORDS = (
+    "release onboarding policy incident runbook design review api client "
+    "deploy database migration backup security audit roadmap sprint retro "
+    "budget hiring metrics latency cache queue search index storage drive "
+    "approval workflow template guideline checklist faq glossary"
+).split()
+
+
+def sentence(rng, words=8):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic dataset with bulk inserts. "
+        "Full scale: --workspaces 1000 --articles 1000000 --versions-per-article 10"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--workspaces", type=int, default=10)
+        parser.add_argument("--members-per-workspace", type=int, default=20)
+        parser.add_argument("--articles", type=int, default=1000)
+        parser.add_argument(
+            "--versions-per-article", type=int, default=3,
+            help="Average; each article gets between 1 and 2x-1 versions."
+        )
+        parser.add_argument("--tags", type=int, default=100)
+        parser.add_argument("--tags-per-article", type=int, default=3)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        started = time.perf_counter()
+
+        users = self.create_users(options["users"])
+        workspaces = self.create_workspaces(options["workspaces"], users)
+        self.create_memberships(workspaces, users, options["members_per_workspace"])
+        tags = self.create_tags(options["tags"])
+
+        created = 0
+        while created < options["articles"]:
+            size = min(self.batch_size, options["articles"] - created)
+            self.create_article_chunk(
+                size,
+                workspaces,
+                users,
+                tags,
+                options["versions_per_article"],
+                options["tags_per_article"],
+            )
+            created += size
+            self.stdout.write(f"articles: {created}/{options['articles']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Dataset generated in {time.perf_counter() - started:.1f}s"
+        ))
+
+    # ---------------- BUILDERS ---------------- #
+
+    def create_users(self, count):
+        # "!" is an unusable password hash; hashing real passwords would
+        # dominate the run time.
+        start = User.objects.count()
+        User.objects.bulk_create(
+            [
+                User(
+                    username=f"bench_user_{start + i}",
+                    email=f"bench_user_{start + i}@example.com",
+                    password="!",
+                )
+                for i in range(count)
+            ],
+            batch_size=self.batch_size,
+        )
+        return list(User.objects.filter(
+            username__startswith="bench_user_"
+        ).values_list("id", flat=True))
+
+    def create_workspaces(self, count, users):
+        workspaces = Workspace.objects.bulk_create(
+            [
+                Workspace(
+                    name=f"Workspace {sentence(self.rng, 2)}",
+                    description=sentence(self.rng),
+                    created_by_id=self.rng.choice(users),
+                )
+                for _ in range(count)
+            ],
+            batch_size=self.batch_size,
+        )
+
+        # bulk_create skips Workspace.save(), so add the owner rows here
+        WorkspaceMembership.objects.bulk_create(
+            [
+                WorkspaceMembership(
+                    workspace=workspace,
+                    user_id=workspace.created_by_id,
+                    role=WorkspaceMembership.Role.OWNER,
+                )
+                for workspace in workspaces
+            ],
+            batch_size=self.batch_size,
+        )
+
+        # ... and the post_save signal that puts each one on a shard
+        for workspace in workspaces:
+            place_workspace(workspace)
+        return workspaces
+
+    def create_memberships(self, workspaces, users, per_workspace):
+        roles = [WorkspaceMembership.Role.EDITOR, WorkspaceMembership.Role.VIEWER]
+        memberships = []
+
+        for workspace in workspaces:
+            candidates = [u for u in users if u != workspace.created_by_id]
+            for user_id in self.rng.sample(candidates, min(per_workspace, len(candidates))):
+                memberships.append(WorkspaceMembership(
+                    workspace=workspace,
+                    user_id=user_id,
+                    role=self.rng.choice(roles),
+                ))
+
+        WorkspaceMembership.objects.bulk_create(
+            memberships,
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+
+    def create_tags(self, count):
+        Tag.objects.bulk_create(
+            [Tag(name=f"tag-{i}") for i in range(count)],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+        # bulk_create skips the signal that mirrors tags onto the shards
+        for alias in settings.DATABASE_SHARDS:
+            mirror_reference_rows(alias)
+        return list(Tag.objects.filter(
+            name__startswith="tag-"
+        ).values_list("id", flat=True))
+
+    def create_article_chunk(self, size, workspaces, users, tags,
+                             versions_per_article, tags_per_article):
+        statuses = [choice for choice, _ in Article.STATUS_CHOICES]
+        by_id = {workspace.pk: workspace for workspace in workspaces}
+        chosen = [self.rng.choice(workspaces).pk for _ in range(size)]
+
+        # bulk_create gives the router no instance hints, so each shard's
+        # rows are inserted there explicitly
+        for alias, workspace_ids in shards_for(set(chosen)).items():
+            workspace_ids = set(workspace_ids)
+            with transaction.atomic(using=alias):
+                self.create_shard_articles(
+                    alias,
+                    [by_id[pk] for pk in chosen if pk in workspace_ids],
+                    users,
+                    tags,
+                    statuses,
+                    versions_per_article,
+                    tags_per_article,
+                )
+
+    def create_shard_articles(self, alias, workspaces, users, tags, statuses,
+                              versions_per_article, tags_per_article):
+        articles = Article.objects.using(alias).bulk_create(
+            [
+                Article(
+                    workspace=workspace,
+                    created_by_id=self.rng.choice(users),
+                    status=self.rng.choice(statuses),
+                )
+                for workspace in workspaces
+            ],
+            batch_size=self.batch_size,
+        )
+
+        versions = []
+        through = []
+        for article in articles:
+            count = self.rng.randint(1, max(1, 2 * versions_per_article - 1))
+            for number in range(1, count + 1):
+                versions.append(ArticleVersion(
+                    article=article,
+                    title=sentence(self.rng, 5),
+                    content="\n\n".join(sentence(self.rng, 40) for _ in range(5)),
+                    version_number=number,
+                    edited_by_id=self.rng.choice(users),
+                    is_current=number == count,
+                    change_summary=sentence(self.rng, 4) if number > 1 else "",
+                ))
+
+                if len(versions) >= self.batch_size:
+                    ArticleVersion.objects.using(alias).bulk_create(
+                        versions, batch_size=self.batch_size
+                    )
+                    versions = []
+
+            for tag_id in self.rng.sample(tags, min(tags_per_article, len(tags))):
+                through.append(Article.tags.through(article_id=article.id, tag_id=tag_id))
+
+        ArticleVersion.objects.using(alias).bulk_create(versions, batch_size=self.batch_size)
+        Article.tags.through.objects.using(alias).bulk_create(through, batch_size=self.batch_size)
+        refresh_current_versions(
+            Article.objects.using(alias).filter(pk__in=[article.pk for article in articles]),
+            batch_size=self.batch_size,
+        )
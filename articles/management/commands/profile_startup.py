@@ -0,0 +1,115 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter so nothing this command imported is cached
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+warm = setup
+if sys.argv[3] == "1":
+    from config.warmup import warm_up
+    warm_up()
+    warm = time.perf_counter()
+from django.test import Client
+response = Client(raise_request_exception=False).get(sys.argv[1], HTTP_HOST=sys.argv[2])
+first = time.perf_counter()
+print(json.dumps({
+    "setup": setup - start,
+    "warm_up": warm - setup,
+    "first_request": first - warm,
+    "status": response.status_code,
+}))
+"""
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+class Command(BaseCommand):
+    help = "Report import time per module and time to first request for a cold process."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/", help="Request path for the first request.")
+        parser.add_argument("--top", type=int, default=25, help="Modules to list.")
+        parser.add_argument(
+            "--warm-up", action="store_true",
+            help="Run config.warmup.warm_up() before the request, as a preloading server would."
+        )
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        host = next((h for h in settings.ALLOWED_HOSTS if h != "*" and not h.startswith(".")),
+                    "localhost")
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", PROBE,
+             options["path"], host, "1" if options["warm_up"] else "0"],
+            capture_output=True,
+            text=True,
+            env=os.environ,
+            cwd=settings.BASE_DIR
+        )
+        total = time.perf_counter() - started
+
+        timings = None
+        for line in reversed(result.stdout.splitlines()):
+            if line.startswith("{"):
+                timings = json.loads(line)
+                break
+        if result.returncode != 0 or timings is None:
+            raise CommandError(f"Probe process failed:\n{result.stderr[-2000:]}")
+
+        modules = []
+        packages = defaultdict(int)
+        for line in result.stderr.splitlines():
+            match = _IMPORT_LINE.match(line)
+            if match is None:
+                continue
+            own, cumulative, _, name = match.groups()
+            modules.append((name, int(own), int(cumulative)))
+            packages[name.split(".")[0]] += int(own)
+
+        report = {
+            "process_seconds": round(total, 3),
+            "setup_seconds": round(timings["setup"], 3),
+            "warm_up_seconds": round(timings["warm_up"], 3),
+            "first_request_seconds": round(timings["first_request"], 3),
+            "first_request_status": timings["status"],
+            "import_seconds": round(sum(own for _, own, _ in modules) / 1e6, 3),
+            "packages": [
+                {"package": name, "ms": round(own / 1000, 1)}
+                for name, own in sorted(packages.items(), key=lambda item: -item[1])[:options["top"]]
+            ],
+            "modules": [
+                {"module": name, "self_ms": round(own / 1000, 1), "cumulative_ms": round(cumulative / 1000, 1)}
+                for name, own, cumulative in sorted(modules, key=lambda item: -item[2])[:options["top"]]
+            ],
+        }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(
+            f"Process {report['process_seconds']}s: django.setup() {report['setup_seconds']}s, "
+            f"warm-up {report['warm_up_seconds']}s, first request {report['first_request_seconds']}s "
+            f"({report['first_request_status']}); imports {report['import_seconds']}s"
+        )
+        self.stdout.write("\nSlowest packages (own import time):")
+        for row in report["packages"]:
+            self.stdout.write(f"  {row['ms']:>8.1f} ms  {row['package']}")
+        self.stdout.write("\nSlowest modules (cumulative import time):")
+        for row in report["modules"]:
+            self.stdout.write(
+                f"  {row['cumulative_ms']:>8.1f} ms  {row['module']} (self {row['self_ms']} ms)"
+            )
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from ...analytics import counter, refresh_all_rankings
+
+
+class Command(BaseCommand):
+    help = "Recompute every workspace's most read articles from the daily view counts."
+
+    def handle(self, *args, **options):
+        counter.flush()
+        count = refresh_all_rankings()
+        self.stdout.write(self.style.SUCCESS(f"Ranked {count} workspaces"))
@@ -0,0 +1,58 @@
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+
+from ...drive_reconcile import (
+    DEFAULT_CONCURRENCY, DEFAULT_RATE, reconcile_drive, resume_or_start,
+)
+from ...services import DRIVE_BATCH_LIMIT
+
+
+class Command(BaseCommand):
+    help = "Check every version's Drive file and mark broken links, resuming the last run."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=DRIVE_BATCH_LIMIT,
+            help=f"Calls per Drive batch request (at most {DRIVE_BATCH_LIMIT})."
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+            help="Batch requests in flight at once."
+        )
+        parser.add_argument(
+            "--rate", type=float, default=DEFAULT_RATE,
+            help="Drive calls per second."
+        )
+        parser.add_argument(
+            "--restart", action="store_true",
+            help="Ignore the checkpoint of an unfinished run and start over."
+        )
+
+    def handle(self, *args, **options):
+        if not 1 <= options["batch_size"] <= DRIVE_BATCH_LIMIT:
+            raise CommandError(f"--batch-size must be between 1 and {DRIVE_BATCH_LIMIT}.")
+        if options["concurrency"] < 1 or options["rate"] <= 0:
+            raise CommandError("--concurrency and --rate must be positive.")
+
+        run = resume_or_start(restart=options["restart"])
+        if run.positions:
+            self.stdout.write(f"Resuming run {run.pk} from {run.positions}")
+
+        def progress(run):
+            self.stdout.write(
+                f"checked={run.checked} missing={run.missing} "
+                f"restored={run.restored} relinked={run.relinked} errors={run.errors}"
+            )
+
+        run = async_to_sync(reconcile_drive)(
+            run,
+            batch_size=options["batch_size"],
+            concurrency=options["concurrency"],
+            rate=options["rate"],
+            on_progress=progress if options["verbosity"] > 1 else None
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Run {run.pk}: checked {run.checked}, {run.missing} missing, "
+            f"{run.restored} restored, {run.relinked} relinked, {run.errors} errors"
+        ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from config.sharding import each_shard
+from ...models import ArticleVersion
+from ...rendering import render_pending
+
+
+class Command(BaseCommand):
+    help = "Render and store HTML for versions without a current rendering."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Include non-current versions.")
+        parser.add_argument("--workspace", type=int)
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        versions = ArticleVersion.objects.all()
+        if not options["all"]:
+            versions = versions.filter(is_current=True)
+        if options["workspace"]:
+            versions = versions.filter(article__workspace_id=options["workspace"])
+
+        count = 0
+        for shard in each_shard(versions):
+            count += render_pending(shard, options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rendered {count} versions"))
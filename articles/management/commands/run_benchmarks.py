@@ -0,0 +1,103 @@
+import json
+import platform
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from ...benchmarks import SCENARIOS, build_context, run_scenario
+from ...models import Article, ArticleVersion
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Measure p50/p99 latency and query counts of the hot paths (JSON output)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scenario", action="append", choices=sorted(SCENARIOS),
+            help="Scenario to run (repeatable). Defaults to all."
+        )
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write results JSON to this file.")
+        parser.add_argument("--compare", help="Baseline JSON to compare against.")
+        parser.add_argument(
+            "--max-regression", type=float, default=None,
+            help="Fail if any p99 is this many percent slower than the baseline."
+        )
+
+    def handle(self, *args, **options):
+        context = build_context()
+        if not context["workspace_ids"] or not context["article_ids"]:
+            raise CommandError("No data to benchmark; run generate_dataset first.")
+
+        results = {}
+        for name in options["scenario"] or sorted(SCENARIOS):
+            results[name] = run_scenario(
+                name,
+                options["iterations"],
+                warmup=options["warmup"],
+                seed=options["seed"],
+                context=context,
+            )
+            self.stdout.write(
+                f"{name:<20} p50={results[name]['p50_ms']:.2f}ms "
+                f"p99={results[name]['p99_ms']:.2f}ms "
+                f"queries={results[name]['queries_p50']}"
+            )
+
+        report = {
+            "commit": current_commit(),
+            "timestamp": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "database": connection.vendor,
+            "dataset": {
+                "articles": Article.objects.count(),
+                "versions": ArticleVersion.objects.count(),
+            },
+            "results": results,
+        }
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+
+        if options["compare"]:
+            self.compare(report, options["compare"], options["max_regression"])
+
+    def compare(self, report, baseline_path, max_regression):
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+        regressions = []
+        for name, result in report["results"].items():
+            before = baseline.get("results", {}).get(name)
+            if not before or not before["p99_ms"]:
+                continue
+
+            change = (result["p99_ms"] - before["p99_ms"]) / before["p99_ms"] * 100
+            queries = result["queries_max"] - before["queries_max"]
+            self.stdout.write(
+                f"{name:<20} p99 {change:+.1f}% vs {baseline.get('commit')}, "
+                f"queries {queries:+d}"
+            )
+            if max_regression is not None and change > max_regression:
+                regressions.append(name)
+
+        if regressions:
+            raise CommandError(f"p99 regression in: {', '.join(regressions)}")
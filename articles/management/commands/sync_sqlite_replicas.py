@@ -0,0 +1,32 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the SQLite primary onto every replica file in SQLITE_REPLICA_PATHS. "
+        "Stands in for replication when trying the replica router locally."
+    )
+
+    def handle(self, *args, **options):
+        primary = connections["default"]
+        if primary.vendor != "sqlite":
+            raise CommandError("Only SQLite replicas can be synced this way.")
+
+        replicas = getattr(settings, "DATABASE_REPLICAS", [])
+        if not replicas:
+            raise CommandError("No replicas configured; set SQLITE_REPLICA_PATHS.")
+
+        primary.ensure_connection()
+        for alias in replicas:
+            # Drop any open handle so the copy is not read through a stale one
+            connections[alias].close()
+            target = sqlite3.connect(str(connections[alias].settings_dict["NAME"]))
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(f"{alias}: synced")
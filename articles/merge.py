@@ -0,0 +1,88 @@
+"""
+Three-way merge of article versions.
+
+An editor submits their text together with the version it was based on.
+When other versions were saved in between, ``merge_version`` merges the
+editor's change and the current version's change against that base, line
+by line (diff3): regions only one side touched take that side's text, and
+regions both sides changed differently are conflicts.
+"""
+from difflib import SequenceMatcher
+
+
+def _matches(base, other):
+    """Map each base line index to the index of the same line in ``other``."""
+    matcher = SequenceMatcher(None, base, other, autojunk=False)
+    return {
+        base_index + offset: other_index + offset
+        for base_index, other_index, size in matcher.get_matching_blocks()
+        for offset in range(size)
+    }
+
+
+def merge_lines(base, yours, current):
+    """
+    Merge two edits of ``base``. Returns ``(merged, conflicts)``; on a
+    conflict ``merged`` keeps the current text for that region.
+    """
+    base_lines = base.splitlines(keepends=True)
+    your_lines = yours.splitlines(keepends=True)
+    current_lines = current.splitlines(keepends=True)
+
+    in_yours = _matches(base_lines, your_lines)
+    in_current = _matches(base_lines, current_lines)
+    # Base lines both sides left alone split the text into chunks; both
+    # mappings are increasing, so the chunks line up
+    anchors = sorted(set(in_yours) & set(in_current))
+    anchors.append(len(base_lines))
+
+    merged = []
+    conflicts = []
+    base_at = yours_at = current_at = 0
+
+    for anchor in anchors:
+        yours_end = in_yours.get(anchor, len(your_lines))
+        current_end = in_current.get(anchor, len(current_lines))
+
+        base_chunk = base_lines[base_at:anchor]
+        your_chunk = your_lines[yours_at:yours_end]
+        current_chunk = current_lines[current_at:current_end]
+
+        if your_chunk == current_chunk or your_chunk == base_chunk:
+            merged += current_chunk
+        elif current_chunk == base_chunk:
+            merged += your_chunk
+        else:
+            conflicts.append({
+                "field": "content",
+                "line": base_at + 1,
+                "base": "".join(base_chunk),
+                "yours": "".join(your_chunk),
+                "current": "".join(current_chunk),
+            })
+            merged += current_chunk
+
+        if anchor < len(base_lines):
+            merged.append(base_lines[anchor])
+        base_at, yours_at, current_at = anchor + 1, yours_end + 1, current_end + 1
+
+    return "".join(merged), conflicts
+
+
+def merge_value(field, base, yours, current):
+    """Three-way merge of a single value such as the title."""
+    if yours == current or yours == base:
+        return current, []
+    if current == base:
+        return yours, []
+    return current, [{"field": field, "base": base, "yours": yours, "current": current}]
+
+
+def merge_version(base, current, title, content):
+    """
+    Merge an edit of version ``base`` onto version ``current``. Returns
+    ``(title, content, conflicts)``.
+    """
+    merged_title, conflicts = merge_value("title", base.title, title, current.title)
+    merged_content, content_conflicts = merge_lines(base.content, content, current.content)
+    return merged_title, merged_content, conflicts + content_conflicts
@@ -0,0 +1,26 @@
+# Generated by Django 6.0.2 on 2026-10-19 09:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0003_tag_alter_article_options_article_archived_at_and_more'),
+        ('workspaces', '0003_workspaceclonejob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionRetentionPolicy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('keep_last', models.PositiveIntegerField(blank=True, null=True)),
+                ('daily_after_days', models.PositiveIntegerField(blank=True, null=True)),
+                ('keep_with_summary', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('workspace', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='retention_policy', to='workspaces.workspace')),
+            ],
+        ),
+    ]
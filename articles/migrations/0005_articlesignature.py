@@ -0,0 +1,28 @@
+# Generated by Django 6.0.2 on 2026-10-19 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0004_versionretentionpolicy'),
+        ('workspaces', '0003_workspaceclonejob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleSignature',
+            fields=[
+                ('article', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='articles.article')),
+                ('version_number', models.PositiveIntegerField()),
+                ('minhash', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('workspace', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='workspaces.workspace')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['workspace', 'updated_at'], name='articles_ar_workspa_bb37f7_idx')],
+            },
+        ),
+    ]
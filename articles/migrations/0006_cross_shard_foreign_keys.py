@@ -0,0 +1,47 @@
+# Generated by Django 6.0.2 on 2026-10-19 11:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0005_articlesignature'),
+        ('workspaces', '0005_workspaceshard'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='article',
+            name='workspace',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='articles_IN_WORKSPACE', to='workspaces.workspace'),
+        ),
+        migrations.AlterField(
+            model_name='article',
+            name='created_by',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='created_articles', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='article',
+            name='reviewed_by',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reviewed_articles', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='articleversion',
+            name='edited_by',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='article_versions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='versionretentionpolicy',
+            name='workspace',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='retention_policy', to='workspaces.workspace'),
+        ),
+        migrations.AlterField(
+            model_name='articlesignature',
+            name='workspace',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='workspaces.workspace'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 6.0.2 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0006_cross_shard_foreign_keys'),
+    ]
+
+    operations = [
+        # The Drive columns were on the model but never migrated
+        migrations.AddField(
+            model_name='articleversion',
+            name='drive_file_id',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='articleversion',
+            name='drive_link',
+            field=models.URLField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='articleversion',
+            name='drive_missing_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='DriveReconcileRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='running', max_length=20)),
+                ('positions', models.JSONField(default=dict)),
+                ('checked', models.PositiveIntegerField(default=0)),
+                ('missing', models.PositiveIntegerField(default=0)),
+                ('restored', models.PositiveIntegerField(default=0)),
+                ('relinked', models.PositiveIntegerField(default=0)),
+                ('errors', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-19 13:00
+
+import articles.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0007_drive_reconciliation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articleversion',
+            name='file',
+            field=models.FileField(blank=True, max_length=255, storage=articles.storage.version_storage, upload_to='versions/'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.2 on 2026-10-19 16:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0009_document_extraction'),
+        ('workspaces', '0005_workspaceshard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenderedVersion',
+            fields=[
+                ('version', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rendered', serialize=False, to='articles.articleversion')),
+                ('renderer_version', models.PositiveSmallIntegerField()),
+                ('html', models.TextField()),
+                ('rendered_at', models.DateTimeField(auto_now=True)),
+                ('workspace', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='workspaces.workspace')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['workspace', 'rendered_at'], name='articles_re_workspa_812440_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0.2 on 2026-10-19 18:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0010_renderedversion'),
+        ('workspaces', '0005_workspaceshard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleDailyViews',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('article_id', models.BigIntegerField()),
+                ('day', models.DateField()),
+                ('views', models.PositiveBigIntegerField(default=0)),
+                ('workspace', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='workspaces.workspace')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['workspace', 'day'], name='articles_ar_workspa_efb447_idx')],
+                'unique_together': {('article_id', 'day')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ReadRanking',
+            fields=[
+                ('workspace', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='workspaces.workspace')),
+                ('entries', models.JSONField(default=list)),
+                ('computed_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.2 on 2026-10-19 20:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0011_article_views'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='current_version',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='articles.articleversion'),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='excerpt',
+            field=models.CharField(blank=True, max_length=300),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='title',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 6.0.2 on 2026-10-20 09:00
+
+import articles.storage
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_edited_at(apps, schema_editor):
+    # Existing versions were created when they were edited
+    ArticleVersion = apps.get_model('articles', 'ArticleVersion')
+    ArticleVersion.objects.using(schema_editor.connection.alias).update(
+        created_at=models.F('edited_at')
+    )
+
+
+class Migration(migrations.Migration):
+    """ArticleVersion.created_at and Document were declared without a migration."""
+
+    dependencies = [
+        ('articles', '0012_article_current_version'),
+        ('workspaces', '0005_workspaceshard'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articleversion',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_edited_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='articleversion',
+            index=models.Index(fields=['article', 'is_current'], name='articles_ar_article_01c811_idx'),
+        ),
+        migrations.CreateModel(
+            name='Document',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(storage=articles.storage.document_storage, upload_to='documents/')),
+                ('file_size', models.BigIntegerField()),
+                ('mime_type', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('article', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='documents', to='articles.article')),
+                ('uploaded_by', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='documents', to=settings.AUTH_USER_MODEL)),
+                ('workspace', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='documents', to='workspaces.workspace')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['workspace'], name='articles_do_workspa_57ba76_idx'), models.Index(fields=['created_at'], name='articles_do_created_d1865e_idx')],
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='tag',
+            options={'ordering': ['name']},
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['status'], name='articles_ar_status_edb746_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['created_at'], name='articles_ar_created_b5cc75_idx'),
+        ),
+    ]
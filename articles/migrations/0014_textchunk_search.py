@@ -0,0 +1,55 @@
+# Generated by Django 6.0.2 on 2026-10-20 09:30
+
+from django.db import migrations
+
+# articles.extraction.search_documents queries these; other backends fall
+# back to a LIKE scan
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE articles_textchunk_fts USING fts5("
+    "text, content='articles_textchunk', content_rowid='id')",
+    "CREATE TRIGGER articles_textchunk_fts_insert AFTER INSERT ON articles_textchunk BEGIN "
+    "INSERT INTO articles_textchunk_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER articles_textchunk_fts_delete AFTER DELETE ON articles_textchunk BEGIN "
+    "INSERT INTO articles_textchunk_fts(articles_textchunk_fts, rowid, text) "
+    "VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER articles_textchunk_fts_update AFTER UPDATE ON articles_textchunk BEGIN "
+    "INSERT INTO articles_textchunk_fts(articles_textchunk_fts, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    "INSERT INTO articles_textchunk_fts(rowid, text) VALUES (new.id, new.text); END",
+    # Index the chunks that already exist
+    "INSERT INTO articles_textchunk_fts(articles_textchunk_fts) VALUES ('rebuild')",
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS articles_textchunk_fts_insert",
+    "DROP TRIGGER IF EXISTS articles_textchunk_fts_delete",
+    "DROP TRIGGER IF EXISTS articles_textchunk_fts_update",
+    "DROP TABLE IF EXISTS articles_textchunk_fts",
+]
+POSTGRES_FORWARD = [
+    "CREATE INDEX articles_textchunk_fts ON articles_textchunk "
+    "USING gin (to_tsvector('simple', text))",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS articles_textchunk_fts",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0013_articleversion_created_at_document'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            _run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
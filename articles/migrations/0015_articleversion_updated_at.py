@@ -0,0 +1,30 @@
+# Generated by Django 6.0.2 on 2026-10-21 09:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def copy_created_at(apps, schema_editor):
+    # Nothing is known about earlier changes
+    ArticleVersion = apps.get_model('articles', 'ArticleVersion')
+    ArticleVersion.objects.using(schema_editor.connection.alias).update(
+        updated_at=models.F('created_at')
+    )
+
+
+class Migration(migrations.Migration):
+    """A change marker of their own, so workspace moves catch edited versions."""
+
+    dependencies = [
+        ('articles', '0014_textchunk_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articleversion',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+    ]
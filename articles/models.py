@@ -1,7 +1,10 @@
-from django.db import models
+from django.db import models, router
 from django.contrib.auth import get_user_model
 from django.utils import timezone
-from apps.workspaces.models import Workspace
+from apps.workspaces.activity import record_activity
+from apps.workspaces.models import ActivityEvent, Workspace
+from config.sharding import ShardedManager
+from .storage import document_storage, version_storage
 
 User = get_user_model()
 
@@ -31,15 +34,19 @@ class Article(models.Model):
         ("ARCHIVED", "Archived"),
     )
 
+    # Articles may live on a different database than workspaces and users
+    # (config.sharding), so references to them carry no FK constraint
     workspace = models.ForeignKey(
         Workspace,
         on_delete=models.CASCADE,
+        db_constraint=False,
         related_name="articles_IN_WORKSPACE"
     )
 
     created_by = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_constraint=False,
         null=True,
         related_name="created_articles"
     )
@@ -60,6 +67,7 @@ class Article(models.Model):
     reviewed_by = models.ForeignKey(
         User,
         on_delete=models.SET_NULL,
+        db_constraint=False,
         null=True,
         blank=True,
         related_name="reviewed_articles"
@@ -68,9 +76,24 @@ class Article(models.Model):
     reviewed_at = models.DateTimeField(null=True, blank=True)
     archived_at = models.DateTimeField(null=True, blank=True)
 
+    # Copied from the current version whenever one is saved
+    # (services._save_version), so listings need no join or subquery
+    current_version = models.ForeignKey(
+        "ArticleVersion",
+        on_delete=models.SET_NULL,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="+"
+    )
+    title = models.CharField(max_length=255, blank=True)
+    excerpt = models.CharField(max_length=300, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ShardedManager()
+
     class Meta:
         ordering = ['-created_at']
         indexes = [
@@ -83,11 +106,19 @@ class Article(models.Model):
         self.reviewed_by = reviewer
         self.reviewed_at = timezone.now()
         self.save()
+        record_activity(
+            self.workspace_id, ActivityEvent.Verb.APPROVED, "article", self.pk,
+            actor=reviewer, using=self._state.db
+        )
 
-    def archive(self):
+    def archive(self, archived_by=None):
         self.status = "ARCHIVED"
         self.archived_at = timezone.now()
         self.save()
+        record_activity(
+            self.workspace_id, ActivityEvent.Verb.ARCHIVED, "article", self.pk,
+            actor=archived_by, using=self._state.db
+        )
 
     def __str__(self):
         return f"Article {self.id}"
@@ -112,6 +143,7 @@ class ArticleVersion(models.Model):
     edited_by = models.ForeignKey(
         User,
         on_delete=models.SET_NULL,
+        db_constraint=False,
         null=True,
         related_name="article_versions"
     )
@@ -124,13 +156,27 @@ class ArticleVersion(models.Model):
     # NEW FIELDS 👇
     drive_file_id = models.CharField(max_length=255, blank=True, null=True)
     drive_link = models.URLField(blank=True, null=True)
+    # Snapshot in the ``versions`` storage (the Drive id when that is Drive)
+    file = models.FileField(
+        storage=version_storage,
+        upload_to="versions/",
+        max_length=255,
+        blank=True
+    )
+    # Set by the Drive reconciliation job when the file is gone or trashed
+    drive_missing_at = models.DateTimeField(null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
-class Meta:
-    ordering = ['-version_number']
-    unique_together = ('article', 'version_number')
-    indexes = [
-        models.Index(fields=["article", "is_current"]),
+    # auto_now does not apply to queryset update(); those set it themselves
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ShardedManager()
+
+    class Meta:
+        ordering = ['-version_number']
+        unique_together = ('article', 'version_number')
+        indexes = [
+            models.Index(fields=["article", "is_current"]),
         ]
 
     def save(self, *args, **kwargs):
@@ -138,10 +184,12 @@ class Meta:
         Automatically mark previous versions as not current
         """
         if self.is_current:
-            ArticleVersion.objects.filter(
-                article=self.article,
+            # On the database this version is saved to (its shard)
+            using = kwargs.get("using") or router.db_for_write(ArticleVersion, instance=self)
+            ArticleVersion.objects.using(using).filter(
+                article_id=self.article_id,
                 is_current=True
-            ).update(is_current=False)
+            ).exclude(pk=self.pk).update(is_current=False, updated_at=timezone.now())
 
         super().save(*args, **kwargs)
 
@@ -157,6 +205,7 @@ class Document(models.Model):
     workspace = models.ForeignKey(
         Workspace,
         on_delete=models.CASCADE,
+        db_constraint=False,
         related_name="documents"
     )
 
@@ -171,22 +220,325 @@ class Document(models.Model):
     uploaded_by = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_constraint=False,
         related_name="documents"
     )
 
-    file = models.FileField(upload_to="documents/")
+    file = models.FileField(upload_to="documents/", storage=document_storage)
 
     file_size = models.BigIntegerField()
     mime_type = models.CharField(max_length=100)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
-class Meta:
-    ordering = ['-created_at']
-    indexes = [
-        models.Index(fields=["workspace"]),
-        models.Index(fields=["created_at"]),
+    objects = ShardedManager()
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=["workspace"]),
+            models.Index(fields=["created_at"]),
         ]
 
     def __str__(self):
-        return self.file.name
\ No newline at end of file
+        return self.file.name
+
+
+# =========================
+# Version Retention Policy Model
+# =========================
+class VersionRetentionPolicy(models.Model):
+    """
+    Which ArticleVersion rows a workspace keeps. Every rule *keeps* rows; a
+    version is pruned only when no rule applies to it. The current version
+    is always kept, and an empty policy keeps everything.
+    """
+
+    workspace = models.OneToOneField(
+        Workspace,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name="retention_policy"
+    )
+
+    # Keep the newest N versions of every article
+    keep_last = models.PositiveIntegerField(null=True, blank=True)
+
+    # Keep everything younger than N days, then one version per day
+    daily_after_days = models.PositiveIntegerField(null=True, blank=True)
+
+    # Keep any version that has a change_summary
+    keep_with_summary = models.BooleanField(default=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ShardedManager()
+
+    def __str__(self):
+        return f"Retention for workspace {self.workspace_id}"
+
+
+# =========================
+# Article Signature Model
+# =========================
+class ArticleSignature(models.Model):
+    """
+    MinHash signature of an article's current version, used by the
+    related-articles index (articles.similarity).
+    """
+
+    article = models.OneToOneField(
+        Article,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="signature"
+    )
+
+    workspace = models.ForeignKey(
+        Workspace,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name="+"
+    )
+
+    version_number = models.PositiveIntegerField()
+    minhash = models.BinaryField()
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ShardedManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["workspace", "updated_at"]),
+        ]
+
+    def __str__(self):
+        return f"Signature of article {self.article_id} v{self.version_number}"
+
+
+# =========================
+# Drive Reconciliation Run Model
+# =========================
+class DriveReconcileRun(models.Model):
+    """
+    Progress of one pass of the Drive reconciliation job
+    (articles.drive_reconcile). ``positions`` maps each database alias to
+    the last ArticleVersion id checked there, so an interrupted run resumes
+    where it stopped.
+    """
+
+    class Status(models.TextChoices):
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.RUNNING
+    )
+
+    positions = models.JSONField(default=dict)
+
+    checked = models.PositiveIntegerField(default=0)
+    missing = models.PositiveIntegerField(default=0)
+    restored = models.PositiveIntegerField(default=0)
+    relinked = models.PositiveIntegerField(default=0)
+    errors = models.PositiveIntegerField(default=0)
+
+    error = models.TextField(blank=True)
+
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Drive reconciliation {self.pk} ({self.status})"
+
+
+# =========================
+# Rendered Version Model
+# =========================
+class RenderedVersion(models.Model):
+    """
+    Sanitized HTML of a version's content, produced by articles.rendering.
+    ``renderer_version`` records which renderer made it; rows from an older
+    renderer are redone on their next read.
+    """
+
+    version = models.OneToOneField(
+        ArticleVersion,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="rendered"
+    )
+
+    workspace = models.ForeignKey(
+        Workspace,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name="+"
+    )
+
+    renderer_version = models.PositiveSmallIntegerField()
+    html = models.TextField()
+
+    rendered_at = models.DateTimeField(auto_now=True)
+
+    objects = ShardedManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["workspace", "rendered_at"]),
+        ]
+
+    def __str__(self):
+        return f"Rendered version {self.version_id} (renderer {self.renderer_version})"
+
+
+# =========================
+# Document Extraction Job Model
+# =========================
+class DocumentExtraction(models.Model):
+    """
+    Text extraction job for one Document, run by articles.extraction. Jobs
+    live on ``default`` next to the search index, so ``document_id`` is a
+    plain id rather than a cross-shard foreign key.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+        UNSUPPORTED = "unsupported", "Unsupported"
+
+    document_id = models.BigIntegerField(unique=True)
+
+    workspace = models.ForeignKey(
+        Workspace,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name="+"
+    )
+
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING
+    )
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "id"]),
+            models.Index(fields=["workspace", "status"]),
+        ]
+
+    def __str__(self):
+        return f"Extraction of document {self.document_id} ({self.status})"
+
+
+# =========================
+# Extracted Text Models
+# =========================
+class ExtractedText(models.Model):
+    """
+    Text extracted from one file content, keyed by its SHA-256, so the same
+    bytes uploaded twice are parsed once. Rows stay ``complete=False``
+    while their chunks are being written.
+    """
+
+    sha256 = models.CharField(max_length=64, primary_key=True)
+
+    char_count = models.PositiveIntegerField(default=0)
+    chunk_count = models.PositiveIntegerField(default=0)
+    truncated = models.BooleanField(default=False)
+    complete = models.BooleanField(default=False)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.sha256
+
+
+class TextChunk(models.Model):
+    """A slice of extracted text; the unit the document search matches on."""
+
+    extracted = models.ForeignKey(
+        ExtractedText,
+        on_delete=models.CASCADE,
+        related_name="chunks"
+    )
+
+    position = models.PositiveIntegerField()
+    text = models.TextField()
+
+    class Meta:
+        ordering = ["extracted", "position"]
+        unique_together = ("extracted", "position")
+
+    def __str__(self):
+        return f"{self.extracted_id}:{self.position}"
+
+
+# =========================
+# Article Views Model
+# =========================
+class ArticleDailyViews(models.Model):
+    """
+    Views of one article on one day (UTC). Rows are upserted in batches by
+    articles.analytics and live on ``default``, so ``article_id`` is a
+    plain id like DocumentExtraction's ``document_id``.
+    """
+
+    article_id = models.BigIntegerField()
+
+    workspace = models.ForeignKey(
+        Workspace,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name="+"
+    )
+
+    day = models.DateField()
+    views = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("article_id", "day")
+        indexes = [
+            models.Index(fields=["workspace", "day"]),
+        ]
+
+    def __str__(self):
+        return f"Article {self.article_id} on {self.day}: {self.views}"
+
+
+class ReadRanking(models.Model):
+    """
+    A workspace's most read articles over the last RANKING_DAYS days, as
+    ``[[article_id, views], ...]``. Recomputed by articles.analytics so
+    reads never aggregate the daily rows.
+    """
+
+    workspace = models.OneToOneField(
+        Workspace,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        primary_key=True,
+        related_name="+"
+    )
+
+    entries = models.JSONField(default=list)
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Read ranking for workspace {self.workspace_id}"
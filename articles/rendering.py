@@ -0,0 +1,357 @@
+"""
+Rendered HTML for article versions.
+
+A version's ``content`` is Markdown or, when it already looks like HTML,
+rich text. ``render`` turns either into sanitized HTML: Markdown goes
+through the small renderer below, and everything then passes an allowlist
+sanitizer. Versions never change, so each one is rendered once per
+RENDERER_VERSION and stored in RenderedVersion (on the version's shard),
+with the Django cache in front. Bump RENDERER_VERSION whenever the output
+changes; old renderings are then redone lazily on their next read.
+
+The current version is rendered right after it is committed (signals),
+in a background thread, inline or not at all depending on
+RENDER_AFTER_SAVE; older versions on first read.
+"""
+import html
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError, close_old_connections, router
+
+from config.sharding import WorkspaceMoving
+from .models import ArticleVersion, RenderedVersion
+
+logger = logging.getLogger(__name__)
+
+RENDERER_VERSION = 1
+CACHE_TTL = 24 * 60 * 60
+RENDER_ATTEMPTS = 4
+RETRY_DELAY = 0.5
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="render")
+
+
+# ---------------- MARKDOWN ---------------- #
+
+_HTML_START = re.compile(r"^\s*<(p|div|h[1-6]|ul|ol|table|blockquote|pre|span|strong|em|br)\b", re.I)
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_RULE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_BULLET = re.compile(r"^\s*[-*+]\s+(.*)$")
+_NUMBERED = re.compile(r"^\s*\d+[.)]\s+(.*)$")
+_QUOTE = re.compile(r"^\s*>\s?(.*)$")
+
+_CODE_SPAN = re.compile(r"`([^`]+)`")
+_LINK = re.compile(r"\[([^\]]+)\]\(((?:[^()\s]|\([^()\s]*\))+)\)")
+_STRONG = re.compile(r"(\*\*|__)(?=\S)(.+?)(?<=\S)\1")
+_EMPHASIS = re.compile(r"(?<![\w*])([*_])(?=\S)(.+?)(?<=\S)\1(?![\w*])")
+
+
+def looks_like_html(content):
+    return bool(_HTML_START.match(content))
+
+
+def _safe_url(url):
+    scheme = urlsplit(url).scheme.lower()
+    return scheme in ("", "http", "https", "mailto")
+
+
+def _inline(text):
+    # Code spans first, so their contents are left alone
+    parts = _CODE_SPAN.split(text)
+    out = []
+    for index, part in enumerate(parts):
+        if index % 2:
+            out.append(f"<code>{html.escape(part)}</code>")
+            continue
+
+        part = html.escape(part, quote=False)
+        part = _LINK.sub(
+            lambda m: (
+                f'<a href="{html.escape(html.unescape(m.group(2)))}">{m.group(1)}</a>'
+                if _safe_url(html.unescape(m.group(2))) else m.group(1)
+            ),
+            part
+        )
+        part = _STRONG.sub(r"<strong>\2</strong>", part)
+        part = _EMPHASIS.sub(r"<em>\2</em>", part)
+        out.append(part)
+    return "".join(out)
+
+
+def markdown_to_html(text):
+    """The common Markdown subset: headings, paragraphs, lists, quotes, code, links."""
+    lines = text.replace("\r\n", "\n").split("\n")
+    out = []
+    paragraph = []
+    items = []
+    list_tag = None
+    index = 0
+
+    def flush():
+        nonlocal list_tag
+        if paragraph:
+            out.append("<p>" + _inline(" ".join(line.strip() for line in paragraph)) + "</p>")
+            paragraph.clear()
+        if items:
+            out.append(
+                f"<{list_tag}>" + "".join(f"<li>{_inline(item)}</li>" for item in items)
+                + f"</{list_tag}>"
+            )
+            items.clear()
+            list_tag = None
+
+    while index < len(lines):
+        line = lines[index]
+
+        fence = _FENCE.match(line)
+        if fence:
+            flush()
+            code = []
+            index += 1
+            while index < len(lines) and not lines[index].strip().startswith(fence.group(1)):
+                code.append(lines[index])
+                index += 1
+            out.append("<pre><code>" + html.escape("\n".join(code)) + "</code></pre>")
+            index += 1
+            continue
+
+        if _QUOTE.match(line):
+            flush()
+            quoted = []
+            while index < len(lines) and _QUOTE.match(lines[index]):
+                quoted.append(_QUOTE.match(lines[index]).group(1))
+                index += 1
+            out.append("<blockquote>" + markdown_to_html("\n".join(quoted)) + "</blockquote>")
+            continue
+
+        heading = _HEADING.match(line)
+        bullet = _BULLET.match(line)
+        numbered = _NUMBERED.match(line)
+
+        if not line.strip():
+            flush()
+        elif heading:
+            flush()
+            level = len(heading.group(1))
+            out.append(f"<h{level}>{_inline(heading.group(2))}</h{level}>")
+        elif _RULE.match(line):
+            flush()
+            out.append("<hr>")
+        elif bullet or numbered:
+            tag = "ul" if bullet else "ol"
+            if paragraph or (list_tag and list_tag != tag):
+                flush()
+            list_tag = tag
+            items.append((bullet or numbered).group(1))
+        elif items:
+            # Continuation of the previous list item
+            items[-1] += " " + line.strip()
+        else:
+            paragraph.append(line)
+        index += 1
+
+    flush()
+    return "\n".join(out)
+
+
+# ---------------- SANITIZER ---------------- #
+
+ALLOWED_TAGS = {
+    "p", "br", "hr", "h1", "h2", "h3", "h4", "h5", "h6", "strong", "b", "em", "i",
+    "u", "s", "code", "pre", "blockquote", "ul", "ol", "li", "a", "span", "div",
+    "table", "thead", "tbody", "tr", "th", "td",
+}
+ALLOWED_ATTRIBUTES = {
+    "a": {"href", "title"},
+    "td": {"colspan", "rowspan"},
+    "th": {"colspan", "rowspan"},
+}
+VOID_TAGS = {"br", "hr"}
+# Dropped together with everything inside them
+DROP_CONTENT = {"script", "style", "iframe", "object", "embed", "template", "noscript", "svg", "math"}
+
+
+class _Sanitizer(HTMLParser):
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self.open = []
+        self.dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_CONTENT:
+            self.dropping += 1
+            return
+        if self.dropping or tag not in ALLOWED_TAGS:
+            return
+
+        allowed = ALLOWED_ATTRIBUTES.get(tag, set())
+        rendered = []
+        for name, value in attrs:
+            if name not in allowed or value is None:
+                continue
+            if name == "href" and not _safe_url(value.strip()):
+                continue
+            rendered.append(f' {name}="{html.escape(value)}"')
+        if tag == "a":
+            rendered.append(' rel="nofollow noopener"')
+
+        self.out.append(f"<{tag}{''.join(rendered)}>")
+        if tag not in VOID_TAGS:
+            self.open.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag in DROP_CONTENT:
+            self.dropping -= 1
+        elif tag not in VOID_TAGS and self.open and self.open[-1] == tag:
+            self.open.pop()
+            self.out.append(f"</{tag}>")
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT:
+            self.dropping = max(self.dropping - 1, 0)
+            return
+        if self.dropping or tag not in self.open:
+            return
+        # Close anything left open inside this element
+        while self.open:
+            current = self.open.pop()
+            self.out.append(f"</{current}>")
+            if current == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.dropping:
+            self.out.append(html.escape(data, quote=False))
+
+    def result(self):
+        self.close()
+        return "".join(self.out) + "".join(f"</{tag}>" for tag in reversed(self.open))
+
+
+def sanitize(markup):
+    sanitizer = _Sanitizer()
+    sanitizer.feed(markup)
+    return sanitizer.result()
+
+
+def render(content):
+    """Sanitized HTML for a version's content."""
+    if not looks_like_html(content):
+        content = markdown_to_html(content)
+    return sanitize(content)
+
+
+# ---------------- STORE ---------------- #
+
+def _cache_key(version_id):
+    return f"rendered:{version_id}:{RENDERER_VERSION}"
+
+
+def _store(version, workspace_id):
+    rendered = render(version.content)
+    try:
+        # The version may have been read from a replica; write to its shard
+        using = router.db_for_write(ArticleVersion, instance=version)
+        RenderedVersion.objects.using(using).update_or_create(
+            version_id=version.pk,
+            defaults={
+                "workspace_id": workspace_id,
+                "renderer_version": RENDERER_VERSION,
+                "html": rendered,
+            }
+        )
+    except WorkspaceMoving:
+        # Serve it anyway; the next read after the move stores it
+        return rendered
+
+    cache.set(_cache_key(version.pk), rendered, CACHE_TTL)
+    return rendered
+
+
+def rendered_html(version, workspace_id=None):
+    """The version's HTML, rendering and storing it on first use."""
+    rendered = cache.get(_cache_key(version.pk))
+    if rendered is not None:
+        return rendered
+
+    rendered = RenderedVersion.objects.using(version._state.db).filter(
+        version_id=version.pk,
+        renderer_version=RENDERER_VERSION
+    ).values_list("html", flat=True).first()
+    if rendered is not None:
+        cache.set(_cache_key(version.pk), rendered, CACHE_TTL)
+        return rendered
+
+    if workspace_id is None:
+        workspace_id = version.article.workspace_id
+    return _store(version, workspace_id)
+
+
+def _render_job(version_id, using, workspace_id):
+    close_old_connections()
+    try:
+        for attempt in range(RENDER_ATTEMPTS):
+            try:
+                version = ArticleVersion.objects.using(using).filter(pk=version_id).first()
+                if version is not None:
+                    _store(version, workspace_id)
+                return
+            except OperationalError as exc:
+                # SQLite allows one writer; wait for the request holding the lock
+                if "locked" not in str(exc) or attempt + 1 == RENDER_ATTEMPTS:
+                    raise
+                time.sleep(RETRY_DELAY * 2 ** attempt)
+    except Exception:
+        logger.exception("Rendering version %s failed", version_id)
+    finally:
+        close_old_connections()
+
+
+def render_new_version(version, workspace_id):
+    """Render a committed current version as RENDER_AFTER_SAVE says."""
+    mode = settings.RENDER_AFTER_SAVE
+    if mode == "background":
+        _executor.submit(_render_job, version.pk, version._state.db, workspace_id)
+    elif mode == "inline":
+        try:
+            _store(version, workspace_id)
+        except Exception:
+            logger.exception("Rendering version %s failed", version.pk)
+
+
+def render_pending(queryset, batch_size=500, on_progress=None):
+    """
+    Render every version in ``queryset`` that has no rendering from the
+    current RENDERER_VERSION. Returns how many were rendered.
+    """
+    done = 0
+    using = queryset.db
+    stale = queryset.exclude(
+        pk__in=RenderedVersion.objects.using(using).filter(
+            renderer_version=RENDERER_VERSION
+        ).values("version_id")
+    ).select_related("article").order_by("pk")
+
+    last_id = 0
+    while True:
+        batch = list(stale.filter(pk__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1].pk
+        for version in batch:
+            _store(version, version.article.workspace_id)
+        done += len(batch)
+        if on_progress:
+            on_progress(done)
+    return done
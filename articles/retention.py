@@ -0,0 +1,156 @@
+"""
+Version history compaction.
+
+``compact_workspace`` applies a workspace's VersionRetentionPolicy in
+bounded batches of articles, each in its own short transaction, so the
+versions table is never locked for long and the job can be stopped and
+re-run at any point. Stored snapshots of pruned versions are deleted
+once no version on any shard refers to them.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from config.sharding import each_shard, shard_for
+from .models import Article, ArticleVersion, VersionRetentionPolicy
+from .storage import version_storage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 200
+
+
+def versions_to_prune(versions, policy, now=None):
+    """
+    Return the ids of ``versions`` (dicts for a single article) that no
+    rule of ``policy`` keeps.
+    """
+    if policy.keep_last is None and policy.daily_after_days is None:
+        return []
+
+    now = now or timezone.now()
+    ordered = sorted(versions, key=lambda v: v["version_number"], reverse=True)
+    keep = set()
+
+    if policy.keep_last is not None:
+        keep.update(v["id"] for v in ordered[:policy.keep_last])
+
+    if policy.daily_after_days is not None:
+        cutoff = now - timedelta(days=policy.daily_after_days)
+        seen_days = set()
+        for version in ordered:
+            if version["edited_at"] >= cutoff:
+                keep.add(version["id"])
+                continue
+            # newest version of each day is that day's snapshot
+            day = version["edited_at"].date()
+            if day not in seen_days:
+                seen_days.add(day)
+                keep.add(version["id"])
+
+    return [
+        v["id"] for v in ordered
+        if v["id"] not in keep
+        and not v["is_current"]
+        and not (policy.keep_with_summary and v["summary_length"])
+    ]
+
+
+def _delete_unused_files(names, doomed, dry_run=False):
+    """
+    Delete the stored snapshots in ``names`` that no version outside
+    ``doomed`` uses; cloned workspaces share their source's files, so
+    every shard is checked. Returns how many files that is.
+    """
+    unused = set(names)
+    kept = ArticleVersion.objects.filter(file__in=unused).exclude(pk__in=doomed)
+    for versions in each_shard(kept.values_list("file", flat=True)):
+        unused.difference_update(versions)
+
+    if not dry_run:
+        storage = version_storage()
+        for name in unused:
+            try:
+                storage.delete(name)
+            except Exception:
+                logger.warning("Could not delete version file %s", name, exc_info=True)
+    return len(unused)
+
+
+def compact_workspace(policy, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, pause=0):
+    """
+    Prune the workspace's version history according to ``policy``.
+
+    Returns a report with the number of articles scanned, versions deleted,
+    characters of title/content reclaimed and stored files deleted.
+    """
+    report = {
+        "workspace": policy.workspace_id,
+        "articles": 0,
+        "versions_deleted": 0,
+        "characters_reclaimed": 0,
+        "files_deleted": 0,
+    }
+    now = timezone.now()
+    using = shard_for(policy.workspace_id)
+    articles = Article.objects.using(using).filter(
+        workspace_id=policy.workspace_id
+    ).order_by("pk").values_list("pk", flat=True)
+
+    last_id = 0
+    while True:
+        article_ids = list(articles.filter(pk__gt=last_id)[:batch_size])
+        if not article_ids:
+            break
+        last_id = article_ids[-1]
+
+        rows = ArticleVersion.objects.using(using).filter(
+            article_id__in=article_ids
+        ).annotate(
+            summary_length=Length("change_summary"),
+            size=Length("title") + Length("content")
+        ).values(
+            "id", "article_id", "version_number", "edited_at",
+            "is_current", "summary_length", "size", "file"
+        )
+
+        by_article = {}
+        sizes = {}
+        files = {}
+        for row in rows:
+            by_article.setdefault(row["article_id"], []).append(row)
+            sizes[row["id"]] = row["size"] or 0
+            files[row["id"]] = row["file"]
+
+        doomed = []
+        for versions in by_article.values():
+            doomed.extend(versions_to_prune(versions, policy, now))
+
+        if doomed and not dry_run:
+            with transaction.atomic(using=using):
+                ArticleVersion.objects.using(using).filter(pk__in=doomed).delete()
+
+        report["articles"] += len(article_ids)
+        report["versions_deleted"] += len(doomed)
+        report["characters_reclaimed"] += sum(sizes[pk] for pk in doomed)
+
+        # After the rows are gone, so a failed delete never leaves a
+        # version pointing at a missing file
+        names = {files[pk] for pk in doomed if files[pk]}
+        if names:
+            report["files_deleted"] += _delete_unused_files(names, doomed, dry_run)
+
+        if pause:
+            time.sleep(pause)
+
+    return report
+
+
+def compact_all(batch_size=DEFAULT_BATCH_SIZE, dry_run=False, pause=0):
+    for policies in each_shard(VersionRetentionPolicy.objects.order_by("workspace_id")):
+        for policy in policies:
+            yield compact_workspace(policy, batch_size, dry_run, pause)
@@ -1,7 +1,15 @@
 from rest_framework import serializers
-from .models import Article
+from .models import Article, VersionRetentionPolicy
 
 class ArticleSerializer(serializers.ModelSerializer):
     class Meta:
         model = Article
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+        read_only_fields = ['current_version', 'title', 'excerpt']
+
+
+class VersionRetentionPolicySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = VersionRetentionPolicy
+        fields = ['workspace', 'keep_last', 'daily_after_days', 'keep_with_summary', 'updated_at']
+        read_only_fields = ['workspace', 'updated_at']
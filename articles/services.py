@@ -1,16 +1,52 @@
+import asyncio
+import json
+import logging
 import os
-from django.db.models import Max
+import re
+import time
+import uuid
+import weakref
+from urllib.parse import quote, urlencode
+
+from asgiref.sync import sync_to_async
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, router, transaction
 from django.utils import timezone
 from django.conf import settings
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
 
-from .models import ArticleVersion
+from config.metrics import counter, histogram
+from .merge import merge_version
+from .models import Article, ArticleVersion
+from .storage import DRIVE_SECONDS, DriveStorage, version_storage
+
+logger = logging.getLogger(__name__)
+
+VERSION_FILE_SECONDS = histogram(
+    'article_version_file_seconds',
+    'Time to write a version file, by storage backend.',
+    ['storage']
+)
+VERSION_TRANSACTION_SECONDS = histogram(
+    'article_version_transaction_seconds',
+    'Time a version save holds its transaction open.'
+)
+VERSIONS_CREATED = counter('article_versions_created_total', 'Article versions saved.')
+EDIT_RETRIES = counter(
+    'article_edit_retries_total',
+    'Edits merged again because another version was saved first.'
+)
+EDIT_CONFLICTS = counter(
+    'article_edit_conflicts_total',
+    'Edits rejected because they conflict with the current version.'
+)
 
 
 # ---------------- GOOGLE DRIVE CONFIG ---------------- #
 
+# google-auth and googleapiclient are imported on first use: together they
+# add ~100ms to every process that loads this module, and most never call
+# Drive. preload_drive_client() imports them up front (config.warmup).
+
 SCOPES = ['https://www.googleapis.com/auth/drive']
 
 SERVICE_ACCOUNT_FILE = os.path.join(
@@ -20,120 +56,427 @@ SERVICE_ACCOUNT_FILE = os.path.join(
 )
 
 
-def get_drive_service():
-    credentials = service_account.Credentials.from_service_account_file(
-        SERVICE_ACCOUNT_FILE,
-        scopes=SCOPES
-    )
+def preload_drive_client():
+    import google.auth.transport.requests  # noqa: F401
+    import google.oauth2.service_account  # noqa: F401
+    import httpx  # noqa: F401
 
-    service = build('drive', 'v3', credentials=credentials)
-    return service
 
+# ---------------- VERSION LOGIC + DRIVE ---------------- #
 
-def upload_file_to_drive(file_path, file_name, folder_id=None):
+EXCERPT_LENGTH = 300
+_TAG = re.compile(r"<[^>]+>")
 
-    service = get_drive_service()
 
-    file_metadata = {
-        'name': file_name
-    }
+def make_excerpt(content):
+    """The start of a version's text as one line, cut at a word."""
+    text = " ".join(_TAG.sub(" ", content).split())
+    if len(text) <= EXCERPT_LENGTH:
+        return text
+    return text[:EXCERPT_LENGTH - 1].rsplit(" ", 1)[0] + "…"
 
-    if folder_id:
-        file_metadata['parents'] = [folder_id]
 
-    media = MediaFileUpload(file_path, resumable=True)
+def current_version_fields(version):
+    """The Article fields that mirror its current version."""
+    if version is None:
+        return {"current_version": None, "title": "", "excerpt": ""}
+    return {
+        "current_version": version,
+        "title": version.title,
+        "excerpt": make_excerpt(version.content),
+    }
+
 
-    file = service.files().create(
-        body=file_metadata,
-        media_body=media,
-        fields='id, webViewLink'
-    ).execute()
+def refresh_current_versions(articles, batch_size=1000):
+    """
+    Recompute the current-version fields of ``articles`` (a queryset on
+    one database) from their versions. Returns how many were updated.
+    """
+    using = articles.db
+    articles = articles.order_by("pk").only("pk")
+    updated = 0
+    last_id = 0
+
+    while True:
+        batch = list(articles.filter(pk__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1].pk
+
+        current = {
+            version.article_id: version
+            for version in ArticleVersion.objects.using(using).filter(
+                article_id__in=[article.pk for article in batch],
+                is_current=True
+            ).only("pk", "article_id", "title", "content")
+        }
+        for article in batch:
+            for field, value in current_version_fields(current.get(article.pk)).items():
+                setattr(article, field, value)
+
+        Article.objects.using(using).bulk_update(
+            batch, ["current_version", "title", "excerpt"], batch_size=batch_size
+        )
+        updated += len(batch)
+    return updated
+
+
+def _version_file_name(article):
+    return f"versions/article_{article.id}_{uuid.uuid4().hex[:8]}.txt"
+
+
+def store_version_file(article, title, content, folder_id=None):
+    """
+    Save a version's text to the ``versions`` storage. Returns the
+    ArticleVersion fields that point at it.
+    """
+    storage = version_storage()
+    if isinstance(storage, DriveStorage) and folder_id:
+        storage = DriveStorage(folder_id=folder_id)
+
+    with VERSION_FILE_SECONDS.time(storage=type(storage).__name__):
+        name = storage.save(
+            _version_file_name(article),
+            ContentFile(f"Title: {title}\n\n{content}".encode("utf-8"))
+        )
+
+    stored = {"file": name}
+    if isinstance(storage, DriveStorage):
+        stored.update(drive_file_id=name, drive_link=storage.url(name))
+    return stored
+
+
+class EditConflict(Exception):
+    """
+    An edit could not be applied to the current version. ``conflicts``
+    lists the regions both sides changed (articles.merge).
+    """
+
+    def __init__(self, message, current=None, conflicts=()):
+        super().__init__(message)
+        self.current = current
+        self.conflicts = list(conflicts)
+
+
+# Merge-and-retry rounds before an edit gives up on a busy article
+MAX_EDIT_ATTEMPTS = 5
+
+
+def _current_version(article):
+    return (
+        article.versions.filter(is_current=True).first()
+        or article.versions.order_by('-version_number').first()
+    )
 
-    return file
 
+def _prepare_edit(article, title, content, base_version):
+    """
+    The version number to build on and the title and content to write:
+    the edit itself when ``base_version`` is current, else the edit merged
+    onto the current version. Raises EditConflict.
+    """
+    current = _current_version(article)
+    current_number = current.version_number if current else 0
+
+    if base_version is None or base_version == current_number:
+        return current_number, title, content
+
+    base = article.versions.filter(version_number=base_version).first()
+    if base is None:
+        EDIT_CONFLICTS.inc()
+        raise EditConflict(f"Version {base_version} does not exist", current)
+
+    title, content, conflicts = merge_version(base, current, title, content)
+    if conflicts:
+        EDIT_CONFLICTS.inc()
+        raise EditConflict(
+            f"Edit conflicts with version {current_number}", current, conflicts
+        )
+    return current_number, title, content
+
+
+def _discard_version_file(stored):
+    try:
+        version_storage().delete(stored['file'])
+    except Exception:
+        logger.warning("Could not delete unused version file %s", stored['file'], exc_info=True)
+
+
+def create_new_version(article, title, content, user, summary="", folder_id=None,
+                       base_version=None):
+    """
+    Save a new current version. ``base_version`` is the version number the
+    editor started from: newer versions are merged in (three-way), and
+    EditConflict is raised when both changed the same lines. Without it
+    the edit is applied to whatever is current.
+    """
+    for _ in range(MAX_EDIT_ATTEMPTS):
+        number, merged_title, merged_content = _prepare_edit(
+            article, title, content, base_version
+        )
+
+        # The upload holds no locks; the save below only succeeds if
+        # ``number`` is still current
+        stored = store_version_file(article, merged_title, merged_content, folder_id=folder_id)
+        version = _save_version(
+            article, number, merged_title, merged_content, user, summary, stored
+        )
+        if version is not None:
+            return version
+
+        # Someone saved first: merge against what they saved
+        EDIT_RETRIES.inc()
+        _discard_version_file(stored)
+        if base_version is None:
+            base_version = number
+
+    raise EditConflict("Too many concurrent edits, try again", _current_version(article))
 
-# ---------------- VERSION LOGIC + DRIVE ---------------- #
 
-def create_new_version(article, title, content, user, summary="", folder_id=None):
+# ------------------------------------------------------ #
 
-    # 1️⃣ Get latest version number
-    latest_version = article.versions.aggregate(
-        Max("version_number")
-    )["version_number__max"] or 0
+def update_article(article, title, content, user, folder_id=None, base_version=None):
+    return create_new_version(
+        article, title, content, user, folder_id=folder_id, base_version=base_version
+    )
 
-    # 2️⃣ Set old current version to False
-    article.versions.filter(is_current=True).update(is_current=False)
 
-    # 3️⃣ Create temporary file
-    file_name = f"{article.title}_v{latest_version + 1}.txt"
-    file_path = os.path.join(settings.MEDIA_ROOT, file_name)
+# ---------------- ASYNC DRIVE + VERSION LOGIC ---------------- #
 
-    with open(file_path, "w", encoding="utf-8") as f:
-        f.write(f"Title: {title}\n\n")
-        f.write(content)
+_credentials = None
+_http_clients = weakref.WeakKeyDictionary()
 
-    # 4️⃣ Upload to Drive
-    drive_response = upload_file_to_drive(
-        file_path=file_path,
-        file_name=file_name,
-        folder_id=folder_id
-    )
 
-    # 5️⃣ Save version in DB
-    version = ArticleVersion.objects.create(
-        article=article,
-        title=title,
-        content=content,
-        version_number=latest_version + 1,
-        edited_by=user,
-        is_current=True,
-        change_summary=summary,
-        drive_file_id=drive_response.get("id"),
-        drive_link=drive_response.get("webViewLink")
-    )
+def _drive_access_token():
+    """Blocking: refreshes the service-account token when it has expired."""
+    global _credentials
 
-    # 6️⃣ Update article timestamp
-    article.updated_at = timezone.now()
-    article.save()
+    if settings.DRIVE_API_TOKEN:
+        return settings.DRIVE_API_TOKEN
 
-    return version
+    if _credentials is None:
+        from google.oauth2 import service_account
 
+        _credentials = service_account.Credentials.from_service_account_file(
+            SERVICE_ACCOUNT_FILE,
+            scopes=SCOPES
+        )
 
-# ------------------------------------------------------ #
+    if not _credentials.valid:
+        from google.auth.transport.requests import Request
+        _credentials.refresh(Request())
 
-def update_article(article, title, content, user, folder_id=None):
+    return _credentials.token
 
-    latest_version = article.versions.aggregate(
-        Max('version_number')
-    )['version_number__max'] or 0
 
-    article.versions.filter(is_current=True).update(is_current=False)
+def _http_client():
+    # One pooled client per event loop; httpx clients cannot cross loops.
+    import httpx
 
-    file_name = f"{article.title}_v{latest_version + 1}.txt"
-    file_path = os.path.join(settings.MEDIA_ROOT, file_name)
+    loop = asyncio.get_running_loop()
+    client = _http_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(60.0, connect=10.0),
+            limits=httpx.Limits(max_connections=100)
+        )
+        _http_clients[loop] = client
+    return client
 
-    with open(file_path, "w", encoding="utf-8") as f:
-        f.write(f"Title: {title}\n\n")
-        f.write(content)
 
-    drive_response = upload_file_to_drive(
-        file_path=file_path,
-        file_name=file_name,
-        folder_id=folder_id
-    )
+def multipart_upload_body(file_name, content, folder_id=None, mime_type='text/plain'):
+    """``(body, content_type)`` for a Drive ``uploadType=multipart`` request."""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
 
-    version = ArticleVersion.objects.create(
-        article=article,
-        title=title,
-        content=content,
-        version_number=latest_version + 1,
-        edited_by=user,
-        is_current=True,
-        drive_file_id=drive_response.get("id"),
-        drive_link=drive_response.get("webViewLink")
-    )
+    metadata = {'name': file_name}
+    if folder_id:
+        metadata['parents'] = [folder_id]
+
+    boundary = uuid.uuid4().hex
+    body = b''.join([
+        f'--{boundary}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n'.encode(),
+        json.dumps(metadata).encode(),
+        f'\r\n--{boundary}\r\nContent-Type: {mime_type}\r\n\r\n'.encode(),
+        content,
+        f'\r\n--{boundary}--'.encode(),
+    ])
+    return body, f'multipart/related; boundary={boundary}'
+
+
+async def upload_content_to_drive_async(file_name, content, folder_id=None,
+                                        mime_type='text/plain'):
+    """
+    Upload ``content`` (str or bytes) to Drive without blocking the event
+    loop, using a single multipart request. Returns Drive's ``{id,
+    webViewLink}`` dict.
+    """
+    body, content_type = multipart_upload_body(file_name, content, folder_id, mime_type)
+    token = await sync_to_async(_drive_access_token, thread_sensitive=False)()
+
+    with DRIVE_SECONDS.time(call='upload_async'):
+        response = await _http_client().post(
+            f'{settings.DRIVE_API_URL}/upload/drive/v3/files',
+            params={'uploadType': 'multipart', 'fields': 'id, webViewLink'},
+            content=body,
+            headers={
+                'Authorization': f'Bearer {token}',
+                'Content-Type': content_type,
+            }
+        )
+    response.raise_for_status()
+    return response.json()
+
+
+DRIVE_BATCH_LIMIT = 100
+
+
+def _parse_batch_response(content_type, body):
+    """``{content_id: (status, json_body)}`` from a multipart/mixed batch reply."""
+    boundary = content_type.split('boundary=', 1)[1].split(';')[0].strip('"')
+    results = {}
+
+    for part in body.replace('\r\n', '\n').split(f'--{boundary}'):
+        head, _, inner = part.partition('\n\n')
+        match = re.search(r'Content-ID:\s*<response-([^>]+)>', head, re.IGNORECASE)
+        if match is None:
+            continue
+
+        status_line, _, rest = inner.strip().partition('\n')
+        _, _, payload = rest.partition('\n\n')
+        try:
+            data = json.loads(payload) if payload.strip() else {}
+        except ValueError:
+            data = {}
+        results[match.group(1)] = (int(status_line.split()[1]), data)
+
+    return results
+
+
+async def get_drive_files_batch_async(file_ids, fields='id, trashed, webViewLink'):
+    """
+    ``files.get`` for up to DRIVE_BATCH_LIMIT files in one HTTP round trip.
+    Returns ``[(status, body), ...]`` in the order of ``file_ids``; status
+    is None for calls missing from the reply.
+    """
+    if len(file_ids) > DRIVE_BATCH_LIMIT:
+        raise ValueError(f'Drive batches hold at most {DRIVE_BATCH_LIMIT} calls')
+
+    boundary = uuid.uuid4().hex
+    query = urlencode({'fields': fields, 'supportsAllDrives': 'true'})
+    body = ''.join(
+        f'--{boundary}\r\n'
+        'Content-Type: application/http\r\n'
+        f'Content-ID: <item{index}>\r\n\r\n'
+        f'GET /drive/v3/files/{quote(file_id, safe="")}?{query} HTTP/1.1\r\n\r\n'
+        for index, file_id in enumerate(file_ids)
+    ) + f'--{boundary}--'
+
+    token = await sync_to_async(_drive_access_token, thread_sensitive=False)()
+
+    with DRIVE_SECONDS.time(call='batch'):
+        response = await _http_client().post(
+            f'{settings.DRIVE_API_URL}/batch/drive/v3',
+            content=body.encode(),
+            headers={
+                'Authorization': f'Bearer {token}',
+                'Content-Type': f'multipart/mixed; boundary={boundary}',
+            }
+        )
+    response.raise_for_status()
+
+    results = _parse_batch_response(response.headers['Content-Type'], response.text)
+    return [results.get(f'item{index}', (None, {})) for index in range(len(file_ids))]
+
+
+def _save_version(article, base_number, title, content, user, summary, stored):
+    """
+    Insert version ``base_number + 1`` if ``base_number`` is still the
+    current version. Returns None when another editor got there first.
+    """
+    # The article's database, which is its workspace's shard
+    using = router.db_for_write(Article, instance=article)
+    versions = ArticleVersion.objects.using(using).filter(article_id=article.pk)
+
+    started = time.perf_counter()
+    try:
+        with transaction.atomic(using=using):
+            # Compare-and-set on the current flag instead of locking the
+            # article: only one editor can supersede a given version
+            superseded = versions.filter(
+                is_current=True, version_number=base_number
+            ).update(is_current=False, updated_at=timezone.now())
+            if not superseded and versions.filter(is_current=True).exists():
+                return None
+
+            version = ArticleVersion.objects.using(using).create(
+                article=article,
+                title=title,
+                content=content,
+                version_number=base_number + 1,
+                edited_by=user,
+                is_current=True,
+                change_summary=summary,
+                **stored
+            )
+
+            # In the same transaction, so the article never points at a
+            # version that was rolled back
+            fields = {**current_version_fields(version), 'updated_at': timezone.now()}
+            Article.objects.using(using).filter(pk=article.pk).update(**fields)
+    except IntegrityError:
+        # (article, version_number) is unique: a concurrent first version
+        return None
+    finally:
+        VERSION_TRANSACTION_SECONDS.observe(time.perf_counter() - started)
+
+    VERSIONS_CREATED.inc()
+    for field, value in fields.items():
+        setattr(article, field, value)
+    return version
 
-    article.updated_at = timezone.now()
-    article.save()
 
-    return version
\ No newline at end of file
+async def acreate_new_version(article, title, content, user, summary='', folder_id=None,
+                              base_version=None):
+    """
+    Async create_new_version. The upload happens first and holds no
+    database locks; the version is then saved in one short transaction if
+    nobody saved a version in the meantime.
+    """
+    for _ in range(MAX_EDIT_ATTEMPTS):
+        number, merged_title, merged_content = await sync_to_async(_prepare_edit)(
+            article, title, content, base_version
+        )
+
+        if isinstance(version_storage(), DriveStorage):
+            name = _version_file_name(article)
+            drive_response = await upload_content_to_drive_async(
+                file_name=os.path.basename(name),
+                content=f'Title: {merged_title}\n\n{merged_content}',
+                folder_id=folder_id
+            )
+            stored = {
+                'file': drive_response['id'],
+                'drive_file_id': drive_response['id'],
+                'drive_link': drive_response.get('webViewLink'),
+            }
+        else:
+            stored = await sync_to_async(store_version_file, thread_sensitive=False)(
+                article, merged_title, merged_content
+            )
+
+        version = await sync_to_async(_save_version)(
+            article, number, merged_title, merged_content, user, summary, stored
+        )
+        if version is not None:
+            return version
+
+        EDIT_RETRIES.inc()
+        await sync_to_async(_discard_version_file, thread_sensitive=False)(stored)
+        if base_version is None:
+            base_version = number
+
+    raise EditConflict(
+        "Too many concurrent edits, try again",
+        await sync_to_async(_current_version)(article)
+    )
@@ -0,0 +1,91 @@
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from apps.workspaces.activity import record_activity
+from apps.workspaces.models import ActivityEvent
+from apps.workspaces.sharding import mirror_reference_row
+from .models import Article, ArticleVersion, Document, DocumentExtraction, Tag
+from .rendering import render_new_version
+from .typeahead import ARTICLE, TAG, typeahead_index
+
+
+@receiver(post_save, sender=ArticleVersion)
+def version_saved(sender, instance, created, using, **kwargs):
+    # The version's own database: it may be a workspace shard
+    if created and instance.is_current:
+        from .similarity import index_version
+
+        transaction.on_commit(lambda: index_version(instance), using=using)
+        if instance.article.archived_at is None:
+            transaction.on_commit(lambda: typeahead_index.update(
+                instance.article.workspace_id, ARTICLE, instance.article_id, instance.title
+            ), using=using)
+        transaction.on_commit(
+            lambda: render_new_version(instance, instance.article.workspace_id),
+            using=using
+        )
+
+    if created:
+        record_activity(
+            instance.article.workspace_id,
+            ActivityEvent.Verb.VERSION_CREATED,
+            "article",
+            instance.article_id,
+            actor=instance.edited_by_id,
+            using=using,
+            version=instance.version_number,
+            title=instance.title
+        )
+
+
+@receiver(post_save, sender=Article)
+def article_saved(sender, instance, using, **kwargs):
+    if instance.archived_at is not None:
+        from .similarity import forget_article
+
+        transaction.on_commit(lambda: forget_article(instance), using=using)
+        transaction.on_commit(lambda: typeahead_index.remove(
+            instance.workspace_id, ARTICLE, instance.pk
+        ), using=using)
+
+
+@receiver(post_delete, sender=Article)
+def article_deleted(sender, instance, using, **kwargs):
+    from .similarity import forget_article
+
+    typeahead_index.remove(instance.workspace_id, ARTICLE, instance.pk)
+    transaction.on_commit(lambda: forget_article(instance), using=using)
+
+
+@receiver(m2m_changed, sender=Article.tags.through)
+def article_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != "post_add" or reverse:
+        return
+    for tag in Tag.objects.filter(pk__in=pk_set):
+        typeahead_index.update(instance.workspace_id, TAG, tag.pk, tag.name)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, instance, using, **kwargs):
+    # Renamed or deleted tags disappear; renamed ones return on the next rebuild
+    typeahead_index.remove_everywhere(TAG, instance.pk)
+
+    # Tags are written to default and copied to every workspace shard
+    if using == DEFAULT_DB_ALIAS:
+        mirror_reference_row(instance, deleted=kwargs["signal"] is post_delete)
+
+
+@receiver(post_save, sender=Document)
+def document_saved(sender, instance, created, using, **kwargs):
+    # Queue text extraction once the document row is committed
+    if created:
+        from .extraction import enqueue
+
+        transaction.on_commit(lambda: enqueue(instance), using=using)
+
+
+@receiver(post_delete, sender=Document)
+def document_deleted(sender, instance, **kwargs):
+    DocumentExtraction.objects.filter(document_id=instance.pk).delete()
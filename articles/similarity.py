@@ -0,0 +1,262 @@
+"""
+Related-articles index.
+
+Each article's current version is reduced to a MinHash signature over its
+word 3-gram shingles (stored in ArticleSignature). Signatures are updated
+incrementally whenever a new current version is saved, and dropped when
+the article is archived or deleted. Queries compare one
+signature against the whole workspace as a single NumPy operation, which
+estimates the Jaccard similarity of every article at once.
+
+Each process keeps a signature matrix per workspace and only re-reads rows
+whose ``updated_at`` moved since it last looked, so a query costs one small
+"what changed" query plus the vector math. Rows dropped by another
+process are found when a query returns an article that no longer
+qualifies, and removed from this process's matrix then.
+"""
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from config.sharding import each_shard, use_workspace
+from .models import Article, ArticleSignature, ArticleVersion
+
+
+NUM_PERMUTATIONS = 128
+SHINGLE_SIZE = 3
+MAX_CACHED_WORKSPACES = 64
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint32(0xFFFFFFFF)
+
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, 1 << 32, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.randint(0, 1 << 32, size=NUM_PERMUTATIONS, dtype=np.uint64)
+
+_WORD = re.compile(r"\w+")
+
+
+# ---------------- SIGNATURES ---------------- #
+
+def shingles(text):
+    words = _WORD.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {
+        " ".join(words[i:i + SHINGLE_SIZE])
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+
+def minhash(text):
+    """MinHash signature (``NUM_PERMUTATIONS`` uint32 values) of ``text``."""
+    tokens = shingles(text)
+    if not tokens:
+        return np.full(NUM_PERMUTATIONS, _MAX_HASH, dtype=np.uint32)
+
+    hashes = np.fromiter(
+        (zlib.crc32(token.encode()) for token in tokens),
+        dtype=np.uint64,
+        count=len(tokens)
+    )
+    # (permutations x shingles) universal hashes, min over shingles
+    permuted = (np.outer(_A, hashes) + _B[:, None]) % _MERSENNE_PRIME
+    return (permuted & np.uint64(_MAX_HASH)).min(axis=1).astype(np.uint32)
+
+
+def signature_for(article, version):
+    return ArticleSignature(
+        article_id=article.pk,
+        workspace_id=article.workspace_id,
+        version_number=version.version_number,
+        minhash=minhash(f"{version.title}\n{version.content}").astype("<u4").tobytes()
+    )
+
+
+def save_signatures(signatures, using=None):
+    ArticleSignature.objects.db_manager(using).bulk_create(
+        signatures,
+        update_conflicts=True,
+        unique_fields=["article"],
+        update_fields=["workspace", "version_number", "minhash", "updated_at"]
+    )
+
+
+def index_version(version):
+    """Refresh the signature of ``version``'s article (call after commit)."""
+    article = version.article
+    if article.archived_at is not None:
+        return
+    with use_workspace(article.workspace_id):
+        save_signatures([signature_for(article, version)])
+    _index.patch(article.workspace_id)
+
+
+def forget_article(article):
+    """Drop an archived or deleted article from the index (call after commit)."""
+    with use_workspace(article.workspace_id):
+        ArticleSignature.objects.filter(article_id=article.pk).delete()
+    _index.remove(article.workspace_id, [article.pk])
+
+
+def rebuild(workspace_id=None, batch_size=500):
+    """Compute signatures for every current version. Returns the count."""
+    versions = ArticleVersion.objects.filter(
+        is_current=True,
+        article__archived_at__isnull=True
+    ).select_related("article").order_by("pk")
+    if workspace_id is not None:
+        versions = versions.filter(article__workspace_id=workspace_id)
+
+    count = 0
+    for shard_versions in each_shard(versions):
+        using = shard_versions.db
+        last_id = 0
+        while True:
+            batch = list(shard_versions.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].pk
+
+            with transaction.atomic(using=using):
+                save_signatures([signature_for(v.article, v) for v in batch], using)
+            count += len(batch)
+
+    return count
+
+
+# ---------------- IN-PROCESS INDEX ---------------- #
+
+class _WorkspaceIndex:
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.matrix = np.empty((0, NUM_PERMUTATIONS), dtype=np.uint32)
+        self.positions = {}
+        self.loaded_at = None
+
+    def apply(self, rows):
+        appended_ids = []
+        appended = []
+        for article_id, blob in rows:
+            signature = np.frombuffer(bytes(blob), dtype="<u4")
+            position = self.positions.get(article_id)
+            if position is None:
+                self.positions[article_id] = len(self.ids) + len(appended_ids)
+                appended_ids.append(article_id)
+                appended.append(signature)
+            else:
+                self.matrix[position] = signature
+
+        if appended:
+            self.ids = np.concatenate([self.ids, np.asarray(appended_ids, dtype=np.int64)])
+            self.matrix = np.vstack([self.matrix, np.stack(appended)])
+
+    def remove(self, article_ids):
+        gone = [self.positions[pk] for pk in article_ids if pk in self.positions]
+        if not gone:
+            return
+        # New arrays: queries may still be reading the old ones
+        keep = np.ones(len(self.ids), dtype=bool)
+        keep[gone] = False
+        self.ids = self.ids[keep]
+        self.matrix = self.matrix[keep]
+        self.positions = {int(pk): position for position, pk in enumerate(self.ids)}
+
+
+class SimilarityIndex:
+    """Per-process LRU of workspace signature matrices."""
+
+    def __init__(self, max_workspaces=MAX_CACHED_WORKSPACES):
+        self.max_workspaces = max_workspaces
+        self.workspaces = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _refresh(self, workspace_id):
+        entry = self.workspaces.get(workspace_id)
+        if entry is None:
+            entry = _WorkspaceIndex()
+
+        # Rows touched since the last load; the timestamp is taken first so
+        # writes racing with the read are picked up next time.
+        now = timezone.now()
+        rows = ArticleSignature.objects.filter(workspace_id=workspace_id)
+        if entry.loaded_at is not None:
+            rows = rows.filter(updated_at__gte=entry.loaded_at)
+        with use_workspace(workspace_id):
+            entry.apply(rows.values_list("article_id", "minhash").iterator())
+        entry.loaded_at = now
+
+        self.workspaces[workspace_id] = entry
+        self.workspaces.move_to_end(workspace_id)
+        while len(self.workspaces) > self.max_workspaces:
+            self.workspaces.popitem(last=False)
+        return entry
+
+    def patch(self, workspace_id):
+        with self.lock:
+            if workspace_id in self.workspaces:
+                self._refresh(workspace_id)
+
+    def remove(self, workspace_id, article_ids):
+        with self.lock:
+            entry = self.workspaces.get(workspace_id)
+            if entry is not None:
+                entry.remove(article_ids)
+
+    def related(self, article, limit=10, min_score=0.05):
+        """``[(article_id, score)]`` most similar to ``article``, best first."""
+        with self.lock:
+            entry = self._refresh(article.workspace_id)
+            position = entry.positions.get(article.pk)
+            if position is None:
+                return []
+            ids, matrix = entry.ids, entry.matrix
+
+        # Fraction of equal MinHash slots estimates Jaccard similarity
+        scores = (matrix == matrix[position]).mean(axis=1)
+        scores[position] = -1.0
+
+        k = min(limit, len(scores) - 1)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [
+            (int(ids[i]), round(float(scores[i]), 4))
+            for i in top
+            if scores[i] >= min_score
+        ]
+
+
+_index = SimilarityIndex()
+
+
+def related_articles(article, limit=10):
+    """Related articles with their current titles (deleted ones drop out)."""
+    matches = _index.related(article, limit=limit)
+    with use_workspace(article.workspace_id):
+        titles = dict(
+            Article.objects.filter(
+                pk__in=[article_id for article_id, _ in matches],
+                current_version__isnull=False,
+                archived_at__isnull=True
+            ).values_list("pk", "title")
+        )
+
+    # Archived or deleted through another process
+    gone = [article_id for article_id, _ in matches if article_id not in titles]
+    if gone:
+        _index.remove(article.workspace_id, gone)
+
+    return [
+        {"article_id": article_id, "title": titles[article_id], "score": score}
+        for article_id, score in matches
+        if article_id in titles
+    ]
@@ -0,0 +1,275 @@
+"""
+File storage for documents and version snapshots.
+
+Two storage aliases in settings.STORAGES, ``documents`` and ``versions``,
+are each backed by the local filesystem (FileSystemStorage) or Google
+Drive (DriveStorage below); DOCUMENT_STORAGE / VERSION_STORAGE pick one.
+
+``serve_file`` turns a stored file into a download response. When the
+front-end server can read the file itself (STORAGE_ACCEL_REDIRECT) it is
+handed off with X-Accel-Redirect. Otherwise local files go out as a
+FileResponse, which the WSGI server sends with sendfile() for whole files,
+and Drive files are streamed through. Single byte ranges get a 206.
+"""
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import Storage, storages
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.deconstruct import deconstructible
+from django.utils.http import content_disposition_header
+
+from config.metrics import histogram
+
+DOCUMENTS = "documents"
+VERSIONS = "versions"
+
+STREAM_CHUNK_SIZE = 64 * 1024
+# Drive downloads larger than this spill from memory to a temporary file
+SPOOL_SIZE = 8 * 1024 * 1024
+DRIVE_VIEW_URL = "https://drive.google.com/file/d/{}/view"
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+_client = None
+_client_lock = threading.Lock()
+
+DRIVE_SECONDS = histogram(
+    "drive_request_duration_seconds",
+    "Google Drive API round trips, by call.",
+    ["call"]
+)
+
+
+def document_storage():
+    return storages[DOCUMENTS]
+
+
+def version_storage():
+    return storages[VERSIONS]
+
+
+# ---------------- DRIVE BACKEND ---------------- #
+
+def _http():
+    global _client
+    import httpx
+
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(timeout=httpx.Timeout(60.0, connect=10.0))
+    return _client
+
+
+@deconstructible
+class DriveStorage(Storage):
+    """Stores files in Google Drive. A stored file's name is its Drive id."""
+
+    def __init__(self, folder_id=None):
+        self.folder_id = folder_id
+
+    def _request(self, method, path, **kwargs):
+        from .services import _drive_access_token
+
+        headers = {"Authorization": f"Bearer {_drive_access_token()}", **kwargs.pop("headers", {})}
+        return _http().request(method, f"{settings.DRIVE_API_URL}{path}", headers=headers, **kwargs)
+
+    def _metadata(self, name, fields):
+        response = self._request("GET", f"/drive/v3/files/{quote(name, safe='')}", params={
+            "fields": fields,
+            "supportsAllDrives": "true",
+        })
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def get_available_name(self, name, max_length=None):
+        # Drive allows duplicate names, and the id _save returns is unique
+        return name
+
+    def _save(self, name, content):
+        from .services import multipart_upload_body
+
+        content.seek(0)
+        mime_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        body, content_type = multipart_upload_body(
+            os.path.basename(name), content.read(), self.folder_id, mime_type
+        )
+        with DRIVE_SECONDS.time(call="upload"):
+            response = self._request(
+                "POST", "/upload/drive/v3/files",
+                params={"uploadType": "multipart", "fields": "id"},
+                content=body,
+                headers={"Content-Type": content_type}
+            )
+        response.raise_for_status()
+        return response.json()["id"]
+
+    def _open(self, name, mode="rb"):
+        spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        with DRIVE_SECONDS.time(call="download"):
+            for chunk in self.stream(name):
+                spooled.write(chunk)
+        spooled.seek(0)
+        return File(spooled, name=name)
+
+    def stream(self, name, start=None, end=None):
+        """Yield the file's bytes, or bytes ``start``-``end`` inclusive."""
+        from .services import _drive_access_token
+
+        headers = {"Authorization": f"Bearer {_drive_access_token()}"}
+        if start is not None:
+            headers["Range"] = f"bytes={start}-{end}"
+
+        with _http().stream(
+            "GET",
+            f"{settings.DRIVE_API_URL}/drive/v3/files/{quote(name, safe='')}",
+            params={"alt": "media", "supportsAllDrives": "true"},
+            headers=headers
+        ) as response:
+            response.raise_for_status()
+            yield from response.iter_bytes(STREAM_CHUNK_SIZE)
+
+    def delete(self, name):
+        response = self._request("DELETE", f"/drive/v3/files/{quote(name, safe='')}")
+        if response.status_code != 404:
+            response.raise_for_status()
+
+    def exists(self, name):
+        metadata = self._metadata(name, "id, trashed")
+        return metadata is not None and not metadata.get("trashed")
+
+    def size(self, name):
+        metadata = self._metadata(name, "size")
+        if metadata is None:
+            raise FileNotFoundError(name)
+        return int(metadata.get("size", 0))
+
+    def url(self, name):
+        return DRIVE_VIEW_URL.format(name)
+
+
+# ---------------- DOWNLOADS ---------------- #
+
+class _FileRange:
+    """Read-only view of ``length`` bytes of ``file`` starting at ``start``."""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    ``(start, end)`` (inclusive) for a single byte range, None to send the
+    whole file (no header, or several ranges), False if unsatisfiable.
+    """
+    match = _RANGE.match(header.strip()) if header else None
+    if match is None:
+        return None
+
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # Suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _has_path(storage, name):
+    try:
+        storage.path(name)
+    except NotImplementedError:
+        return False
+    return True
+
+
+def serve_file(request, alias, name, filename=None, content_type=None):
+    """Download response for ``name`` in the ``alias`` storage."""
+    storage = storages[alias]
+    filename = filename or os.path.basename(name)
+    content_type = content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    local = _has_path(storage, name)
+
+    accel = getattr(settings, "STORAGE_ACCEL_REDIRECT", {}).get(alias)
+    if accel and local:
+        # nginx serves the bytes, Range requests included
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = accel.rstrip("/") + "/" + quote(name)
+        response["Content-Disposition"] = content_disposition_header(True, filename)
+        return response
+
+    try:
+        size = os.path.getsize(storage.path(name)) if local else storage.size(name)
+    except FileNotFoundError:
+        return HttpResponse(status=404)
+
+    # No ETag / Last-Modified is sent, so an If-Range validator never matches
+    byte_range = None if "HTTP_IF_RANGE" in request.META else parse_range(
+        request.META.get("HTTP_RANGE"), size
+    )
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    if byte_range is None:
+        if local:
+            # FileResponse hands the open file to wsgi.file_wrapper (sendfile)
+            response = FileResponse(
+                open(storage.path(name), "rb"),
+                as_attachment=True,
+                filename=filename,
+                content_type=content_type
+            )
+        else:
+            response = StreamingHttpResponse(storage.stream(name), content_type=content_type)
+            response["Content-Disposition"] = content_disposition_header(True, filename)
+        response["Content-Length"] = str(size)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        if local:
+            response = FileResponse(
+                _FileRange(open(storage.path(name), "rb"), start, length),
+                as_attachment=True,
+                filename=filename,
+                content_type=content_type,
+                status=206
+            )
+        else:
+            response = StreamingHttpResponse(
+                storage.stream(name, start, end), content_type=content_type, status=206
+            )
+            response["Content-Disposition"] = content_disposition_header(True, filename)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(length)
+
+    response["Accept-Ranges"] = "bytes"
+    return response
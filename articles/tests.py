@@ -1,3 +1,878 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from html.parser import HTMLParser
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.users.authentication import WorkspaceRefreshToken
+from apps.workspaces.models import Workspace
+from config import metrics
+from config.profiling import QueryProfilingMiddleware, assert_max_queries
+from config.sharding import all_aliases
+from . import analytics, drive_reconcile, extraction, rendering, services, similarity, views
+from .fake_drive import FakeDriveServer
+from .merge import merge_lines
+from .models import (
+    Article, ArticleDailyViews, ArticleVersion, Document, DocumentExtraction, DriveReconcileRun,
+    ReadRanking, RenderedVersion, Tag, VersionRetentionPolicy
+)
+from .retention import compact_workspace
+from .storage import DRIVE_SECONDS, DriveStorage, version_storage
+from .typeahead import ARTICLE, TypeaheadIndex
+
+User = get_user_model()
+
+IN_MEMORY_VERSIONS = {
+    **settings.STORAGES,
+    "versions": {"BACKEND": "django.core.files.storage.InMemoryStorage"},
+}
+
+BASE = "intro\nmiddle\nend\n"
+
+
+class MergeLinesTests(SimpleTestCase):
+
+    def test_separate_changes_are_combined(self):
+        merged, conflicts = merge_lines(BASE, "intro\nmiddle\nyour end\n", "new intro\nmiddle\nend\n")
+        self.assertEqual(merged, "new intro\nmiddle\nyour end\n")
+        self.assertEqual(conflicts, [])
+
+    def test_same_line_changed_on_both_sides_conflicts(self):
+        merged, conflicts = merge_lines(BASE, "intro\nmiddle\nyour end\n", "intro\nmiddle\ntheir end\n")
+        # The current text is kept for the conflicting region
+        self.assertEqual(merged, "intro\nmiddle\ntheir end\n")
+        self.assertEqual(len(conflicts), 1)
+        self.assertEqual(conflicts[0]["yours"], "your end\n")
+        self.assertEqual(conflicts[0]["current"], "their end\n")
+
+
+@override_settings(STORAGES=IN_MEMORY_VERSIONS)
+class CreateNewVersionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("owner", "owner@example.com", "password")
+        self.workspace = Workspace.objects.create(name="Docs", created_by=self.user)
+        self.article = Article.objects.create(workspace=self.workspace, created_by=self.user)
+        services.create_new_version(self.article, "Title", BASE, self.user)
+
+    def test_editor_who_loses_the_race_is_merged_and_retried(self):
+        store_version_file = services.store_version_file
+        raced = []
+
+        def other_editor_saves_first(article, title, content, folder_id=None):
+            stored = store_version_file(article, title, content, folder_id=folder_id)
+            if not raced:
+                # The other editor's version lands while this one is uploading
+                raced.append(None)
+                raced[0] = services.create_new_version(
+                    Article.objects.get(pk=article.pk), "Title",
+                    "their intro\nmiddle\nend\n", self.user, base_version=1
+                )
+            return stored
+
+        with mock.patch.object(services, "store_version_file", side_effect=other_editor_saves_first):
+            version = services.create_new_version(
+                self.article, "Title", "intro\nmiddle\nyour end\n", self.user, base_version=1
+            )
+
+        self.assertEqual(raced[0].version_number, 2)
+        self.assertEqual(version.version_number, 3)
+        self.assertEqual(version.content, "their intro\nmiddle\nyour end\n")
+        self.assertEqual(
+            list(self.article.versions.filter(is_current=True).values_list("version_number", flat=True)),
+            [3]
+        )
+
+    def test_conflicting_edit_is_refused(self):
+        services.create_new_version(self.article, "Title", "intro\nmiddle\ntheir end\n", self.user)
+        with self.assertRaises(services.EditConflict) as raised:
+            services.create_new_version(
+                self.article, "Title", "intro\nmiddle\nyour end\n", self.user, base_version=1
+            )
+        self.assertEqual(raised.exception.current.version_number, 2)
+        self.assertEqual(self.article.versions.count(), 2)
+
+    def test_stale_edit_returns_409_with_the_conflicts(self):
+        services.create_new_version(self.article, "Title", "intro\nmiddle\ntheir end\n", self.user)
+        token = WorkspaceRefreshToken.for_user(self.user).access_token
+
+        response = self.client.post(
+            f"/api/articles/async/{self.article.pk}/versions/",
+            data=json.dumps({"title": "Title", "content": "intro\nmiddle\nyour end\n", "base_version": 1}),
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {token}"
+        )
+
+        self.assertEqual(response.status_code, 409)
+        body = response.json()
+        self.assertEqual(body["current_version"]["version_number"], 2)
+        self.assertEqual(body["current_version"]["content"], "intro\nmiddle\ntheir end\n")
+        self.assertEqual([c["field"] for c in body["conflicts"]], ["content"])
+        self.assertEqual(self.article.versions.count(), 2)
+
+
+@override_settings(STORAGES=IN_MEMORY_VERSIONS)
+class BackfillCurrentVersionsTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user("owner", "owner@example.com", "password")
+        self.workspace = Workspace.objects.create(name="Docs", created_by=self.user)
+        self.article = Article.objects.create(workspace=self.workspace, created_by=self.user)
+        for number in range(2):
+            services.create_new_version(self.article, f"Title {number}", f"Text {number}", self.user)
+        self.empty = Article.objects.create(workspace=self.workspace, created_by=self.user)
+
+    def backfill(self, *args):
+        call_command("backfill_current_versions", *args, stdout=StringIO())
+
+    def test_missing_pointers_are_filled_in(self):
+        Article.objects.update(current_version=None, title="", excerpt="")
+
+        self.backfill("--batch-size", "1")
+
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.current_version.version_number, 2)
+        self.assertEqual((self.article.title, self.article.excerpt), ("Title 1", "Text 1"))
+        self.empty.refresh_from_db()
+        self.assertIsNone(self.empty.current_version)
+
+    def test_workspace_option_limits_the_backfill(self):
+        other = Workspace.objects.create(name="Other", created_by=self.user)
+        elsewhere = Article.objects.create(workspace=other, created_by=self.user)
+        services.create_new_version(elsewhere, "Elsewhere", "", self.user)
+        Article.objects.update(current_version=None, title="")
+
+        self.backfill("--workspace", str(other.pk))
+
+        self.assertEqual(
+            dict(Article.objects.values_list("pk", "title")),
+            {self.article.pk: "", self.empty.pk: "", elsewhere.pk: "Elsewhere"}
+        )
+
+
+@override_settings(STORAGES=IN_MEMORY_VERSIONS)
+class CompactWorkspaceTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user("owner", "owner@example.com", "password")
+        self.workspace = Workspace.objects.create(name="Docs", created_by=self.user)
+        self.article = Article.objects.create(workspace=self.workspace, created_by=self.user)
+        self.versions = [
+            services.create_new_version(self.article, "Title", f"draft {number}", self.user)
+            for number in range(3)
+        ]
+        self.policy = VersionRetentionPolicy.objects.create(workspace=self.workspace, keep_last=1)
+
+    def test_pruned_files_are_deleted_unless_another_version_uses_them(self):
+        first, second, _ = self.versions
+        # A clone shares the first version's file
+        other = Workspace.objects.create(name="Copy", created_by=self.user)
+        ArticleVersion.objects.create(
+            article=Article.objects.create(workspace=other, created_by=self.user),
+            version_number=1, title="Title", content="draft 0", file=first.file.name
+        )
+
+        report = compact_workspace(self.policy)
+
+        self.assertEqual(report["versions_deleted"], 2)
+        self.assertEqual(report["characters_reclaimed"], 2 * len("Titledraft 0"))
+        self.assertEqual(report["files_deleted"], 1)
+        self.assertTrue(version_storage().exists(first.file.name))
+        self.assertFalse(version_storage().exists(second.file.name))
+
+    def test_dry_run_keeps_the_files(self):
+        report = compact_workspace(self.policy, dry_run=True)
+
+        self.assertEqual(report["files_deleted"], 2)
+        self.assertTrue(all(version_storage().exists(v.file.name) for v in self.versions))
+        self.assertEqual(self.article.versions.count(), 3)
+
+
+@override_settings(STORAGES=IN_MEMORY_VERSIONS)
+class RelatedArticlesTests(TestCase):
+
+    def setUp(self):
+        similarity._index.workspaces.clear()
+        self.user = User.objects.create_user("owner", "owner@example.com", "password")
+        self.workspace = Workspace.objects.create(name="Docs", created_by=self.user)
+        self.articles = [self.article_with(f"Guide {n}") for n in range(3)]
+
+    def article_with(self, title):
+        article = Article.objects.create(workspace=self.workspace, created_by=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            services.create_new_version(
+                article, title, "how to deploy the service to production safely", self.user
+            )
+        return article
+
+    def related_ids(self):
+        return [r["article_id"] for r in similarity.related_articles(self.articles[0])]
+
+    def indexed_ids(self):
+        return set(similarity._index.workspaces[self.workspace.pk].positions)
+
+    def test_archived_and_deleted_articles_leave_the_index(self):
+        first, archived, deleted = self.articles
+        self.assertEqual(sorted(self.related_ids()), [archived.pk, deleted.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            archived.archive()
+        with self.captureOnCommitCallbacks(execute=True):
+            deleted.delete()
+
+        self.assertEqual(self.related_ids(), [])
+        self.assertEqual(self.indexed_ids(), {first.pk})
+
+    def test_rows_dropped_elsewhere_are_removed_when_found(self):
+        first, archived, _ = self.articles
+        self.related_ids()  # loads the workspace
+        # As another process would: this one's matrix is not told
+        Article.objects.filter(pk=archived.pk).update(archived_at=timezone.now())
+
+        self.assertNotIn(archived.pk, self.related_ids())
+        self.assertNotIn(archived.pk, self.indexed_ids())
+
+
+class _Markup(HTMLParser):
+    """Every (tag, attributes) pair in a piece of HTML."""
+
+    def __init__(self, markup):
+        super().__init__()
+        self.elements = []
+        self.feed(markup)
+        self.close()
+
+    def handle_starttag(self, tag, attrs):
+        self.elements.append((tag, dict(attrs)))
+
+
+class SanitizerTests(SimpleTestCase):
+
+    PAYLOADS = [
+        '<script>alert(1)</script>',
+        '<img src=x onerror=alert(1)>',
+        '<p onclick="alert(1)">hi</p>',
+        '<a href="javascript:alert(1)">x</a>',
+        '<a href=" JaVaScRiPt:alert(1)">x</a>',
+        '<a href="java&#x09;script:alert(1)">x</a>',
+        '<a href="&#106;avascript:alert(1)">x</a>',
+        '<a href="data:text/html,alert(1)">x</a>',
+        '<a href="https://example.com" title="&quot; onmouseover=alert(1)">x</a>',
+        '<svg onload=alert(1)><circle/></svg>',
+        '<math><mi xlink:href="javascript:alert(1)">m</mi></math>',
+        '<p><iframe src="//example.com"></iframe></p>',
+        '<div style="background:url(javascript:alert(1))">s</div>',
+        '<scr<script>ipt>alert(1)</script>',
+        '<!-- <script>alert(1)</script> -->',
+        '<table><tr><td colspan="2" onmouseover="alert(1)">c</td></tr></table>',
+    ]
+
+    def test_payloads_leave_only_allowed_markup(self):
+        for payload in self.PAYLOADS:
+            with self.subTest(payload=payload):
+                for tag, attrs in _Markup(rendering.sanitize(payload)).elements:
+                    self.assertIn(tag, rendering.ALLOWED_TAGS)
+                    allowed = rendering.ALLOWED_ATTRIBUTES.get(tag, set()) | {"rel"}
+                    self.assertLessEqual(set(attrs), allowed)
+                    if "href" in attrs:
+                        self.assertTrue(attrs["href"].startswith("https:"))
+
+    def test_markdown_links_are_checked_too(self):
+        self.assertEqual(rendering.render("[x](JavaScript:alert(1))"), "<p>x</p>")
+        self.assertEqual(
+            rendering.render("<p>[x](https://example.com) <b>kept</b></p>"),
+            "<p>[x](https://example.com) <b>kept</b></p>"
+        )
+        self.assertEqual(
+            rendering.render("[x](https://example.com)"),
+            '<p><a href="https://example.com" rel="nofollow noopener">x</a></p>'
+        )
+
+
+@override_settings(STORAGES=IN_MEMORY_VERSIONS, RENDER_AFTER_SAVE="inline")
+class RenderedVersionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("owner", "owner@example.com", "password")
+        self.workspace = Workspace.objects.create(name="Docs", created_by=self.user)
+        self.article = Article.objects.create(workspace=self.workspace, created_by=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def edit(self, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return services.create_new_version(self.article, "Title", content, self.user)
+
+    def html(self, version):
+        url = f"/api/articles/{self.article.pk}/versions/{version.version_number}/html/"
+        return self.client.get(url).data["html"]
+
+    def test_each_new_version_is_rendered_when_it_is_saved(self):
+        first = self.edit("# First")
+        second = self.edit("# Second <script>alert(1)</script>")
+
+        stored = dict(RenderedVersion.objects.values_list("version_id", "html"))
+        self.assertEqual(stored[first.pk], "<h1>First</h1>")
+        self.assertEqual(stored[second.pk], "<h1>Second &lt;script&gt;alert(1)&lt;/script&gt;</h1>")
+        self.assertEqual(self.html(first), "<h1>First</h1>")
+        self.assertEqual(self.html(second), stored[second.pk])
+
+    def test_a_new_renderer_redoes_old_renderings_on_read(self):
+        version = self.edit("*old*")
+        RenderedVersion.objects.filter(version=version).update(html="<p>stale</p>")
+        cache.clear()
+        self.assertEqual(self.html(version), "<p>stale</p>")
+
+        with mock.patch.object(rendering, "RENDERER_VERSION", rendering.RENDERER_VERSION + 1):
+            self.assertEqual(self.html(version), "<p><em>old</em></p>")
+            stored = RenderedVersion.objects.get(version=version)
+        self.assertEqual(stored.renderer_version, rendering.RENDERER_VERSION + 1)
+
+    @override_settings(RENDER_AFTER_SAVE="off")
+    def test_off_leaves_rendering_to_the_first_read(self):
+        version = self.edit("text")
+        self.assertFalse(RenderedVersion.objects.exists())
+        self.assertEqual(self.html(version), "<p>text</p>")
+        self.assertTrue(RenderedVersion.objects.filter(version=version).exists())
+
+    @mock.patch.object(rendering, "RETRY_DELAY", 0)
+    @mock.patch.object(rendering, "close_old_connections")
+    def test_background_job_retries_while_the_database_is_locked(self, _):
+        with override_settings(RENDER_AFTER_SAVE="off"):
+            version = self.edit("text")
+        store = rendering._store
+        calls = []
+
+        def locked_once(*args):
+            calls.append(args)
+            if len(calls) == 1:
+                raise OperationalError("database is locked")
+            return store(*args)
+
+        with mock.patch.object(rendering, "_store", side_effect=locked_once):
+            rendering._render_job(version.pk, "default", self.workspace.pk)
+
+        self.assertEqual(len(calls), 2)
+        self.assertTrue(RenderedVersion.objects.filter(version=version).exists())
+
+
+@override_settings(STORAGES=IN_MEMORY_VERSIONS)
+class TypeaheadIndexTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user("owner", "owner@example.com", "password")
+        self.workspace = Workspace.objects.create(name="Docs", created_by=self.user)
+        self.index = TypeaheadIndex()
+
+    def article_with(self, title):
+        article = Article.objects.create(workspace=self.workspace, created_by=self.user)
+        services.create_new_version(article, title, "", self.user)
+        return article
+
+    def labels(self, query):
+        return [r["label"] for r in self.index.search(self.workspace.pk, query)]
+
+    def test_archived_articles_are_not_loaded(self):
+        self.article_with("Deploy runbook")
+        self.article_with("Deploy checklist").archive()
+
+        self.assertEqual(self.labels("deploy"), ["Deploy runbook"])
+
+    def test_changes_during_a_load_are_kept(self):
+        stale = self.article_with("Old title")
+        load = self.index._load
+
+        def load_then_change(workspace_id):
+            entries = load(workspace_id)
+            # Committed after the load read the workspace
+            self.index.update(workspace_id, ARTICLE, 999, "Late arrival")
+            self.index.remove(workspace_id, ARTICLE, stale.pk)
+            return entries
+
+        with mock.patch.object(self.index, "_load", side_effect=load_then_change):
+            self.assertEqual(self.labels("late"), ["Late arrival"])
+        self.assertEqual(self.labels("old"), [])
+
+
+@override_settings(STORAGES=IN_MEMORY_VERSIONS)
+class AsyncViewTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("owner", "owner@example.com", "password")
+        self.workspace = Workspace.objects.create(name="Docs", created_by=self.user)
+        self.article = Article.objects.create(workspace=self.workspace, created_by=self.user)
+        services.create_new_version(self.article, "Title", BASE, self.user)
+        token = WorkspaceRefreshToken.for_user(self.user).access_token
+        self.client.defaults["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+
+    def post(self, url, data):
+        return self.client.post(url, data=json.dumps(data), content_type="application/json")
+
+    def test_permission_checks_use_the_token_roles(self):
+        self.client.get("/api/articles/async/")  # caches the membership stamp
+
+        with CaptureQueriesContext(connection) as queries:
+            responses = [
+                self.client.get("/api/articles/async/"),
+                self.client.get(f"/api/articles/async/{self.article.pk}/"),
+                self.post("/api/articles/async/create/", {"workspace": self.workspace.pk}),
+                self.post(f"/api/articles/async/{self.article.pk}/versions/", {"title": "New"}),
+            ]
+
+        self.assertEqual([r.status_code for r in responses], [200, 200, 201, 201])
+        self.assertFalse([q["sql"] for q in queries if "workspacemembership" in q["sql"]])
+
+    def test_list_reads_titles_from_the_article_rows(self):
+        for number in range(5):
+            article = Article.objects.create(workspace=self.workspace, created_by=self.user)
+            services.create_new_version(article, f"Guide {number}", f"<p>Step {number}</p>", self.user)
+        self.client.get("/api/articles/async/")  # caches the membership stamp
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/articles/async/")
+
+        results = response.json()["results"]
+        self.assertEqual(len(results), 6)
+        self.assertEqual((results[0]["title"], results[0]["excerpt"]), ("Guide 4", "Step 4"))
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("articles_articleversion", queries[0]["sql"])
+
+    def test_malformed_bodies_are_rejected(self):
+        versions_url = f"/api/articles/async/{self.article.pk}/versions/"
+        responses = [
+            self.post("/api/articles/async/create/", {"workspace": "abc"}),
+            self.post("/api/articles/async/create/", [self.workspace.pk]),
+            self.post(versions_url, ["title"]),
+            self.post(versions_url, {"title": "New", "content": 12}),
+        ]
+
+        self.assertEqual([r.status_code for r in responses], [400, 400, 400, 400])
+        self.assertEqual(self.article.versions.count(), 1)
+
+    def test_failed_upload_leaves_no_article(self):
+        articles = Article.objects.count()
+        with mock.patch.object(services, "store_version_file", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                self.post("/api/articles/async/create/", {"workspace": self.workspace.pk, "title": "New"})
+
+        self.assertEqual(Article.objects.count(), articles)
+
+
+class DriveReconcileTests(TestCase):
+
+    def setUp(self):
+        self.drive = FakeDriveServer(latency=0.02).start()
+        self.addCleanup(self.drive.server_close)
+        self.addCleanup(self.drive.shutdown)
+        settings_override = override_settings(DRIVE_API_URL=self.drive.url, DRIVE_API_TOKEN="test")
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        user = User.objects.create_user("owner", "owner@example.com", "password")
+        workspace = Workspace.objects.create(name="Docs", created_by=user)
+        article = Article.objects.create(workspace=workspace, created_by=user)
+        self.versions = []
+        for number in range(1, 7):
+            file_id = f"file-{number}"
+            self.drive.add_file(file_id)
+            self.versions.append(ArticleVersion.objects.create(
+                article=article, title="Title", content="Text", version_number=number,
+                is_current=number == 6, drive_file_id=file_id, drive_link=f"old-{number}"
+            ))
+
+    def reconcile(self, run=None, **options):
+        return async_to_sync(drive_reconcile.reconcile_drive)(
+            run or DriveReconcileRun.objects.create(), **options
+        )
+
+    def missing(self):
+        return set(
+            ArticleVersion.objects.filter(drive_missing_at__isnull=False)
+            .values_list("version_number", flat=True)
+        )
+
+    def test_missing_files_are_flagged_then_cleared(self):
+        del self.drive.files["file-2"]
+        self.drive.files["file-3"]["trashed"] = True
+
+        run = self.reconcile()
+        self.assertEqual(run.status, DriveReconcileRun.Status.DONE)
+        self.assertEqual((run.checked, run.missing, run.restored), (6, 2, 0))
+        self.assertEqual(self.missing(), {2, 3})
+        self.assertEqual(
+            ArticleVersion.objects.get(version_number=1).drive_link,
+            "https://drive.google.com/file/d/file-1/view"
+        )
+
+        self.drive.add_file("file-2")
+        self.drive.files["file-3"]["trashed"] = False
+        run = self.reconcile()
+        self.assertEqual((run.missing, run.restored), (0, 2))
+        self.assertEqual(self.missing(), set())
+
+    def test_a_run_resumes_from_its_checkpoint(self):
+        del self.drive.files["file-2"]
+        del self.drive.files["file-5"]
+        run = DriveReconcileRun.objects.create(
+            status=DriveReconcileRun.Status.FAILED,
+            positions={"default": self.versions[2].pk}
+        )
+
+        resumed = drive_reconcile.resume_or_start()
+        self.assertEqual(resumed.pk, run.pk)
+        run = self.reconcile(resumed)
+
+        # Versions up to the checkpoint are not looked up again
+        self.assertEqual(run.checked, 3)
+        self.assertEqual(self.missing(), {5})
+        self.assertEqual(run.positions["default"], self.versions[-1].pk)
+
+    def test_batches_in_flight_stay_under_the_concurrency(self):
+        lookup = drive_reconcile.get_drive_files_batch_async
+        in_flight = []
+        peak = []
+
+        async def counted(file_ids):
+            in_flight.append(file_ids)
+            peak.append(len(in_flight))
+            try:
+                return await lookup(file_ids)
+            finally:
+                in_flight.remove(file_ids)
+
+        with mock.patch.object(drive_reconcile, "get_drive_files_batch_async", counted):
+            run = self.reconcile(batch_size=1, concurrency=2)
+
+        self.assertEqual(run.checked, 6)
+        self.assertEqual(self.drive.batches, 6)
+        self.assertEqual(max(peak), 2)
+
+    def test_token_bucket_paces_calls_after_the_burst(self):
+        bucket = drive_reconcile.TokenBucket(rate=50, capacity=2)
+
+        async def take(count):
+            for _ in range(count):
+                await bucket.acquire()
+
+        started = time.monotonic()
+        asyncio.run(take(2))
+        self.assertLess(time.monotonic() - started, 0.02)
+
+        started = time.monotonic()
+        asyncio.run(take(5))
+        # The burst is spent: five more tokens at 50 a second
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+
+
+class QueryProfilingTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user("owner", "owner@example.com", "password")
+        self.factory = RequestFactory()
+
+    def lookups(self, count):
+        for pk in range(count):
+            User.objects.filter(pk=pk).exists()
+        return HttpResponse()
+
+    def test_article_list_does_not_query_per_article(self):
+        workspace = Workspace.objects.create(name="Docs", created_by=self.user)
+        tags = [Tag.objects.create(name=f"tag-{number}") for number in range(3)]
+        for _ in range(50):
+            Article.objects.create(workspace=workspace, created_by=self.user).tags.set(tags)
+
+        # One query for the articles and one for their tags, per database
+        with assert_max_queries(2 * len(all_aliases())):
+            response = views.article_list(self.factory.get("/api/articles/"))
+
+        self.assertEqual(len(response.data), 50)
+        self.assertEqual(len(response.data[0]["tags"]), 3)
+
+    def test_budget_overrun_lists_the_repeated_queries(self):
+        with self.assertRaisesMessage(AssertionError, "4 queries executed, budget was 3"):
+            with assert_max_queries(3):
+                self.lookups(4)
+
+    @override_settings(QUERY_PROFILING=False)
+    def test_middleware_is_dropped_when_profiling_is_off(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            QueryProfilingMiddleware(lambda request: HttpResponse())
+
+    @override_settings(QUERY_PROFILING=True, QUERY_PROFILING_N_PLUS_ONE_THRESHOLD=3)
+    def test_middleware_reports_queries_and_repeated_shapes(self):
+        middleware = QueryProfilingMiddleware(lambda request: self.lookups(3))
+
+        with self.assertLogs("config.profiling", "WARNING") as logs:
+            response = middleware(self.factory.get("/api/articles/"))
+
+        self.assertIn('desc="3 queries"', response["Server-Timing"])
+        record = json.loads(logs.records[0].getMessage().partition(": ")[2])
+        self.assertEqual(record["queries"], 3)
+        self.assertEqual(list(record["repeated"].values()), [3])
+
+    @override_settings(QUERY_PROFILING=True)
+    def test_middleware_logs_quiet_requests_at_info(self):
+        middleware = QueryProfilingMiddleware(lambda request: self.lookups(1))
+
+        with self.assertLogs("config.profiling", "INFO") as logs:
+            middleware(self.factory.get("/api/articles/"))
+
+        self.assertEqual(logs.records[0].levelname, "INFO")
+
+
+class ExtractionTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # The field resolved its storage when the model was defined
+        storage = mock.patch.object(
+            Document._meta.get_field("file"), "storage", FileSystemStorage(directory.name)
+        )
+        storage.start()
+        self.addCleanup(storage.stop)
+
+        self.user = User.objects.create_user("owner", "owner@example.com", "password")
+        self.workspace = Workspace.objects.create(name="Docs", created_by=self.user)
+
+    def upload(self, name, text):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Document.objects.create(
+                workspace=self.workspace,
+                uploaded_by=self.user,
+                file=ContentFile(text.encode(), name=name),
+                file_size=len(text),
+                mime_type="text/plain"
+            )
+
+    def test_search_finds_newly_extracted_text(self):
+        document = self.upload("notes.txt", "Agenda\nThe quarterly revenue forecast, revised.\n")
+        self.assertEqual(extraction.search_documents(self.workspace.pk, "revenue forecast"), [])
+
+        stats = extraction.ExtractionRunner(workers=1).run(once=True)
+
+        self.assertEqual(stats[DocumentExtraction.Status.DONE], 1)
+        [result] = extraction.search_documents(self.workspace.pk, "quarterly  Revenue forecast")
+        self.assertEqual(result["document"], document.pk)
+        self.assertEqual(result["name"], "notes.txt")
+        self.assertIn("quarterly revenue forecast", result["snippet"])
+        self.assertEqual(extraction.search_documents(self.workspace.pk, "forecast revenue"), [])
+
+    def test_a_claimed_job_is_not_claimed_again(self):
+        self.upload("notes.txt", "text")
+        mine, rival = extraction.ExtractionRunner(), extraction.ExtractionRunner()
+        real_filter = DocumentExtraction.objects.filter
+        won = []
+
+        def rival_claims_first(*args, **kwargs):
+            # The rival runner claims between our candidate read and our update
+            if "started_at" in kwargs and not won:
+                won.append(None)
+                won[0] = rival.claim()
+            return real_filter(*args, **kwargs)
+
+        with mock.patch.object(DocumentExtraction.objects, "filter", side_effect=rival_claims_first):
+            self.assertIsNone(mine.claim())
+
+        job = DocumentExtraction.objects.get()
+        self.assertEqual(won[0].pk, job.pk)
+        self.assertEqual((job.status, job.attempts), (DocumentExtraction.Status.RUNNING, 1))
+        self.assertIsNone(mine.claim())
+
+    def test_abandoned_jobs_are_claimed_again(self):
+        self.upload("notes.txt", "text")
+        runner = extraction.ExtractionRunner(time_limit=1)
+        runner.claim()
+        DocumentExtraction.objects.update(started_at=timezone.now() - timedelta(seconds=10))
+
+        job = runner.claim()
+
+        self.assertEqual(job.attempts, 2)
+
+
+@override_settings(STORAGES=IN_MEMORY_VERSIONS)
+@mock.patch.object(analytics.ViewCounter, "_ensure_flusher")
+class ViewAnalyticsTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user("owner", "owner@example.com", "password")
+        self.workspace = Workspace.objects.create(name="Docs", created_by=self.user)
+        self.articles = []
+        for title in ("Runbook", "Checklist", None):
+            article = Article.objects.create(workspace=self.workspace, created_by=self.user)
+            if title:
+                services.create_new_version(article, title, "", self.user)
+            self.articles.append(article)
+        self.counter = analytics.ViewCounter()
+
+        # Views recorded by other tests are written by the module's counter,
+        # from its own thread and outside the test transaction
+        flush = mock.patch.object(analytics.counter, "flush")
+        flush.start()
+        self.addCleanup(flush.stop)
+        analytics.counter.counts.clear()
+        ArticleDailyViews.objects.all().delete()
+        ReadRanking.objects.all().delete()
+
+    def views(self, *amounts):
+        for article, amount in zip(self.articles, amounts):
+            self.counter.increment(self.workspace.pk, article.pk, amount)
+
+    def stored(self):
+        return dict(ArticleDailyViews.objects.values_list("article_id", "views"))
+
+    def test_flushes_add_to_the_stored_counts(self, _):
+        runbook, checklist, draft = self.articles
+        self.views(3, 1)
+        self.assertEqual(self.counter.flush(), 4)
+        self.views(2, 0, 5)
+        self.assertEqual(self.counter.flush(), 7)
+
+        self.assertEqual(self.stored(), {runbook.pk: 5, checklist.pk: 1, draft.pk: 5})
+        self.assertEqual(ArticleDailyViews.objects.count(), 3)
+        self.assertEqual(self.counter.flush(), 0)
+
+    def test_failed_flush_keeps_the_counts_for_the_next_one(self, _):
+        runbook, checklist, _ = self.articles
+        self.views(3, 1)
+        with mock.patch.object(analytics, "_upsert", side_effect=OperationalError("locked")):
+            with self.assertLogs(analytics.logger, "ERROR"):
+                self.assertEqual(self.counter.flush(), 0)
+        self.views(1)
+
+        self.assertEqual(self.counter.flush(), 5)
+        self.assertEqual(self.stored(), {runbook.pk: 4, checklist.pk: 1})
+
+    def test_ranking_lists_read_articles_with_their_titles(self, _):
+        runbook, checklist, draft = self.articles
+        self.views(2, 4, 9)
+        self.counter.flush()
+
+        self.assertEqual(ReadRanking.objects.get(workspace=self.workspace).entries, [
+            [draft.pk, 9], [checklist.pk, 4], [runbook.pk, 2]
+        ])
+        # Articles without a current version have no title to show
+        self.assertEqual(analytics.top_articles(self.workspace.pk), [
+            {"article_id": checklist.pk, "title": "Checklist", "views": 4},
+            {"article_id": runbook.pk, "title": "Runbook", "views": 2},
+        ])
+        self.assertEqual(len(analytics.top_articles(self.workspace.pk, limit=1)), 1)
+
+    def test_stale_rankings_are_recomputed_on_read(self, _):
+        runbook, checklist, _ = self.articles
+        self.views(1)
+        self.counter.flush()
+        self.views(0, 3)
+        # Within RANKING_INTERVAL of the last one: no new ranking yet
+        self.counter.flush()
+        self.assertEqual([e["article_id"] for e in analytics.top_articles(self.workspace.pk)], [
+            runbook.pk
+        ])
+
+        ReadRanking.objects.update(computed_at=timezone.now() - analytics.RANKING_MAX_AGE * 2)
+        self.assertEqual([e["article_id"] for e in analytics.top_articles(self.workspace.pk)], [
+            checklist.pk, runbook.pk
+        ])
+
+
+class MetricsTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def worker_file(self, pid, reads, busy):
+        requests = metrics.Counter("test_reads_total", "Reads.", ["kind"])
+        requests.inc(reads, kind="page")
+        in_flight = metrics.Gauge("test_busy", "Busy workers.")
+        in_flight.set(busy)
+        seconds = metrics.Histogram("test_seconds", "Time.", buckets=(1.0,))
+        seconds.observe(0.5)
+        snapshot = {
+            "test_reads_total": requests.snapshot(),
+            "test_busy": in_flight.snapshot(),
+            "test_seconds": seconds.snapshot(),
+        }
+        with open(os.path.join(self.directory, f"{pid}-1.json"), "w") as handle:
+            json.dump({"pid": pid, "metrics": snapshot}, handle)
+
+    def totals(self):
+        with override_settings(METRICS_DIR=self.directory):
+            merged = metrics.collect()
+        return (
+            merged["test_reads_total"]["values"][("page",)],
+            merged["test_busy"]["values"].get(()),
+            merged["test_seconds"]["values"][()],
+        )
+
+    def test_worker_files_are_added_up(self):
+        exited = subprocess.Popen([sys.executable, "-c", ""])
+        exited.wait()
+        self.worker_file(os.getpid(), reads=2, busy=1)
+        self.worker_file(exited.pid, reads=3, busy=4)
+        self.addCleanup(setattr, metrics.exporter, "pid", None)
+
+        # An exited worker's counts stay; its gauges go
+        self.assertEqual(self.totals(), (5, 1, [2, 0, 1.0]))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, f"{exited.pid}-1.json")))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, metrics.EXITED_FILE)))
+        # Folded once, not again on the next scrape
+        self.assertEqual(self.totals(), (5, 1, [2, 0, 1.0]))
+
+    @override_settings(METRICS_TOKEN="", DEBUG=False)
+    def test_endpoint_is_closed_without_a_token_outside_debug(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+    @override_settings(METRICS_TOKEN="s3cret", DEBUG=False)
+    def test_endpoint_requires_the_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        wrong = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer guess")
+        self.assertEqual(wrong.status_code, 403)
+
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"# TYPE http_requests_in_flight gauge", response.content)
+
+    def test_drive_storage_calls_are_timed(self):
+        drive = FakeDriveServer().start()
+        self.addCleanup(drive.server_close)
+        self.addCleanup(drive.shutdown)
+
+        def calls(call):
+            return sum(DRIVE_SECONDS.values.get((call,), [0, 0])[:-1])
+
+        before = calls("upload"), calls("download")
+        with override_settings(DRIVE_API_URL=drive.url, DRIVE_API_TOKEN="test"):
+            storage = DriveStorage()
+            name = storage.save("notes.txt", ContentFile(b"hello"))
+            with storage.open(name) as handle:
+                self.assertEqual(handle.read(), b"hello")
+
+        self.assertEqual((calls("upload"), calls("download")), (before[0] + 1, before[1] + 1))
@@ -0,0 +1,194 @@
+"""
+In-memory prefix index for the global search box.
+
+Each workspace gets a sorted array of ``(term, kind, id)`` keys built from
+the current version titles of its unarchived articles and the names of
+tags used on them. A title is
+indexed once per word position, so "runbook" finds "Deploy runbook". A
+lookup is a binary search plus a short forward scan.
+
+Workspaces are loaded lazily on first query, kept up to date by the
+signals in articles.signals (changes signalled while a workspace is being
+loaded are replayed onto it), rebuilt after ``TTL`` seconds (other
+processes' writes), and evicted least-recently-used once the index holds
+more than ``MAX_KEYS`` keys.
+"""
+import bisect
+import threading
+import time
+from collections import OrderedDict
+
+from config.sharding import use_workspace
+from .models import Article
+
+
+MAX_KEYS = 500_000
+MAX_WORDS_PER_TITLE = 8
+TTL = 300
+
+ARTICLE = "article"
+TAG = "tag"
+
+
+def normalize(text):
+    return " ".join(text.casefold().split())
+
+
+def _terms(kind, label):
+    text = normalize(label)
+    if kind == TAG:
+        return [text] if text else []
+
+    words = text.split(" ")
+    return [
+        " ".join(words[i:])
+        for i in range(min(len(words), MAX_WORDS_PER_TITLE))
+        if words[i]
+    ]
+
+
+class _WorkspaceEntries:
+
+    def __init__(self):
+        self.keys = []
+        self.labels = {}
+        self.built_at = time.monotonic()
+
+    def add(self, kind, item_id, label):
+        self.remove(kind, item_id)
+        self.labels[(kind, item_id)] = label
+        for term in _terms(kind, label):
+            bisect.insort(self.keys, (term, kind, item_id))
+
+    def remove(self, kind, item_id):
+        label = self.labels.pop((kind, item_id), None)
+        if label is None:
+            return
+        for term in _terms(kind, label):
+            position = bisect.bisect_left(self.keys, (term, kind, item_id))
+            if position < len(self.keys) and self.keys[position] == (term, kind, item_id):
+                del self.keys[position]
+
+    def search(self, prefix, limit):
+        results = []
+        seen = set()
+        position = bisect.bisect_left(self.keys, (prefix,))
+
+        while position < len(self.keys) and len(results) < limit:
+            term, kind, item_id = self.keys[position]
+            if not term.startswith(prefix):
+                break
+            if (kind, item_id) not in seen:
+                seen.add((kind, item_id))
+                results.append({
+                    "type": kind,
+                    "id": item_id,
+                    "label": self.labels[(kind, item_id)],
+                })
+            position += 1
+
+        return results
+
+
+class TypeaheadIndex:
+
+    def __init__(self, max_keys=MAX_KEYS, ttl=TTL):
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.workspaces = OrderedDict()
+        # workspace id -> change logs of the loads in progress
+        self.loading = {}
+        self.lock = threading.Lock()
+
+    def _load(self, workspace_id):
+        entries = _WorkspaceEntries()
+
+        titles = Article.objects.filter(
+            workspace_id=workspace_id,
+            archived_at__isnull=True
+        ).exclude(title="").values_list("pk", "title")
+        tags = Article.tags.through.objects.filter(
+            article__workspace_id=workspace_id,
+            article__archived_at__isnull=True
+        ).values_list("tag_id", "tag__name").distinct()
+
+        with use_workspace(workspace_id):
+            items = [(ARTICLE, article_id, title) for article_id, title in titles.iterator()]
+            items += [(TAG, tag_id, name) for tag_id, name in tags.iterator()]
+
+        # One sort instead of an insort per key
+        for kind, item_id, label in items:
+            entries.labels[(kind, item_id)] = label
+            entries.keys.extend((term, kind, item_id) for term in _terms(kind, label))
+        entries.keys.sort()
+
+        return entries
+
+    def _evict(self):
+        total = sum(len(entries.keys) for entries in self.workspaces.values())
+        while total > self.max_keys and len(self.workspaces) > 1:
+            _, entries = self.workspaces.popitem(last=False)
+            total -= len(entries.keys)
+
+    def search(self, workspace_id, query, limit=10):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+
+        with self.lock:
+            entries = self.workspaces.get(workspace_id)
+            if entries is not None and time.monotonic() - entries.built_at > self.ttl:
+                entries = None
+
+        if entries is None:
+            # Built outside the lock so a cold workspace does not stall
+            # others; what the signal hooks change meanwhile is logged
+            changes = []
+            with self.lock:
+                self.loading.setdefault(workspace_id, []).append(changes)
+            try:
+                entries = self._load(workspace_id)
+            finally:
+                with self.lock:
+                    logs = self.loading[workspace_id]
+                    logs.remove(changes)
+                    if not logs:
+                        del self.loading[workspace_id]
+                    if entries is not None:
+                        for change in changes:
+                            change(entries)
+                        self.workspaces[workspace_id] = entries
+                        self._evict()
+
+        with self.lock:
+            if workspace_id in self.workspaces:
+                self.workspaces.move_to_end(workspace_id)
+            return entries.search(prefix, limit)
+
+    # ---------------- SIGNAL HOOKS ---------------- #
+
+    def _change(self, workspace_id, change):
+        """Apply ``change`` to the workspace now and to its loads in progress."""
+        with self.lock:
+            entries = self.workspaces.get(workspace_id)
+            if entries is not None:
+                change(entries)
+            for changes in self.loading.get(workspace_id, ()):
+                changes.append(change)
+
+    def update(self, workspace_id, kind, item_id, label):
+        self._change(workspace_id, lambda entries: entries.add(kind, item_id, label))
+
+    def remove(self, workspace_id, kind, item_id):
+        self._change(workspace_id, lambda entries: entries.remove(kind, item_id))
+
+    def remove_everywhere(self, kind, item_id):
+        with self.lock:
+            for entries in self.workspaces.values():
+                entries.remove(kind, item_id)
+            for logs in self.loading.values():
+                for changes in logs:
+                    changes.append(lambda entries: entries.remove(kind, item_id))
+
+
+typeahead_index = TypeaheadIndex()
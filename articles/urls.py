@@ -1,8 +1,21 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path('', views.test_view),
     path('create/', views.article_create),
     path('<int:pk>/delete/', views.article_delete),
+    path('<int:pk>/related/', views.article_related),
+    path('<int:pk>/views/', views.article_view_counts),
+    path('<int:pk>/versions/<int:number>/download/', views.version_download),
+    path('<int:pk>/versions/<int:number>/html/', views.version_html),
+    path('documents/search/', views.document_search),
+    path('documents/<int:pk>/download/', views.document_download),
+    path('typeahead/', views.typeahead),
+    path('most-read/<int:workspace_id>/', views.most_read),
+    path('retention/<int:workspace_id>/', views.retention_policy),
+    path('async/', async_views.article_list),
+    path('async/create/', async_views.article_create),
+    path('async/<int:pk>/', async_views.article_detail),
+    path('async/<int:pk>/versions/', async_views.version_create),
 ]
\ No newline at end of file
@@ -4,15 +4,29 @@ from django.http import HttpResponse
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Article
-from .serializers import ArticleSerializer
+from config.sharding import each_shard, get_by_pk, use_workspace
+from apps.workspaces.activity import record_activity
+from apps.workspaces.models import ActivityEvent
+from apps.workspaces.permissions import is_workspace_admin, is_workspace_member
+from .analytics import article_views, top_articles
+from .extraction import search_documents
+from .models import Article, Document, VersionRetentionPolicy
+from .rendering import rendered_html
+from .serializers import ArticleSerializer, VersionRetentionPolicySerializer
+from .similarity import related_articles
+from .storage import DOCUMENTS, VERSIONS, DriveStorage, serve_file, version_storage
+from .typeahead import typeahead_index
+
 
 @api_view(['GET'])
 def article_list(request):
-    articles = Article.objects.all()
+    # The serializer lists every article's tags
+    articles = Article.objects.prefetch_related('tags')
+    articles = [article for shard in each_shard(articles) for article in shard]
     serializer = ArticleSerializer(articles, many=True)
     return Response(serializer.data)
 
+
 @api_view(['POST'])
 def article_create(request):
     serializer = ArticleSerializer(data=request.data)
@@ -21,10 +35,173 @@ def article_create(request):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+
 @api_view(['DELETE'])
 def article_delete(request, pk):
-    article = Article.objects.get(pk=pk)
+    article = get_by_pk(Article, pk)
+    if article is None:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+    record_activity(
+        article.workspace_id,
+        ActivityEvent.Verb.DELETED,
+        "article",
+        article.pk,
+        actor=request.user,
+        using=article._state.db
+    )
     article.delete()
     return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@api_view(['GET', 'PUT'])
+def retention_policy(request, workspace_id):
+    if not is_workspace_admin(request.user, workspace_id):
+        return Response(status=status.HTTP_403_FORBIDDEN)
+
+    with use_workspace(workspace_id):
+        policy = VersionRetentionPolicy.objects.filter(workspace_id=workspace_id).first()
+
+        if request.method == 'GET':
+            if policy is None:
+                return Response(status=status.HTTP_404_NOT_FOUND)
+            return Response(VersionRetentionPolicySerializer(policy).data)
+
+        serializer = VersionRetentionPolicySerializer(policy, data=request.data)
+        if serializer.is_valid():
+            serializer.save(workspace_id=workspace_id)
+            return Response(serializer.data)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+def article_related(request, pk):
+    article = get_by_pk(Article, pk)
+    if article is None or not is_workspace_member(request.user, article.workspace_id):
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        limit = min(int(request.query_params.get('limit', 10)), 50)
+    except ValueError:
+        limit = 10
+
+    return Response(related_articles(article, limit=limit))
+
+
+@api_view(['GET'])
+def article_view_counts(request, pk):
+    article = get_by_pk(Article, pk)
+    if article is None or not is_workspace_member(request.user, article.workspace_id):
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    return Response({"article_id": article.pk, **article_views(article.pk)})
+
+
+@api_view(['GET'])
+def most_read(request, workspace_id):
+    if not is_workspace_member(request.user, workspace_id):
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        limit = min(int(request.query_params.get('limit', 10)), 50)
+    except ValueError:
+        limit = 10
+
+    return Response(top_articles(workspace_id, limit=limit))
+
+
+@api_view(['GET'])
+def typeahead(request):
+    workspace_id = request.query_params.get('workspace')
+    query = request.query_params.get('q', '')
+
+    if not workspace_id or not workspace_id.isdigit():
+        return Response(
+            {"error": "workspace is required"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not is_workspace_member(request.user, workspace_id):
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        limit = min(int(request.query_params.get('limit', 10)), 25)
+    except ValueError:
+        limit = 10
+
+    return Response(typeahead_index.search(int(workspace_id), query, limit))
+
+
+@api_view(['GET'])
+def document_search(request):
+    workspace_id = request.query_params.get('workspace')
+    query = request.query_params.get('q', '')
+
+    if not workspace_id or not workspace_id.isdigit():
+        return Response(
+            {"error": "workspace is required"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not is_workspace_member(request.user, workspace_id):
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        limit = min(int(request.query_params.get('limit', 20)), 50)
+    except ValueError:
+        limit = 20
+
+    return Response(search_documents(int(workspace_id), query, limit))
+
+
+@api_view(['GET'])
+def document_download(request, pk):
+    document = get_by_pk(Document, pk)
+    if document is None or not is_workspace_member(request.user, document.workspace_id):
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    return serve_file(request, DOCUMENTS, document.file.name, content_type=document.mime_type)
+
+
+@api_view(['GET'])
+def version_download(request, pk, number):
+    article = get_by_pk(Article, pk)
+    if article is None or not is_workspace_member(request.user, article.workspace_id):
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    version = article.versions.filter(version_number=number).first()
+    if version is None:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    name = version.file.name
+    # Versions saved before the storage layer only have their Drive id
+    if not name and isinstance(version_storage(), DriveStorage):
+        name = version.drive_file_id
+    if not name:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    return serve_file(
+        request,
+        VERSIONS,
+        name,
+        filename=f"article_{article.pk}_v{number}.txt",
+        content_type="text/plain; charset=utf-8"
+    )
+
+
+@api_view(['GET'])
+def version_html(request, pk, number):
+    article = get_by_pk(Article, pk)
+    if article is None or not is_workspace_member(request.user, article.workspace_id):
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    version = article.versions.filter(version_number=number).first()
+    if version is None:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    return Response({
+        "version_number": version.version_number,
+        "title": version.title,
+        "html": rendered_html(version, article.workspace_id),
+    })
+
+
 def test_view(request):
     return HttpResponse("App Working 🚀")
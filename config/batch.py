@@ -0,0 +1,193 @@
+"""
+Batch endpoint: many API calls in one round trip.
+
+POST /api/batch/ with::
+
+    {
+        "atomic": false,
+        "operations": [
+            {"id": "a", "method": "POST", "path": "/api/articles/create/", "body": {...}},
+            {"method": "GET", "path": "/api/articles/12/related/?limit=5"}
+        ]
+    }
+
+Operations run in order, in this process, by calling the view the path
+resolves to; there is no HTTP, middleware or URL-prefix overhead per
+item. The batch request is authenticated once and every sub-request
+carries that user (and the workspace roles resolved for it), so views do
+not decode the token again.
+
+With ``atomic`` the batch runs inside one transaction per database
+(default and every workspace shard) and stops at the first failing
+operation, rolling everything back. Databases are committed one after
+another, not with two-phase commit.
+"""
+import json
+import logging
+from contextlib import ExitStack
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.db import transaction
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, path, resolve
+from rest_framework import status
+from rest_framework.decorators import api_view
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import BooleanField
+from rest_framework.response import Response
+
+from apps.workspaces.permissions import workspace_roles_for
+from config.sharding import all_aliases
+
+logger = logging.getLogger(__name__)
+
+MAX_OPERATIONS = 100
+ALLOWED_PREFIXES = ("/api/articles/", "/api/workspaces/", "/api/approvals/")
+METHODS = ("GET", "POST", "PUT", "PATCH", "DELETE")
+# Operations that can change the caller's memberships, and so their roles
+MEMBERSHIP_PREFIXES = ("/api/workspaces/",)
+
+
+def _invalid(operation):
+    if not isinstance(operation, dict):
+        return "operation must be an object"
+    if operation.get("method", "GET") not in METHODS:
+        return f"method must be one of {', '.join(METHODS)}"
+    path = operation.get("path")
+    if not isinstance(path, str) or not urlsplit(path).path.startswith(ALLOWED_PREFIXES):
+        return f"path must start with one of {', '.join(ALLOWED_PREFIXES)}"
+    return None
+
+
+def _sub_request(request, operation):
+    url = urlsplit(operation["path"])
+    method = operation.get("method", "GET")
+    body = b""
+    if "body" in operation:
+        body = json.dumps(operation["body"]).encode()
+
+    sub = HttpRequest()
+    sub.method = method
+    sub.path = sub.path_info = url.path
+    sub.META = {
+        key: value for key, value in request.META.items()
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH", "QUERY_STRING")
+    }
+    sub.META.update(
+        REQUEST_METHOD=method,
+        PATH_INFO=url.path,
+        QUERY_STRING=url.query,
+        CONTENT_TYPE="application/json",
+        CONTENT_LENGTH=str(len(body)),
+    )
+    sub.GET = QueryDict(url.query)
+    sub.COOKIES = request.COOKIES
+    sub._stream = BytesIO(body)
+    sub._read_started = False
+
+    # Authenticated once for the whole batch; DRF uses these instead of
+    # running the authentication classes again
+    sub.user = request.user
+    sub._force_auth_user = request.user
+    sub._force_auth_token = request.auth
+    return sub
+
+
+def _call(request, operation):
+    """Run one operation. Returns ``(status, body)``."""
+    error = _invalid(operation)
+    if error:
+        return status.HTTP_400_BAD_REQUEST, {"error": error}
+
+    sub = _sub_request(request, operation)
+    try:
+        match = resolve(sub.path_info)
+    except Resolver404:
+        return status.HTTP_404_NOT_FOUND, {"error": "not found"}
+
+    sub.resolver_match = match
+    view = match.func
+    if iscoroutinefunction(view):
+        view = async_to_sync(view)
+
+    try:
+        response = view(sub, *match.args, **match.kwargs)
+        if hasattr(response, "render"):
+            response.render()
+    except Exception:
+        logger.exception("Batch operation %s %s failed", sub.method, sub.path)
+        return status.HTTP_500_INTERNAL_SERVER_ERROR, {"error": "internal error"}
+
+    content = response.content
+    if not content:
+        return response.status_code, None
+    if response.get("Content-Type", "").startswith("application/json"):
+        return response.status_code, json.loads(content)
+    return response.status_code, content.decode(response.charset or "utf-8", "replace")
+
+
+@api_view(['POST'])
+def batch(request):
+    if not request.user.is_authenticated:
+        return Response(
+            {"error": "authentication required"},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+
+    operations = request.data.get('operations')
+    try:
+        atomic = BooleanField().to_internal_value(request.data.get('atomic', False))
+    except ValidationError:
+        return Response(
+            {"error": "atomic must be a boolean"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not isinstance(operations, list) or not operations:
+        return Response(
+            {"error": "operations must be a non-empty list"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(operations) > MAX_OPERATIONS:
+        return Response(
+            {"error": f"at most {MAX_OPERATIONS} operations per batch"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # Resolve the roles once (tokens for users in many workspaces carry
+    # none) and share them between the sub-requests
+    user = request.user
+    if getattr(user, "workspace_roles", None) is None:
+        user.workspace_roles = workspace_roles_for(user.pk)
+
+    results = []
+    committed = True
+    with ExitStack() as stack:
+        aliases = all_aliases() if atomic else []
+        for alias in aliases:
+            stack.enter_context(transaction.atomic(using=alias))
+
+        for operation in operations:
+            ref = operation.get("id") if isinstance(operation, dict) else None
+            if not committed:
+                results.append({"id": ref, "status": None, "skipped": True})
+                continue
+
+            code, body = _call(request, operation)
+            results.append({"id": ref, "status": code, "body": body})
+
+            if code >= 400:
+                if atomic:
+                    committed = False
+                    for alias in aliases:
+                        transaction.set_rollback(True, using=alias)
+            elif (operation.get("method", "GET") != "GET"
+                  and operation["path"].startswith(MEMBERSHIP_PREFIXES)):
+                user.workspace_roles = workspace_roles_for(user.pk)
+
+    return Response({"atomic": atomic, "committed": committed, "results": results})
+
+
+# Included lazily by config.urls
+urlpatterns = [path('', batch, name='batch')]
@@ -0,0 +1,149 @@
+"""
+Primary/replica database routing.
+
+Writes always go to ``default``. Reads go to a random alias from
+``DATABASE_REPLICAS``, but only inside a request that
+``ReadYourWritesMiddleware`` has marked as replica-safe: a GET/HEAD/OPTIONS
+request from a client that has not written recently. Everything else
+(management commands, background threads, shells) reads from the primary.
+
+After a client writes, the middleware sets a ``REPLICA_PIN_COOKIE`` cookie
+and an ``X-Primary-Until`` header holding a unix timestamp. Until then that
+client's reads stay on the primary, so it sees its own writes despite
+replication lag. Clients that do not keep cookies (API clients using bearer
+tokens) can send the header back instead.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PRIMARY_UNTIL_HEADER = "X-Primary-Until"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+DEFAULT_PIN_SECONDS = 5
+DEFAULT_PIN_COOKIE = "primary_until"
+
+# True while reads may go to a replica; flips off at the first write
+_replica_reads = ContextVar("replica_reads", default=False)
+# True once the current request has written to the primary
+_wrote = ContextVar("wrote", default=False)
+
+
+def replica_aliases():
+    return getattr(settings, "DATABASE_REPLICAS", ())
+
+
+@contextmanager
+def use_primary():
+    """Send every read in the block to the primary."""
+    token = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+# ---------------- ROUTER ---------------- #
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        replicas = replica_aliases()
+        if not replicas or not _replica_reads.get():
+            return DEFAULT_DB_ALIAS
+        # Reads inside a transaction must see that transaction's writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        _replica_reads.set(False)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        pool = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive schema changes through replication
+        if db in replica_aliases():
+            return False
+        return None
+
+
+# ---------------- MIDDLEWARE ---------------- #
+
+class ReadYourWritesMiddleware:
+    """
+    Marks safe requests from clients without a live pin as replica-safe,
+    and pins a client to the primary for ``REPLICA_PIN_SECONDS`` after any
+    request that wrote.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, "REPLICA_PIN_SECONDS", DEFAULT_PIN_SECONDS)
+        self.cookie_name = getattr(settings, "REPLICA_PIN_COOKIE", DEFAULT_PIN_COOKIE)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _pinned_until(self, request):
+        value = (
+            request.headers.get(PRIMARY_UNTIL_HEADER)
+            or request.COOKIES.get(self.cookie_name)
+        )
+        try:
+            until = float(value)
+        except (TypeError, ValueError):
+            return 0
+        # Ignore timestamps further out than one pin window
+        return min(until, time.time() + self.pin_seconds)
+
+    def _before(self, request):
+        replica_ok = (
+            request.method in SAFE_METHODS
+            and self._pinned_until(request) <= time.time()
+        )
+        return _replica_reads.set(replica_ok), _wrote.set(False)
+
+    def _after(self, request, response, tokens):
+        wrote = _wrote.get() or request.method not in SAFE_METHODS
+        _replica_reads.reset(tokens[0])
+        _wrote.reset(tokens[1])
+
+        if wrote:
+            until = f"{time.time() + self.pin_seconds:.3f}"
+            response[PRIMARY_UNTIL_HEADER] = until
+            response.set_cookie(
+                self.cookie_name,
+                until,
+                max_age=self.pin_seconds,
+                httponly=True,
+                samesite="Lax"
+            )
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        tokens = self._before(request)
+        response = self.get_response(request)
+        return self._after(request, response, tokens)
+
+    async def __acall__(self, request):
+        tokens = self._before(request)
+        response = await self.get_response(request)
+        return self._after(request, response, tokens)
@@ -0,0 +1,498 @@
+"""
+Process metrics in the Prometheus text format.
+
+Counters, gauges and histograms are kept in an in-process registry;
+updating one costs a lock and a dict update. ``MetricsMiddleware`` times
+every request, a wrapper installed on each new database connection times
+every query, and the articles app times its Drive calls and version
+saves. GET /metrics renders the registry.
+
+Pre-forked servers run several worker processes, each with its own
+registry. When METRICS_DIR is set, every process writes a snapshot of its
+registry to its own file there every ``FLUSH_INTERVAL`` seconds (and at
+exit), and /metrics adds up the files of all processes. Counters and
+histograms of processes that have exited keep counting: each scrape folds
+their files into one ``exited.json`` and removes them, so the directory
+doesn't grow as workers are recycled. Their gauges are dropped. Empty the
+directory whenever the server is restarted.
+"""
+import atexit
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import ContextDecorator
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.files import locks
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.urls import path
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 5.0
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Counts of exited processes, added up (see collect)
+EXITED_FILE = "exited.json"
+
+
+# ---------------- METRICS ---------------- #
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"{self.name} takes the labels {self.label_names}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def snapshot(self):
+        with self.lock:
+            values = [
+                [list(key), list(value) if isinstance(value, list) else value]
+                for key, value in self.values.items()
+            ]
+        return {
+            "kind": self.kind,
+            "help": self.documentation,
+            "labels": list(self.label_names),
+            "buckets": getattr(self, "buckets", None),
+            "values": values,
+        }
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class _Timer(ContextDecorator):
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def _recreate_cm(self):
+        # A fresh timer per decorated call, so concurrent calls don't share one
+        return _Timer(self.histogram, self.labels)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = sorted(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                # One count per bucket, then +Inf, then the sum
+                counts = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def time(self, **labels):
+        """Observe the duration of a ``with`` block or decorated (sync) call."""
+        return _Timer(self, labels)
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing is None:
+                self.metrics[metric.name] = metric
+                return metric
+        if type(existing) is not type(metric) or existing.label_names != metric.label_names:
+            raise ValueError(f"Metric {metric.name} is already registered differently")
+        return existing
+
+    def snapshot(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def reset(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        for metric in metrics:
+            with metric.lock:
+                metric.values = {}
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labels=()):
+    return REGISTRY.register(Counter(name, documentation, labels))
+
+
+def gauge(name, documentation, labels=()):
+    return REGISTRY.register(Gauge(name, documentation, labels))
+
+
+def histogram(name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labels, buckets))
+
+
+# ---------------- MULTIPROCESS ---------------- #
+
+class _Exporter:
+    """Writes this process's snapshot to METRICS_DIR."""
+
+    def __init__(self):
+        self.pid = None
+        self.path = None
+        self.flusher = None
+        self.lock = threading.Lock()
+
+    def directory(self):
+        return getattr(settings, "METRICS_DIR", "")
+
+    def _claim_path(self):
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            # Unique per process start, so a reused pid never overwrites the
+            # counts of the process that had it before
+            self.path = os.path.join(self.directory(), f"{self.pid}-{time.time_ns()}.json")
+            self.flusher = None
+
+    def _started(self):
+        return self.pid == os.getpid() and self.flusher is not None
+
+    def ensure_started(self):
+        if self._started() or not self.directory():
+            return
+        with self.lock:
+            if self._started():
+                return
+            self._claim_path()
+            self.flusher = threading.Thread(target=self._run, daemon=True)
+            self.flusher.start()
+
+    def write(self):
+        if not self.directory():
+            return
+        self._claim_path()
+        temporary = f"{self.path}.tmp"
+        try:
+            with open(temporary, "w") as handle:
+                json.dump({"pid": self.pid, "metrics": REGISTRY.snapshot()}, handle)
+            # Readers never see a half-written file
+            os.replace(temporary, self.path)
+        except OSError:
+            logger.exception("Could not write metrics to %s", self.path)
+
+    def _run(self):
+        stop = threading.Event()
+        while not stop.wait(FLUSH_INTERVAL):
+            self.write()
+
+    def after_fork(self):
+        # The child starts from zero: its parent's counts are the parent's
+        REGISTRY.reset()
+        self.pid = self.path = self.flusher = None
+        self.lock = threading.Lock()
+
+
+exporter = _Exporter()
+atexit.register(exporter.write)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=exporter.after_fork)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge(snapshots):
+    """Add up ``(alive, snapshot)`` pairs into one ``{name: metric}``."""
+    merged = {}
+    for alive, snapshot in snapshots:
+        for name, metric in snapshot.items():
+            if metric["kind"] == "gauge" and not alive:
+                continue
+            target = merged.setdefault(name, {**metric, "values": {}})
+            if target["kind"] != metric["kind"] or target["buckets"] != metric["buckets"]:
+                continue  # written by a process running other code
+
+            for key, value in metric["values"]:
+                key = tuple(key)
+                current = target["values"].get(key)
+                if current is None:
+                    target["values"][key] = list(value) if isinstance(value, list) else value
+                elif isinstance(value, list):
+                    target["values"][key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target["values"][key] = current + value
+    return merged
+
+
+def _as_snapshot(merged):
+    """The inverse of _merge, for writing merged metrics back to a file."""
+    return {
+        name: {**metric, "values": [[list(key), value] for key, value in metric["values"].items()]}
+        for name, metric in merged.items()
+    }
+
+
+def _write_json(path, data):
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as handle:
+        json.dump(data, handle)
+    os.replace(temporary, path)
+
+
+def _read_snapshots(directory):
+    """
+    The snapshots of all other processes, as ``(alive, snapshot)`` pairs.
+    Files of exited processes are folded into EXITED_FILE and removed.
+    """
+    exited_path = os.path.join(directory, EXITED_FILE)
+    live = []
+    exited = []
+    dead_paths = []
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        if path == exporter.path:
+            continue
+        try:
+            with open(path) as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            continue
+        if path == exited_path:
+            exited.append((False, data["metrics"]))
+        elif _alive(data["pid"]):
+            live.append((True, data["metrics"]))
+        else:
+            exited.append((False, data["metrics"]))
+            dead_paths.append(path)
+
+    if dead_paths:
+        try:
+            _write_json(exited_path, {"pid": None, "metrics": _as_snapshot(_merge(exited))})
+        except OSError:
+            logger.exception("Could not write metrics to %s", exited_path)
+            return live + exited
+        # Only once their counts are in EXITED_FILE
+        for path in dead_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                logger.warning("Could not remove %s", path, exc_info=True)
+    return live + exited
+
+
+def collect():
+    """Every process's metrics, merged."""
+    snapshots = [(True, REGISTRY.snapshot())]
+    directory = exporter.directory()
+    if not directory:
+        return _merge(snapshots)
+
+    exporter.write()
+    # One scrape at a time, or two could fold the same exited process
+    with open(os.path.join(directory, ".lock"), "a") as lock:
+        locks.lock(lock, locks.LOCK_EX)
+        try:
+            snapshots += _read_snapshots(directory)
+        finally:
+            locks.unlock(lock)
+    return _merge(snapshots)
+
+
+# ---------------- EXPOSITION ---------------- #
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, key, extra=()):
+    pairs = list(zip(names, key)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def render(metrics):
+    lines = []
+    for name in sorted(metrics):
+        metric = metrics[name]
+        names = metric["labels"]
+        help_text = metric["help"].replace("\\", "\\\\").replace("\n", "\\n")
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+
+        for key, value in sorted(metric["values"].items()):
+            if metric["kind"] != "histogram":
+                lines.append(f"{name}{_labels(names, key)} {value}")
+                continue
+
+            total = 0
+            bounds = [str(float(bound)) for bound in metric["buckets"]] + ["+Inf"]
+            for bound, count in zip(bounds, value[:-1]):
+                total += count
+                lines.append(f"{name}_bucket{_labels(names, key, [('le', bound)])} {total}")
+            lines.append(f"{name}_sum{_labels(names, key)} {value[-1]}")
+            lines.append(f"{name}_count{_labels(names, key)} {total}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if not token:
+        # Open only in development
+        if not settings.DEBUG:
+            return HttpResponse(status=403)
+    elif not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return HttpResponse(status=403)
+
+    return HttpResponse(render(collect()), content_type=CONTENT_TYPE)
+
+
+# Included lazily by config.urls
+urlpatterns = [path('', metrics_view, name='metrics')]
+
+
+# ---------------- REQUESTS + QUERIES ---------------- #
+
+REQUEST_SECONDS = histogram(
+    "http_request_duration_seconds",
+    "Time to produce a response, by route.",
+    ["method", "route", "status"]
+)
+REQUESTS_IN_FLIGHT = gauge("http_requests_in_flight", "Requests being handled.")
+QUERY_SECONDS = histogram(
+    "db_query_duration_seconds",
+    "Database query time, by database and statement type.",
+    ["alias", "statement"]
+)
+
+_METHODS = {"GET", "HEAD", "OPTIONS", "POST", "PUT", "PATCH", "DELETE"}
+_STATEMENTS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+
+def _time_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        statement = sql.lstrip()[:6].upper()
+        QUERY_SECONDS.observe(
+            time.perf_counter() - started,
+            alias=context["connection"].alias,
+            statement=statement if statement in _STATEMENTS else "OTHER"
+        )
+
+
+def _instrument_connection(sender, connection, **kwargs):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+connection_created.connect(_instrument_connection, dispatch_uid="config.metrics")
+
+
+class MetricsMiddleware:
+    """Request latency per route (the URL pattern, so ids don't add series)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _record(self, request, started, response):
+        match = request.resolver_match
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method if request.method in _METHODS else "OTHER",
+            route=match.route if match else "unmatched",
+            status=response.status_code
+        )
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        exporter.ensure_started()
+        started = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            response = self.get_response(request)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+        return self._record(request, started, response)
+
+    async def __acall__(self, request):
+        exporter.ensure_started()
+        started = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            response = await self.get_response(request)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+        return self._record(request, started, response)
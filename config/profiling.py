@@ -0,0 +1,156 @@
+"""
+Per-request SQL profiling.
+
+Opt-in with ``QUERY_PROFILING = True`` (or ``QUERY_PROFILING=1`` in the
+environment). Every request then gets a ``Server-Timing`` header with its
+query count and DB time, a structured log line on the ``config.profiling``
+logger, and a warning for query shapes that repeat often enough to look
+like an N+1 loop.
+"""
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger("config.profiling")
+
+DEFAULT_N_PLUS_ONE_THRESHOLD = 5
+
+_IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_SPACES = re.compile(r"\s+")
+
+
+def query_shape(sql):
+    """
+    Reduce a SQL statement to its shape so that the same query issued with
+    different parameters (the signature of an N+1 loop) compares equal.
+    """
+    sql = _IN_LIST.sub("IN (...)", sql)
+    sql = _LITERAL.sub("?", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+# ---------------- RECORDER ---------------- #
+
+class QueryRecorder:
+    """Collects every query run on the wrapped connections."""
+
+    def __init__(self, using=None):
+        self.aliases = [using] if using else list(connections)
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                "alias": context["connection"].alias,
+                "sql": sql,
+                "duration": time.perf_counter() - start,
+            })
+
+    @contextmanager
+    def record(self):
+        with ExitStack() as stack:
+            for alias in self.aliases:
+                stack.enter_context(connections[alias].execute_wrapper(self))
+            yield self
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(q["duration"] for q in self.queries)
+
+    def repeated_shapes(self, threshold=2):
+        shapes = Counter(query_shape(q["sql"]) for q in self.queries)
+        return {
+            shape: count
+            for shape, count in shapes.most_common()
+            if count >= threshold
+        }
+
+
+# ---------------- MIDDLEWARE ---------------- #
+
+class QueryProfilingMiddleware:
+    """
+    Records query count, total DB time and repeated query shapes for each
+    request. Disabled (removed from the stack) unless QUERY_PROFILING is on.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "QUERY_PROFILING", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(
+            settings,
+            "QUERY_PROFILING_N_PLUS_ONE_THRESHOLD",
+            DEFAULT_N_PLUS_ONE_THRESHOLD
+        )
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+
+        with recorder.record():
+            response = self.get_response(request)
+
+        elapsed = time.perf_counter() - start
+        suspects = recorder.repeated_shapes(self.threshold)
+
+        response["Server-Timing"] = ", ".join([
+            f'db;dur={recorder.total_time * 1000:.1f};desc="{recorder.count} queries"',
+            f"app;dur={elapsed * 1000:.1f}",
+        ])
+
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": recorder.count,
+            "db_ms": round(recorder.total_time * 1000, 2),
+            "total_ms": round(elapsed * 1000, 2),
+            "repeated": suspects,
+        }
+
+        if suspects:
+            logger.warning("possible N+1: %s", json.dumps(record))
+        else:
+            logger.info("%s", json.dumps(record))
+
+        return response
+
+
+# ---------------- TEST HELPER ---------------- #
+
+@contextmanager
+def assert_max_queries(budget, using=None):
+    """
+    Fail when the wrapped block runs more than ``budget`` queries.
+
+        with assert_max_queries(5):
+            client.get("/api/articles/")
+    """
+    recorder = QueryRecorder(using)
+
+    with recorder.record():
+        yield recorder
+
+    if recorder.count > budget:
+        lines = [f"{recorder.count} queries executed, budget was {budget}"]
+        for shape, count in recorder.repeated_shapes().items():
+            lines.append(f"  {count}x {shape}")
+        for number, query in enumerate(recorder.queries, start=1):
+            lines.append(f"{number}. {query['sql']}")
+        raise AssertionError("\n".join(lines))
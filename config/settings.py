@@ -9,6 +9,8 @@ https://docs.djangoproject.com/en/6.0/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
+import os
+import sys
 from datetime import timedelta
 from pathlib import Path
 
@@ -44,11 +46,20 @@ INSTALLED_APPS = [
 ]
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication that trusts workspace roles embedded in the token
+        'users.authentication.WorkspaceJWTAuthentication',
     ),
 }
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),
+    'TOKEN_OBTAIN_SERIALIZER': 'users.authentication.WorkspaceTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'users.authentication.WorkspaceTokenRefreshSerializer',
+}
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # must be first
+    'config.metrics.MetricsMiddleware',  # request latency for /metrics
+    'config.profiling.QueryProfilingMiddleware',  # no-op unless QUERY_PROFILING
+    'config.db_routing.ReadYourWritesMiddleware',  # replica reads + primary pinning
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,6 +69,28 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-request SQL profiling (Server-Timing header + N+1 warnings)
+QUERY_PROFILING = os.environ.get('QUERY_PROFILING', '') == '1'
+QUERY_PROFILING_N_PLUS_ONE_THRESHOLD = 5
+
+# /metrics (config.metrics). With several worker processes, point
+# METRICS_DIR at a directory they share so the endpoint reports all of
+# them. METRICS_TOKEN is required as a bearer token; without one the
+# endpoint is only served when DEBUG is on.
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# When a new current version is rendered (articles.rendering): "background"
+# (worker thread), "inline" (in the request) or "off" (on first read).
+# Tests render inline; a worker thread would wait on the test's transaction.
+RENDER_AFTER_SAVE = os.environ.get(
+    'RENDER_AFTER_SAVE', 'inline' if sys.argv[1:2] == ['test'] else 'background'
+)
+
+# Import lazily loaded URLconfs and clients when the WSGI/ASGI app loads.
+# Enable for pre-forking servers (gunicorn --preload); see config.warmup.
+WARM_UP = os.environ.get('DJANGO_WARM_UP', '') == '1'
+
 ROOT_URLCONF = 'config.urls'
 CORS_ALLOW_ALL_ORIGINS = True  # only for dev/demo
 TEMPLATES = [
@@ -81,12 +114,142 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_PROFILE selects the backend:
+#   sqlite   - single node; WAL, busy timeout and tuned pragmas on every
+#              connection (set SQLITE_TUNING=0 for stock SQLite settings)
+#   postgres - persistent connections with health checks, or a psycopg
+#              connection pool with DB_POOL=1
+DB_PROFILE = os.environ.get('DB_PROFILE', 'sqlite')
+
+if DB_PROFILE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'code_relay'),
+            'USER': os.environ.get('POSTGRES_USER', 'postgres'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '600')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+
+    if os.environ.get('DB_POOL') == '1':
+        # Django manages pooled connections itself, so CONN_MAX_AGE must be 0
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '20')),
+            'timeout': 10,
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+
+    if os.environ.get('SQLITE_TUNING', '1') == '1':
+        DATABASES['default']['OPTIONS'] = {
+            # seconds a writer waits on the lock before "database is locked"
+            'timeout': 20,
+            # take the write lock at BEGIN so read->write upgrades cannot deadlock
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA temp_store=MEMORY;'
+                'PRAGMA cache_size=-20000;'
+                'PRAGMA mmap_size=134217728;'
+            ),
+        }
+
+# Read replicas: comma-separated POSTGRES_REPLICA_HOSTS, or SQLITE_REPLICA_PATHS
+# (copies of the primary file refreshed with `manage.py sync_sqlite_replicas`)
+# become aliases replica1, replica2, ... Safe requests read from them unless
+# the client wrote within the last REPLICA_PIN_SECONDS.
+_replica_targets = [
+    target.strip()
+    for target in os.environ.get(
+        'POSTGRES_REPLICA_HOSTS' if DB_PROFILE == 'postgres' else 'SQLITE_REPLICA_PATHS',
+        ''
+    ).split(',')
+    if target.strip()
+]
+
+DATABASE_REPLICAS = []
+for _number, _target in enumerate(_replica_targets, start=1):
+    _alias = f'replica{_number}'
+    DATABASES[_alias] = {
+        **DATABASES['default'],
+        'HOST' if DB_PROFILE == 'postgres' else 'NAME': _target,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(_alias)
+
+# Workspace shards: comma-separated POSTGRES_SHARD_HOSTS or SQLITE_SHARD_PATHS
+# become aliases shard1, shard2, ... (create their tables with
+# `manage.py migrate --database shardN`). New workspaces are placed on the
+# least-loaded shard; `manage.py move_workspace` rebalances. See
+# config/sharding.py for what is sharded.
+_shard_targets = [
+    target.strip()
+    for target in os.environ.get(
+        'POSTGRES_SHARD_HOSTS' if DB_PROFILE == 'postgres' else 'SQLITE_SHARD_PATHS',
+        ''
+    ).split(',')
+    if target.strip()
+]
+
+DATABASE_SHARDS = []
+for _number, _target in enumerate(_shard_targets, start=1):
+    _alias = f'shard{_number}'
+    DATABASES[_alias] = {
+        **DATABASES['default'],
+        'HOST' if DB_PROFILE == 'postgres' else 'NAME': _target,
+    }
+    DATABASE_SHARDS.append(_alias)
+
+SHARDED_MODELS = [
+    'articles.Article',
+    'articles.Article_tags',
+    'articles.ArticleVersion',
+    'articles.Document',
+    'articles.ArticleSignature',
+    'articles.VersionRetentionPolicy',
+    'articles.RenderedVersion',
+]
+SHARD_REFERENCE_MODELS = ['articles.Tag']
+# Ids of rows created on shardN start at N * SHARD_ID_BLOCK
+SHARD_ID_BLOCK = 10 ** 12
+
+DATABASE_ROUTERS = [
+    'config.sharding.WorkspaceShardRouter',
+    'config.db_routing.PrimaryReplicaRouter',
+]
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', '5'))
+REPLICA_PIN_COOKIE = 'primary_until'
+
+# Cache. With REDIS_URL (needs the redis package) all processes share it;
+# otherwise each process has its own, and changes to cached state such as
+# the shard directory reach the others only when their entries expire.
+REDIS_URL = os.environ.get('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
     }
-}
 
 
 # Password validation
@@ -126,4 +289,39 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'css']
 
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', BASE_DIR / 'media')
+MEDIA_URL = '/media/'
+
+# Documents and version snapshots each live in local storage (MEDIA_ROOT)
+# or Google Drive; see articles.storage.
+_FILE_STORAGES = {
+    'local': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'drive': {'BACKEND': 'articles.storage.DriveStorage'},
+}
+
+STORAGES = {
+    'default': _FILE_STORAGES['local'],
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    'documents': _FILE_STORAGES[os.environ.get('DOCUMENT_STORAGE', 'local')],
+    'versions': _FILE_STORAGES[os.environ.get('VERSION_STORAGE', 'drive')],
+}
+
+# Storage alias -> internal nginx location serving the same files. Local
+# downloads from that storage are then handed off with X-Accel-Redirect,
+# e.g. DOCUMENTS_ACCEL_REDIRECT=/protected-media/ with
+#   location /protected-media/ { internal; alias /srv/app/media/; }
+STORAGE_ACCEL_REDIRECT = {
+    alias: location
+    for alias, location in (
+        ('documents', os.environ.get('DOCUMENTS_ACCEL_REDIRECT')),
+        ('versions', os.environ.get('VERSIONS_ACCEL_REDIRECT')),
+    )
+    if location
+}
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Google Drive REST endpoint used by the async client. Point it at a fake
+# server for benchmarks; DRIVE_API_TOKEN skips the service-account token.
+DRIVE_API_URL = os.environ.get('DRIVE_API_URL', 'https://www.googleapis.com')
+DRIVE_API_TOKEN = os.environ.get('DRIVE_API_TOKEN')
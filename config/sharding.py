@@ -0,0 +1,254 @@
+"""
+Workspace sharding.
+
+Everything that belongs to one workspace's articles (SHARDED_MODELS:
+articles, their versions, tag links, documents, signatures and retention
+policy) lives in the database that the shard directory
+(workspaces.WorkspaceShard) assigns to the workspace. Workspaces without a
+directory row live on ``default``, and the router is inert until
+DATABASE_SHARDS is configured. Users, workspaces, memberships and the
+directory itself always stay on ``default``.
+
+The router finds the workspace from the instance hint Django passes for
+saves and related lookups (``article.versions.all()``,
+``ArticleVersion(article=article).save()``). Plain queries such as
+``Article.objects.filter(workspace_id=...)`` carry no hint; run them inside
+``use_workspace(workspace_id)`` or add ``.using(shard_for(workspace_id))``.
+Lookups by primary key alone go through ``get_by_pk``.
+
+Reference models (SHARD_REFERENCE_MODELS, i.e. tags) are written to
+``default`` and mirrored to every shard, so tag joins stay on one database.
+
+Directory entries are cached. With a per-process cache (LocMem, the
+default without REDIS_URL) another process keeps using an entry until it
+expires, so a change reaches every process only after ``directory_lag``
+seconds; workspaces.sharding.move_workspace waits that long.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, models
+
+DIRECTORY_TTL = 60
+# Entries of a workspace being moved are re-read this often, so writes
+# resume soon after the cutover
+MOVING_TTL = 1
+DEFAULT_ID_BLOCK = 10 ** 12
+
+ACTIVE = "active"
+MOVING = "moving"
+
+_workspace = ContextVar("shard_workspace", default=None)
+
+
+class WorkspaceMoving(DatabaseError):
+    """A write hit a workspace while it is being moved between shards."""
+
+
+def shard_aliases():
+    return getattr(settings, "DATABASE_SHARDS", [])
+
+
+def all_aliases():
+    """Every database that can hold sharded rows, ``default`` first."""
+    return [DEFAULT_DB_ALIAS, *shard_aliases()]
+
+
+def id_block():
+    return getattr(settings, "SHARD_ID_BLOCK", DEFAULT_ID_BLOCK)
+
+
+def _cache_key(workspace_id):
+    return f"shard:{workspace_id}"
+
+
+def directory_is_shared():
+    """Whether every process reads the directory through the same cache."""
+    return not settings.CACHES["default"]["BACKEND"].endswith("LocMemCache")
+
+
+def directory_lag(state=ACTIVE):
+    """Seconds another process may keep acting on a cached entry in ``state``."""
+    if state == MOVING:
+        return MOVING_TTL
+    return 0 if directory_is_shared() else DIRECTORY_TTL
+
+
+def directory_entry(workspace_id):
+    """``(alias, state)`` for the workspace, cached for ``directory_lag(state)``."""
+    entry = cache.get(_cache_key(workspace_id))
+    if entry is None:
+        WorkspaceShard = apps.get_model("workspaces", "WorkspaceShard")
+        # Always the primary: a replica could still point at the old shard
+        row = WorkspaceShard.objects.using(DEFAULT_DB_ALIAS).filter(
+            workspace_id=workspace_id
+        ).values_list("alias", "state").first()
+        entry = tuple(row) if row else (DEFAULT_DB_ALIAS, ACTIVE)
+        cache.set(_cache_key(workspace_id), entry,
+                  MOVING_TTL if entry[1] == MOVING else DIRECTORY_TTL)
+    return entry
+
+
+def shard_for(workspace_id):
+    if not shard_aliases():
+        return DEFAULT_DB_ALIAS
+    return directory_entry(workspace_id)[0]
+
+
+def forget_shards(workspace_ids):
+    cache.delete_many([_cache_key(workspace_id) for workspace_id in workspace_ids])
+
+
+@contextmanager
+def use_workspace(workspace_id):
+    """Route hint-less queries on sharded models in the block to this workspace."""
+    token = _workspace.set(workspace_id)
+    try:
+        yield
+    finally:
+        _workspace.reset(token)
+
+
+def on_shard(queryset, alias):
+    # Leave default to the router so reads can still go to a replica
+    return queryset if alias == DEFAULT_DB_ALIAS else queryset.using(alias)
+
+
+def each_shard(queryset):
+    """``queryset`` once per database that can hold sharded rows."""
+    for alias in all_aliases():
+        yield on_shard(queryset, alias)
+
+
+def get_by_pk(model, pk):
+    """
+    Fetch a sharded row by primary key alone. New rows get ids from their
+    shard's id block, so that shard is tried first; rows moved since then
+    are found by trying the others.
+    """
+    aliases = all_aliases()
+    home = pk // id_block()
+    if 0 <= home < len(aliases):
+        aliases.insert(0, aliases.pop(home))
+
+    for alias in aliases:
+        obj = on_shard(model.objects.all(), alias).filter(pk=pk).first()
+        if obj is None:
+            continue
+        # Mid-move a row exists on both sides; the directory decides
+        current = shard_for(obj.workspace_id)
+        if current != alias:
+            obj = on_shard(model.objects.all(), current).filter(pk=pk).first()
+        return obj
+    return None
+
+
+def shards_for(workspace_ids):
+    """``{alias: [workspace_id, ...]}`` for the given workspaces."""
+    grouped = {}
+    for workspace_id in workspace_ids:
+        grouped.setdefault(shard_for(workspace_id), []).append(workspace_id)
+    return grouped
+
+
+# ---------------- MANAGER ---------------- #
+
+class ShardedQuerySet(models.QuerySet):
+
+    def create(self, **kwargs):
+        # QuerySet.create() picks the database before the row exists, so the
+        # router gets no instance hint; save() passes one
+        if self._db is not None:
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True)
+        return obj
+
+
+ShardedManager = models.Manager.from_queryset(ShardedQuerySet)
+
+
+# ---------------- ROUTER ---------------- #
+
+class WorkspaceShardRouter:
+    """
+    Routes SHARDED_MODELS to their workspace's shard. Returns None for
+    everything on ``default`` so the replica router can take over.
+    """
+
+    def __init__(self):
+        self.sharded = {label.lower() for label in getattr(settings, "SHARDED_MODELS", [])}
+        self.reference = {
+            label.lower() for label in getattr(settings, "SHARD_REFERENCE_MODELS", [])
+        }
+
+    def _is_sharded(self, model):
+        return model._meta.label_lower in self.sharded
+
+    def _workspace_of(self, instance):
+        if instance._meta.label_lower == "workspaces.workspace":
+            return instance.pk
+
+        workspace_id = getattr(instance, "workspace_id", None)
+        if workspace_id is not None:
+            return workspace_id
+
+        # e.g. an ArticleVersion: follow its already-loaded article
+        for field in instance._meta.concrete_fields:
+            if field.many_to_one and self._is_sharded(field.related_model):
+                parent = field.get_cached_value(instance, None)
+                if parent is not None:
+                    return self._workspace_of(parent)
+        return None
+
+    def _entry(self, hints):
+        instance = hints.get("instance")
+        workspace_id = None
+        if instance is not None:
+            workspace_id = self._workspace_of(instance)
+            if workspace_id is None and instance._state.db in shard_aliases():
+                return instance._state.db, ACTIVE
+        if workspace_id is None:
+            workspace_id = _workspace.get()
+        if workspace_id is None:
+            return None
+        return directory_entry(workspace_id)
+
+    def db_for_read(self, model, **hints):
+        if not shard_aliases():
+            return None
+        label = model._meta.label_lower
+        if label not in self.sharded and label not in self.reference:
+            return None
+
+        entry = self._entry(hints)
+        if entry is None or entry[0] == DEFAULT_DB_ALIAS:
+            return None
+        return entry[0]
+
+    def db_for_write(self, model, **hints):
+        # Reference rows are written to default and mirrored from there
+        if not shard_aliases() or not self._is_sharded(model):
+            return None
+
+        entry = self._entry(hints)
+        if entry is None:
+            return None
+        alias, state = entry
+        if state == MOVING:
+            raise WorkspaceMoving("Workspace is being moved; retry shortly.")
+        return None if alias == DEFAULT_DB_ALIAS else alias
+
+    def allow_relation(self, obj1, obj2, **hints):
+        labels = {obj1._meta.label_lower, obj2._meta.label_lower}
+        if labels & (self.sharded | self.reference):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Every shard gets the full schema; global tables just stay empty
+        return None
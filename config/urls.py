@@ -1,5 +1,5 @@
 """URL configuration for config project."""
-from importlib import import_module
+from importlib.util import find_spec
 
 from django.contrib import admin
 from django.http import JsonResponse
@@ -17,13 +17,27 @@ def _missing_app_view(_request, *args, **kwargs):
     )
 
 
-def _safe_include(module_path):
+def _module_exists(module_path):
     try:
-        import_module(module_path)
-        return include(module_path)
+        return find_spec(module_path) is not None
     except ModuleNotFoundError:
-        fallback_patterns = [path('', _missing_app_view, name='module_unavailable')]
-        return include((fallback_patterns, 'fallback'))
+        # A parent package is missing
+        return False
+
+
+def _safe_include(module_path):
+    """
+    Include an app's URLconf without importing it. Django imports a string
+    urlconf the first time a request reaches its prefix (or at warm-up,
+    config.warmup), so processes that never serve that app skip its views.
+    Only a missing module falls back to the 503 view; an import error
+    inside an existing one surfaces as usual.
+    """
+    if _module_exists(module_path):
+        return (module_path, None, None)
+
+    fallback_patterns = [path('', _missing_app_view, name='module_unavailable')]
+    return include((fallback_patterns, 'fallback'))
 
 
 urlpatterns = [
@@ -35,5 +49,7 @@ urlpatterns = [
     path('api/approvals/', _safe_include('apps.approvals.urls')),
     path('api/login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/batch/', _safe_include('config.batch')),
+    path('metrics', _safe_include('config.metrics')),
     path('users/', _safe_include('apps.users.urls')),
 ]
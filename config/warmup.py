@@ -0,0 +1,53 @@
+"""
+Warm-up for pre-forking servers.
+
+App URLconfs and the Drive client load lazily, which keeps management
+commands and one-off processes fast but puts that import cost on the first
+request each worker serves. Servers that load the application once and
+fork workers from it (``gunicorn --preload``, uWSGI without ``lazy-apps``)
+should call ``warm_up()`` in the parent: the imports then happen once and
+the workers share the memory copy-on-write. config.wsgi / config.asgi do
+this when WARM_UP is set (DJANGO_WARM_UP=1).
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.urls import URLResolver, get_resolver
+
+logger = logging.getLogger(__name__)
+
+
+def _load_urlconfs(resolver):
+    # url_patterns imports a lazily included URLconf (and its views)
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            _load_urlconfs(pattern)
+
+
+def _uses_drive():
+    return any(
+        storage["BACKEND"].endswith("DriveStorage")
+        for storage in settings.STORAGES.values()
+    )
+
+
+def warm_up():
+    """Import what requests will need. Returns the seconds spent."""
+    started = time.perf_counter()
+
+    _load_urlconfs(get_resolver())
+
+    if _uses_drive():
+        from articles.services import preload_drive_client
+
+        preload_drive_client()
+
+    # Connections opened while warming up must not be shared with forked
+    # workers
+    connections.close_all()
+
+    elapsed = time.perf_counter() - started
+    logger.info("Warm-up finished in %.3fs", elapsed)
+    return elapsed
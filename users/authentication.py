@@ -0,0 +1,122 @@
+"""
+JWT tokens that carry the user's workspace roles.
+
+Access tokens embed a compact ``{workspace_id: role_code}`` map plus a
+stamp of the memberships it was built from, and the user's staff and
+superuser flags. ``WorkspaceJWTAuthentication`` trusts those while the
+stamp and flags match the user's current ones and the user is still
+active, building an unsaved ``User`` from the claims instead of loading
+the row, so a request reaches the view (and its permission checks) with
+no auth-related queries. Anything else falls back to the primary database.
+
+Both are cached (workspaces.permissions). Revoking access takes effect at
+once in every process only with a shared cache (REDIS_URL); with the
+per-process default, other processes notice within
+STAMP_LOCAL_CACHE_TIMEOUT seconds.
+"""
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.workspaces.permissions import (
+    CODE_ROLES,
+    ROLE_CODES,
+    current_membership_stamp,
+    membership_stamp,
+    user_flags,
+    workspace_roles_for,
+)
+from config.db_routing import use_primary
+
+User = get_user_model()
+
+ROLES_CLAIM = "wsr"
+STAMP_CLAIM = "wsv"
+# [is_staff, is_superuser]
+FLAGS_CLAIM = "wsf"
+
+# Users in more workspaces than this get no role map (only the stamp), to
+# keep the token small; their permission checks query the database.
+MAX_ROLE_CLAIMS = 200
+
+
+# ---------------- TOKENS ---------------- #
+
+class WorkspaceRefreshToken(RefreshToken):
+    """
+    Refresh token whose access tokens carry workspace roles and admin
+    flags. Both are read fresh every time an access token is minted, never
+    copied from the long-lived refresh token.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token["username"] = user.get_username()
+        return token
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        user_id = self[api_settings.USER_ID_CLAIM]
+        roles = workspace_roles_for(user_id)
+
+        access[STAMP_CLAIM] = membership_stamp(roles)
+        access[FLAGS_CLAIM] = list(user_flags(user_id)[1:])
+        if len(roles) <= MAX_ROLE_CLAIMS:
+            access[ROLES_CLAIM] = {
+                str(workspace_id): ROLE_CODES[role]
+                for workspace_id, role in roles.items()
+                if role in ROLE_CODES
+            }
+        return access
+
+
+class WorkspaceTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = WorkspaceRefreshToken
+
+
+class WorkspaceTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = WorkspaceRefreshToken
+
+
+# ---------------- AUTHENTICATION ---------------- #
+
+class WorkspaceJWTAuthentication(JWTAuthentication):
+
+    def get_user(self, validated_token):
+        try:
+            user_id = int(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        stamp = validated_token.get(STAMP_CLAIM)
+        flags = validated_token.get(FLAGS_CLAIM)
+        if (stamp is None or flags is None
+                or current_membership_stamp(user_id) != (stamp, True, *flags)):
+            # Plain or older token, memberships or admin flags changed since
+            # it was minted, or the user was deactivated (the lookup rejects
+            # them). The primary, so a lagging replica can't undo any of it
+            with use_primary():
+                user = super().get_user(validated_token)
+            user.workspace_roles = workspace_roles_for(user.pk)
+            return user
+
+        # Unsaved stand-in: usable for filters and FK assignment, never save() it
+        is_staff, is_superuser = flags
+        user = User(pk=user_id, is_active=True, is_staff=is_staff, is_superuser=is_superuser)
+        user.username = validated_token.get("username", "")
+        user._state.adding = False
+
+        claimed = validated_token.get(ROLES_CLAIM)
+        user.workspace_roles = None if claimed is None else {
+            int(workspace_id): CODE_ROLES[code]
+            for workspace_id, code in claimed.items()
+        }
+        return user
@@ -1,3 +1,219 @@
-from django.test import TestCase
+import os
+import sqlite3
+import tempfile
+import time
+from io import StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, router, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.workspaces.models import Workspace, WorkspaceMembership
+from config import db_routing
+from .authentication import WorkspaceJWTAuthentication, WorkspaceRefreshToken
+
+User = get_user_model()
+
+
+def _sqlite_replica(test):
+    """Register a ``lagging`` connection on an empty SQLite file for ``test``."""
+    handle, path = tempfile.mkstemp(suffix=".db")
+    os.close(handle)
+    test.addCleanup(os.remove, path)
+
+    primary = connections["default"]
+    replica = type(primary)({**primary.settings_dict, "NAME": path}, "lagging")
+    connections["lagging"] = replica
+    test.addCleanup(connections.__delitem__, "lagging")
+    test.addCleanup(replica.close)
+    return "lagging", path
+
+
+class WorkspaceJWTAuthenticationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("editor", "editor@example.com", "password")
+        owner = User.objects.create_user("owner", "owner@example.com", "password")
+        self.workspace = Workspace.objects.create(name="Docs", created_by=owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.membership = WorkspaceMembership.objects.create(
+                workspace=self.workspace,
+                user=self.user,
+                role=WorkspaceMembership.Role.EDITOR
+            )
+
+    def access_token(self):
+        return AccessToken(str(WorkspaceRefreshToken.for_user(self.user).access_token))
+
+    def test_current_stamp_trusts_the_token(self):
+        token = self.access_token()
+        WorkspaceJWTAuthentication().get_user(token)  # caches the stamp
+        with self.assertNumQueries(0):
+            user = WorkspaceJWTAuthentication().get_user(token)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.workspace_roles, {self.workspace.pk: "editor"})
+
+    def test_deactivated_user_is_rejected(self):
+        token = self.access_token()
+        WorkspaceJWTAuthentication().get_user(token)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            WorkspaceJWTAuthentication().get_user(token)
+
+    def test_removed_member_loses_the_role(self):
+        token = self.access_token()
+        WorkspaceJWTAuthentication().get_user(token)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.membership.delete()
+        user = WorkspaceJWTAuthentication().get_user(token)
+        self.assertEqual(user.workspace_roles, {})
+
+    def test_admin_flags_come_from_the_token(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_staff = self.user.is_superuser = True
+            self.user.save()
+        token = self.access_token()
+        WorkspaceJWTAuthentication().get_user(token)
+        with self.assertNumQueries(0):
+            user = WorkspaceJWTAuthentication().get_user(token)
+        self.assertTrue(user.is_staff)
+        self.assertTrue(user.is_superuser)
+
+    def test_demoted_admin_is_loaded_from_the_database(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_staff = True
+            self.user.save()
+        token = self.access_token()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_staff = False
+            self.user.save()
+        self.assertFalse(WorkspaceJWTAuthentication().get_user(token).is_staff)
+
+
+@skipUnless(connection.vendor == "sqlite", "copies the SQLite test database as a replica")
+class LaggingReplicaTests(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("editor", "editor@example.com", "password")
+        owner = User.objects.create_user("owner", "owner@example.com", "password")
+        workspace = Workspace.objects.create(name="Docs", created_by=owner)
+        self.membership = WorkspaceMembership.objects.create(
+            workspace=workspace,
+            user=self.user,
+            role=WorkspaceMembership.Role.EDITOR
+        )
+
+    def replica_of_now(self):
+        """A copy of the primary as it is now, to be read as a lagging replica."""
+        alias, path = _sqlite_replica(self)
+        connection.ensure_connection()
+        copy = sqlite3.connect(path)
+        connection.connection.backup(copy)
+        copy.close()
+        return alias
+
+    def test_removed_member_is_not_trusted_from_a_lagging_replica(self):
+        token = AccessToken(str(WorkspaceRefreshToken.for_user(self.user).access_token))
+        replica = self.replica_of_now()
+        membership_id = self.membership.pk
+        self.membership.delete()
+
+        with override_settings(DATABASE_REPLICAS=[replica]):
+            reads = db_routing._replica_reads.set(True)
+            try:
+                # The replica still has the membership
+                self.assertTrue(WorkspaceMembership.objects.filter(pk=membership_id).exists())
+                user = WorkspaceJWTAuthentication().get_user(token)
+            finally:
+                db_routing._replica_reads.reset(reads)
+
+        self.assertEqual(user.workspace_roles, {})
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"], REPLICA_PIN_SECONDS=5)
+class ReplicaRoutingTests(TransactionTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def route(self, method="get", write=False, **headers):
+        """The database a read in the request goes to, and the response."""
+        seen = []
+
+        def view(request):
+            if write:
+                router.db_for_write(User)
+            seen.append(router.db_for_read(User))
+            return HttpResponse()
+
+        request = getattr(self.factory, method)("/", **headers)
+        response = db_routing.ReadYourWritesMiddleware(view)(request)
+        return seen[0], response
+
+    def test_safe_requests_read_from_the_replica(self):
+        self.assertEqual(self.route()[0], "replica1")
+        self.assertEqual(self.route("head")[0], "replica1")
+        # Outside a request: the primary
+        self.assertEqual(router.db_for_read(User), "default")
+
+    def test_a_write_pins_the_client_to_the_primary(self):
+        alias, response = self.route(write=True)
+
+        self.assertEqual(alias, "default")
+        until = float(response[db_routing.PRIMARY_UNTIL_HEADER])
+        self.assertAlmostEqual(until, time.time() + 5, delta=1)
+        self.assertEqual(
+            response.cookies["primary_until"].value, response[db_routing.PRIMARY_UNTIL_HEADER]
+        )
+        # Unsafe methods never read from a replica
+        self.assertEqual(self.route("post")[0], "default")
+
+    def test_reads_return_to_the_replica_once_the_pin_expires(self):
+        pinned = f"{time.time() + 3:.3f}"
+        expired = f"{time.time() - 1:.3f}"
+
+        self.assertEqual(self.route(HTTP_X_PRIMARY_UNTIL=pinned)[0], "default")
+        self.assertEqual(self.route(HTTP_X_PRIMARY_UNTIL=expired)[0], "replica1")
+
+        self.assertEqual(self.route(HTTP_COOKIE=f"primary_until={pinned}")[0], "default")
+        self.assertEqual(self.route(HTTP_COOKIE=f"primary_until={expired}")[0], "replica1")
+
+    def test_writes_and_transactions_use_the_primary(self):
+        reads = db_routing._replica_reads.set(True)
+        try:
+            self.assertEqual(router.db_for_read(User), "replica1")
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(User), "default")
+            self.assertEqual(router.db_for_write(User), "default")
+            # Every read after the write stays on the primary
+            self.assertEqual(router.db_for_read(User), "default")
+        finally:
+            db_routing._replica_reads.reset(reads)
+
+
+@skipUnless(connection.vendor == "sqlite", "copies the SQLite test database")
+class SyncSqliteReplicasTests(TransactionTestCase):
+
+    def test_replicas_get_a_copy_of_the_primary(self):
+        alias, _ = _sqlite_replica(self)
+        User.objects.create_user("copied", "copied@example.com", "password")
+
+        with override_settings(DATABASE_REPLICAS=[alias]):
+            call_command("sync_sqlite_replicas", stdout=StringIO())
+
+        self.assertTrue(User.objects.using(alias).filter(username="copied").exists())
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_is_an_error(self):
+        with self.assertRaisesMessage(CommandError, "No replicas configured"):
+            call_command("sync_sqlite_replicas", stdout=StringIO())
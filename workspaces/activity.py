@@ -0,0 +1,126 @@
+"""
+Buffered writer for the activity log.
+
+``record_activity`` never touches the database itself: once the caller's
+transaction commits, the event is appended to an in-process buffer, which
+is written with one bulk_create when it reaches ``FLUSH_SIZE`` events or
+every ``FLUSH_INTERVAL`` seconds (and at interpreter exit). Events whose
+write fails stay buffered for the next flush, up to ``MAX_BUFFERED``.
+"""
+import atexit
+import logging
+import threading
+
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import ActivityEvent
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SIZE = 500
+FLUSH_INTERVAL = 2.0
+# Beyond this many unwritten events (the database is down), the oldest go
+MAX_BUFFERED = 20 * FLUSH_SIZE
+
+
+def month_bucket(moment):
+    return moment.year * 100 + moment.month
+
+
+class ActivityBuffer:
+
+    def __init__(self, flush_size=FLUSH_SIZE, interval=FLUSH_INTERVAL, max_events=MAX_BUFFERED):
+        self.flush_size = flush_size
+        self.interval = interval
+        self.max_events = max_events
+        self.events = []
+        self.lock = threading.Lock()
+        self.flusher = None
+
+    def append(self, event):
+        with self.lock:
+            self.events.append(event)
+            full = len(self.events) >= self.flush_size
+            self._ensure_flusher()
+
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            events, self.events = self.events, []
+
+        if not events:
+            return 0
+
+        try:
+            ActivityEvent.objects.bulk_create(events, batch_size=self.flush_size)
+        except Exception:
+            logger.exception("Could not write %d activity events; keeping them", len(events))
+            self._restore(events)
+            return 0
+        return len(events)
+
+    def _restore(self, events):
+        for event in events:
+            event.pk = None  # the insert was rolled back
+        with self.lock:
+            self.events[:0] = events
+            overflow = len(self.events) - self.max_events
+            if overflow > 0:
+                del self.events[:overflow]
+        if overflow > 0:
+            logger.error("Dropped the %d oldest activity events", overflow)
+
+    def _ensure_flusher(self):
+        if self.flusher is None or not self.flusher.is_alive():
+            self.flusher = threading.Thread(target=self._run, daemon=True)
+            self.flusher.start()
+
+    def _run(self):
+        stop = threading.Event()
+        while not stop.wait(self.interval):
+            close_old_connections()
+            self.flush()
+
+
+buffer = ActivityBuffer()
+atexit.register(buffer.flush)
+
+
+def record_activity(workspace_id, verb, target_type, target_id, actor=None, using=None,
+                    **data):
+    """
+    Queue an activity event; it is dropped if the transaction on ``using``
+    (the database the change was written to) rolls back.
+    """
+    now = timezone.now()
+    event = ActivityEvent(
+        bucket=month_bucket(now),
+        workspace_id=workspace_id,
+        actor_id=getattr(actor, "pk", actor),
+        verb=verb,
+        target_type=target_type,
+        target_id=target_id,
+        data=data,
+        created_at=now
+    )
+    transaction.on_commit(lambda: buffer.append(event), using=using)
+
+
+def workspace_feed(workspace_id, before=None, limit=50):
+    """
+    One page of a workspace's feed, newest first. Keyset-paginated on id:
+    pass the returned cursor as ``before`` for the next page.
+    """
+    # Make this process's own recent events visible
+    buffer.flush()
+
+    events = ActivityEvent.objects.filter(workspace_id=workspace_id)
+    if before is not None:
+        events = events.filter(id__lt=before)
+
+    page = list(events.order_by("-id")[:limit + 1])
+    cursor = page[limit - 1].id if len(page) > limit else None
+    return page[:limit], cursor
@@ -0,0 +1,74 @@
+import gzip
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from ...activity import month_bucket
+from ...models import ActivityEvent
+
+
+class Command(BaseCommand):
+    help = (
+        "Export activity-log months older than --before to gzipped JSON lines "
+        "and optionally delete them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--before", type=int,
+            help="First month (YYYYMM) to keep. Defaults to twelve months ago."
+        )
+        parser.add_argument("--output", default="activity-archive")
+        parser.add_argument(
+            "--drop", action="store_true",
+            help="Delete each month once it has been exported."
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        before = options["before"]
+        if before is None:
+            today = timezone.now()
+            before = month_bucket(today.replace(year=today.year - 1, day=1))
+        if not 190001 <= before <= 999912 or not 1 <= before % 100 <= 12:
+            raise CommandError("--before must be a month in YYYYMM form")
+
+        os.makedirs(options["output"], exist_ok=True)
+        batch_size = options["batch_size"]
+
+        buckets = ActivityEvent.objects.filter(
+            bucket__lt=before
+        ).values_list("bucket", flat=True).distinct().order_by("bucket")
+
+        for bucket in list(buckets):
+            path = os.path.join(options["output"], f"activity-{bucket}.jsonl.gz")
+            events = ActivityEvent.objects.filter(bucket=bucket).order_by("id")
+
+            exported = 0
+            last_id = 0
+            with gzip.open(path, "wt", encoding="utf-8") as out:
+                while True:
+                    rows = list(events.filter(id__gt=last_id).values()[:batch_size])
+                    if not rows:
+                        break
+                    last_id = rows[-1]["id"]
+                    for row in rows:
+                        out.write(json.dumps(row, cls=DjangoJSONEncoder) + "\n")
+                    exported += len(rows)
+
+            dropped = 0
+            if options["drop"]:
+                # Only what was exported; the (bucket, id) index keeps each
+                # chunk a short range delete
+                while True:
+                    ids = list(
+                        events.filter(id__lte=last_id).values_list("id", flat=True)[:batch_size]
+                    )
+                    if not ids:
+                        break
+                    dropped += ActivityEvent.objects.filter(id__in=ids).delete()[0]
+
+            self.stdout.write(f"{bucket}: exported {exported}, dropped {dropped} -> {path}")
@@ -0,0 +1,38 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from ...models import Workspace
+from ...services import create_clone_job, run_clone_job
+
+
+class Command(BaseCommand):
+    help = "Deep-clone a workspace (articles, tag links, versions, documents)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("workspace_id", type=int)
+        parser.add_argument("--user", required=True, help="Username of the new owner.")
+        parser.add_argument("--name")
+        parser.add_argument(
+            "--history", action="store_true",
+            help="Copy every version instead of only the current one."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            source = Workspace.objects.get(pk=options["workspace_id"])
+            user = User.objects.get(username=options["user"])
+        except (Workspace.DoesNotExist, User.DoesNotExist) as exc:
+            raise CommandError(str(exc))
+
+        job = create_clone_job(
+            source,
+            user,
+            name=options["name"],
+            include_history=options["history"]
+        )
+
+        def report(processed, total):
+            self.stdout.write(f"{processed}/{total}")
+
+        run_clone_job(job.id, on_progress=report)
+        self.stdout.write(self.style.SUCCESS(f"Cloned into workspace {job.target_id}"))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ...models import Workspace
+from ...sharding import MOVE_CHUNK_SIZE, SETTLE_SECONDS, move_workspace
+
+
+class Command(BaseCommand):
+    help = (
+        "Move a workspace's articles, versions, tag links and documents to another "
+        "database (e.g. shard2) in chunks while the workspace stays online."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("workspace_id", type=int)
+        parser.add_argument("target", help="Database alias to move to.")
+        parser.add_argument("--batch-size", type=int, default=MOVE_CHUNK_SIZE)
+        parser.add_argument(
+            "--settle", type=float, default=SETTLE_SECONDS,
+            help=(
+                "Seconds to wait for in-flight writes after freezing them (never less "
+                "than the directory cache lifetime when the cache is per-process)."
+            )
+        )
+
+    def handle(self, *args, **options):
+        if not Workspace.objects.filter(pk=options["workspace_id"]).exists():
+            raise CommandError("Workspace not found.")
+
+        def report(phase, label, count):
+            self.stdout.write(f"{phase}: {label} {count}")
+
+        try:
+            source = move_workspace(
+                options["workspace_id"],
+                options["target"],
+                batch_size=options["batch_size"],
+                settle=options["settle"],
+                on_progress=report
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved workspace {options['workspace_id']} from {source} to {options['target']}"
+        ))
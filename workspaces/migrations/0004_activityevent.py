@@ -0,0 +1,34 @@
+# Generated by Django 6.0.2 on 2026-10-19 10:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspaces', '0003_workspaceclonejob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.PositiveIntegerField()),
+                ('verb', models.CharField(choices=[('version_created', 'Version created'), ('approved', 'Approved'), ('archived', 'Archived'), ('deleted', 'Deleted'), ('member_added', 'Member added'), ('member_role_changed', 'Member role changed'), ('member_removed', 'Member removed')], max_length=30)),
+                ('target_type', models.CharField(max_length=30)),
+                ('target_id', models.BigIntegerField()),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField()),
+                ('actor', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('workspace', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='workspaces.workspace')),
+            ],
+            options={
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['workspace', 'id'], name='activity_workspace_id_idx'), models.Index(fields=['bucket', 'id'], name='activity_bucket_id_idx')],
+            },
+        ),
+    ]
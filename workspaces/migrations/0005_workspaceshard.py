@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2 on 2026-10-19 11:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspaces', '0004_activityevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkspaceShard',
+            fields=[
+                ('workspace', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='shard', serialize=False, to='workspaces.workspace')),
+                ('alias', models.CharField(db_index=True, max_length=64)),
+                ('state', models.CharField(choices=[('active', 'Active'), ('moving', 'Moving')], default='active', max_length=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -138,12 +138,11 @@ class Article(models.Model):
         ]
 
     def clean(self):
-        # Ensure tags belong to same workspace
-        for tag in self.tags.all():
-            if tag.workspace != self.workspace:
-                raise ValidationError(
-                    "Tag must belong to the same workspace as the article."
-                )
+        # Ensure tags belong to same workspace (one query, not one per tag)
+        if self.tags.exclude(workspace_id=self.workspace_id).exists():
+            raise ValidationError(
+                "Tag must belong to the same workspace as the article."
+            )
 
     def __str__(self):
         return self.title
@@ -273,4 +272,153 @@ class Document(models.Model):
         ]
 
     def __str__(self):
-        return self.file_name
\ No newline at end of file
+        return self.file_name
+
+
+# =========================
+# Workspace Clone Job Model
+# =========================
+class WorkspaceCloneJob(models.Model):
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    source = models.ForeignKey(
+        Workspace,
+        on_delete=models.CASCADE,
+        related_name="clone_jobs"
+    )
+
+    target = models.ForeignKey(
+        Workspace,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+"
+    )
+
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="workspace_clone_jobs"
+    )
+
+    include_history = models.BooleanField(default=False)
+
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING
+    )
+
+    # Progress: rows (articles + documents) copied out of total
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"Clone {self.source_id} -> {self.target_id} ({self.status})"
+
+
+# =========================
+# Activity Event Model
+# =========================
+class ActivityEvent(models.Model):
+    """
+    Append-only activity log. Rows are written in batches by
+    workspaces.activity and bucketed by month (``bucket`` = YYYYMM) so old
+    months can be archived and dropped with the archive_activity command.
+
+    References are plain ids (no FK constraints or cascades): the log must
+    outlive the things it describes.
+    """
+
+    class Verb(models.TextChoices):
+        VERSION_CREATED = "version_created", "Version created"
+        APPROVED = "approved", "Approved"
+        ARCHIVED = "archived", "Archived"
+        DELETED = "deleted", "Deleted"
+        MEMBER_ADDED = "member_added", "Member added"
+        MEMBER_ROLE_CHANGED = "member_role_changed", "Member role changed"
+        MEMBER_REMOVED = "member_removed", "Member removed"
+
+    bucket = models.PositiveIntegerField()
+
+    workspace = models.ForeignKey(
+        Workspace,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="+"
+    )
+
+    actor = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        related_name="+"
+    )
+
+    verb = models.CharField(max_length=30, choices=Verb.choices)
+    target_type = models.CharField(max_length=30)
+    target_id = models.BigIntegerField()
+    data = models.JSONField(default=dict, blank=True)
+
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["-id"]
+        indexes = [
+            # per-workspace feed, keyset-paginated on id
+            models.Index(fields=["workspace", "id"], name="activity_workspace_id_idx"),
+            # archive / drop a month
+            models.Index(fields=["bucket", "id"], name="activity_bucket_id_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.verb} {self.target_type}:{self.target_id}"
+
+
+# =========================
+# Workspace Shard Model
+# =========================
+class WorkspaceShard(models.Model):
+    """
+    Shard directory: the database holding a workspace's articles (see
+    config.sharding). Workspaces without a row live on ``default``.
+    """
+
+    class State(models.TextChoices):
+        ACTIVE = "active", "Active"
+        # writes are refused while the move command copies the last changes
+        MOVING = "moving", "Moving"
+
+    workspace = models.OneToOneField(
+        Workspace,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="shard"
+    )
+
+    alias = models.CharField(max_length=64, db_index=True)
+
+    state = models.CharField(
+        max_length=10,
+        choices=State.choices,
+        default=State.ACTIVE
+    )
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Workspace {self.workspace_id} on {self.alias} ({self.state})"
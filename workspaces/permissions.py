@@ -1,11 +1,113 @@
+import zlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
 from .models import WorkspaceMembership
 
-def is_workspace_admin(user, workspace):
+
+# Roles are stored in JWT claims as one-letter codes to keep tokens small
+ROLE_CODES = {
+    WorkspaceMembership.Role.OWNER: "o",
+    WorkspaceMembership.Role.EDITOR: "e",
+    WorkspaceMembership.Role.VIEWER: "v",
+}
+CODE_ROLES = {code: role for role, code in ROLE_CODES.items()}
+
+EDIT_ROLES = (WorkspaceMembership.Role.OWNER, WorkspaceMembership.Role.EDITOR)
+
+STAMP_CACHE_KEY = "workspace-auth-stamp:{}"
+STAMP_CACHE_TIMEOUT = 300
+# With a per-process cache, changes made by other processes (a removed
+# member, a deactivated user) are only seen once the entry expires
+STAMP_LOCAL_CACHE_TIMEOUT = 15
+
+
+# ---------------- MEMBERSHIP STAMPS ---------------- #
+
+def workspace_roles_for(user_id):
+    # Always the primary: a lagging replica would hand back removed roles
+    return dict(
+        WorkspaceMembership.objects.using(DEFAULT_DB_ALIAS).filter(
+            user_id=user_id
+        ).values_list("workspace_id", "role")
+    )
+
+
+def membership_stamp(roles):
+    """A short fingerprint of a user's {workspace_id: role} map."""
+    encoded = ",".join(f"{ws}:{roles[ws]}" for ws in sorted(roles))
+    return zlib.crc32(encoded.encode())
+
+
+def _stamp_cache_timeout():
+    if settings.CACHES["default"]["BACKEND"].endswith("LocMemCache"):
+        return STAMP_LOCAL_CACHE_TIMEOUT
+    return STAMP_CACHE_TIMEOUT
+
+
+def user_flags(user_id):
+    """``(is_active, is_staff, is_superuser)``, all False for a deleted user."""
+    flags = get_user_model().objects.using(DEFAULT_DB_ALIAS).filter(
+        pk=user_id
+    ).values_list("is_active", "is_staff", "is_superuser").first()
+    return tuple(flags) if flags else (False, False, False)
+
+
+def current_membership_stamp(user_id):
+    """
+    ``(stamp, is_active, is_staff, is_superuser)`` for the user as they are
+    now, read from the primary. Served from the cache; recomputed with two
+    queries on a miss. Membership and user signals clear it, in every
+    process when the cache is shared (REDIS_URL), else only in the one
+    making the change.
+    """
+    key = STAMP_CACHE_KEY.format(user_id)
+    current = cache.get(key)
+    if current is None:
+        current = (membership_stamp(workspace_roles_for(user_id)), *user_flags(user_id))
+        cache.set(key, current, _stamp_cache_timeout())
+    return current
+
+
+def invalidate_membership_stamps(user_ids):
+    # After commit, so a concurrent request cannot re-cache the old stamp
+    keys = [STAMP_CACHE_KEY.format(user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+# ---------------- PERMISSION CHECKS ---------------- #
+
+def get_workspace_role(user, workspace_id):
+    """
+    The user's role in the workspace, or None. Uses the roles carried by the
+    access token when the authentication class attached them, so the check
+    costs no query.
+    """
     if not user.is_authenticated:
-        return False
+        return None
+
+    roles = getattr(user, "workspace_roles", None)
+    if roles is not None:
+        return roles.get(int(workspace_id))
 
     return WorkspaceMembership.objects.filter(
-        user=user,
-        workspace=workspace,
-        role=WorkspaceMembership.Role.ADMIN
-    ).exists()
\ No newline at end of file
+        user_id=user.id,
+        workspace_id=workspace_id
+    ).values_list("role", flat=True).first()
+
+
+def is_workspace_member(user, workspace_id):
+    return get_workspace_role(user, workspace_id) is not None
+
+
+def can_edit_workspace(user, workspace_id):
+    return get_workspace_role(user, workspace_id) in EDIT_ROLES
+
+
+def is_workspace_admin(user, workspace):
+    # OWNER is the administrative role (there is no separate ADMIN role)
+    workspace_id = getattr(workspace, "pk", workspace)
+    return get_workspace_role(user, workspace_id) == WorkspaceMembership.Role.OWNER
@@ -0,0 +1,17 @@
+from rest_framework import serializers
+from .models import Workspace, WorkspaceMembership
+
+
+class OnboardMemberSerializer(serializers.Serializer):
+    email = serializers.EmailField()
+    # Only the creator is an owner
+    role = serializers.ChoiceField(
+        choices=[WorkspaceMembership.Role.EDITOR, WorkspaceMembership.Role.VIEWER],
+        default=WorkspaceMembership.Role.VIEWER
+    )
+
+
+class OnboardWorkspaceSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=Workspace._meta.get_field("name").max_length)
+    description = serializers.CharField(required=False, allow_blank=True, default="")
+    members = OnboardMemberSerializer(many=True, required=False, default=list)
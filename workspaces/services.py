@@ -0,0 +1,273 @@
+import threading
+
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from apps.articles.models import Article, ArticleVersion, Document
+from apps.articles.services import refresh_current_versions
+from config.sharding import shard_for
+
+from .activity import record_activity
+from .models import ActivityEvent, Workspace, WorkspaceCloneJob, WorkspaceMembership
+from .permissions import invalidate_membership_stamps
+from .sharding import mirror_reference_rows
+
+
+CLONE_CHUNK_SIZE = 1000
+
+
+# ---------------- ONBOARDING ---------------- #
+
+def onboard_workspace(creator, name, description="", members=()):
+    """
+    Create a workspace, its owner membership and every invited member in
+    one transaction.
+
+    ``members`` is a list of ``{"email": ..., "role": ...}`` dicts. Users are
+    resolved with a single query and memberships are bulk inserted, so the
+    query count does not grow with the size of the team. Emails match
+    case-insensitively.
+
+    Returns ``(workspace, added, unknown_emails)``.
+    """
+    # Keyed by the lower-cased email; ``invited`` keeps the spelling given
+    roles = {}
+    invited = {}
+    for member in members:
+        email = (member.get("email") or "").strip()
+        if email:
+            roles[email.lower()] = member.get("role") or WorkspaceMembership.Role.VIEWER
+            invited[email.lower()] = email
+
+    with transaction.atomic():
+        # Workspace.save() inserts the OWNER membership for the creator
+        workspace = Workspace.objects.create(
+            name=name,
+            description=description or "",
+            created_by=creator
+        )
+
+        users = User.objects.alias(
+            email_lower=Lower("email")
+        ).filter(email_lower__in=roles).only("id", "email")
+
+        memberships = [
+            WorkspaceMembership(
+                workspace=workspace,
+                user_id=user.id,
+                role=roles[user.email.lower()]
+            )
+            for user in users
+            if user.id != creator.id
+        ]
+
+        WorkspaceMembership.objects.bulk_create(memberships, batch_size=500)
+
+        # bulk_create sends no post_save, so do the signal handlers' work here
+        invalidate_membership_stamps([m.user_id for m in memberships])
+        for membership in memberships:
+            record_activity(
+                workspace.id,
+                ActivityEvent.Verb.MEMBER_ADDED,
+                "membership",
+                membership.pk,
+                actor=creator,
+                user=membership.user_id,
+                role=membership.role
+            )
+
+    found = {user.email.lower() for user in users}
+    unknown = sorted(invited[email] for email in roles if email not in found)
+
+    return workspace, len(memberships), unknown
+
+
+# ---------------- CLONING ---------------- #
+
+def create_clone_job(source, user, name=None, include_history=False):
+    """Create the (empty) target workspace and a pending clone job."""
+    with transaction.atomic():
+        target = Workspace.objects.create(
+            name=name or f"{source.name} (copy)",
+            description=source.description,
+            created_by=user
+        )
+
+        return WorkspaceCloneJob.objects.create(
+            source=source,
+            target=target,
+            requested_by=user,
+            include_history=include_history
+        )
+
+
+def start_clone(source, user, name=None, include_history=False):
+    """
+    Create a clone job and copy the rows in a background thread once the
+    surrounding transaction commits.
+    """
+    with transaction.atomic():
+        job = create_clone_job(source, user, name, include_history)
+
+        transaction.on_commit(
+            lambda: threading.Thread(
+                target=run_clone_job,
+                args=(job.id,),
+                daemon=True
+            ).start()
+        )
+
+    return job
+
+
+def run_clone_job(job_id, on_progress=None):
+    """
+    Copy articles (with their tag links), versions and documents from the
+    job's source workspace into its target.
+
+    Rows are read in primary-key chunks and written with bulk_create; old ids
+    are remapped to new ones in memory, so each chunk costs a fixed number of
+    queries regardless of how many rows it holds. Each chunk commits on its
+    own so progress is visible while the job runs; on failure the partially
+    filled target workspace is deleted.
+    """
+    close_old_connections()
+    job = WorkspaceCloneJob.objects.select_related("source", "target").get(pk=job_id)
+
+    # Source and target may live on different shards
+    source_db = shard_for(job.source_id)
+    target_db = shard_for(job.target_id)
+
+    try:
+        if target_db != DEFAULT_DB_ALIAS:
+            # Tag links need the tags on the target shard too
+            mirror_reference_rows(target_db)
+
+        articles = Article.objects.using(source_db).filter(workspace=job.source)
+        documents = Document.objects.using(source_db).filter(workspace=job.source)
+
+        job.status = WorkspaceCloneJob.Status.RUNNING
+        job.total = articles.count() + documents.count()
+        job.save(update_fields=["status", "total"])
+
+        article_map = {}
+        last_id = 0
+        while True:
+            chunk = list(articles.filter(pk__gt=last_id).order_by("pk")[:CLONE_CHUNK_SIZE])
+            if not chunk:
+                break
+            last_id = chunk[-1].pk
+
+            with transaction.atomic(using=target_db):
+                article_map.update(_clone_articles(chunk, job, source_db, target_db))
+            _advance(job, len(chunk), on_progress)
+
+        last_id = 0
+        while True:
+            chunk = list(documents.filter(pk__gt=last_id).order_by("pk")[:CLONE_CHUNK_SIZE])
+            if not chunk:
+                break
+            last_id = chunk[-1].pk
+
+            with transaction.atomic(using=target_db):
+                Document.objects.using(target_db).bulk_create([
+                    Document(
+                        workspace=job.target,
+                        article_id=article_map.get(document.article_id),
+                        uploaded_by_id=document.uploaded_by_id,
+                        file=document.file.name,
+                        file_size=document.file_size,
+                        mime_type=document.mime_type
+                    )
+                    for document in chunk
+                ])
+            _advance(job, len(chunk), on_progress)
+
+    except Exception as exc:
+        if job.target_id:
+            Workspace.objects.filter(pk=job.target_id).delete()
+        WorkspaceCloneJob.objects.filter(pk=job.pk).update(
+            status=WorkspaceCloneJob.Status.FAILED,
+            error=str(exc),
+            finished_at=timezone.now()
+        )
+        raise
+
+    else:
+        WorkspaceCloneJob.objects.filter(pk=job.pk).update(
+            status=WorkspaceCloneJob.Status.DONE,
+            finished_at=timezone.now()
+        )
+
+    finally:
+        if threading.current_thread() is not threading.main_thread():
+            connections.close_all()
+
+    return job.target
+
+
+def _clone_articles(chunk, job, source_db, target_db):
+    copies = Article.objects.using(target_db).bulk_create([
+        Article(
+            workspace=job.target,
+            created_by_id=article.created_by_id,
+            status=article.status,
+            reviewed_by_id=article.reviewed_by_id,
+            reviewed_at=article.reviewed_at,
+            archived_at=article.archived_at
+        )
+        for article in chunk
+    ])
+    mapping = {
+        article.pk: copy.pk
+        for article, copy in zip(chunk, copies)
+    }
+
+    Through = Article.tags.through
+    Through.objects.using(target_db).bulk_create([
+        Through(article_id=mapping[article_id], tag_id=tag_id)
+        for article_id, tag_id in Through.objects.using(source_db).filter(
+            article_id__in=mapping
+        ).values_list("article_id", "tag_id")
+    ])
+
+    versions = ArticleVersion.objects.using(source_db).filter(article_id__in=mapping)
+    if not job.include_history:
+        versions = versions.filter(is_current=True)
+
+    ArticleVersion.objects.using(target_db).bulk_create(
+        [
+            ArticleVersion(
+                article_id=mapping[version.article_id],
+                title=version.title,
+                content=version.content,
+                version_number=version.version_number,
+                edited_by_id=version.edited_by_id,
+                is_current=version.is_current,
+                change_summary=version.change_summary,
+                drive_file_id=version.drive_file_id,
+                drive_link=version.drive_link,
+                drive_missing_at=version.drive_missing_at,
+                # Shared with the source, like document files; stored
+                # versions are never modified
+                file=version.file.name
+            )
+            for version in versions.iterator(chunk_size=CLONE_CHUNK_SIZE)
+        ],
+        batch_size=CLONE_CHUNK_SIZE
+    )
+    refresh_current_versions(
+        Article.objects.using(target_db).filter(pk__in=mapping.values()),
+        batch_size=CLONE_CHUNK_SIZE
+    )
+
+    return mapping
+
+
+def _advance(job, count, on_progress):
+    job.processed += count
+    WorkspaceCloneJob.objects.filter(pk=job.pk).update(processed=job.processed)
+    if on_progress:
+        on_progress(job.processed, job.total)
@@ -0,0 +1,319 @@
+"""
+Shard placement and online workspace moves (routing lives in
+config.sharding).
+
+``move_workspace`` copies a workspace's rows to the target database in
+primary-key chunks while the workspace stays writable, then marks it
+MOVING (the router refuses writes), copies whatever changed meanwhile,
+switches the directory entry and deletes the source copy in chunks.
+
+Other processes route by their cached directory entry, so each step
+waits until no process can still be using the previous one
+(config.sharding.directory_lag): a minute per move with the per-process
+cache, the ``settle`` time with a shared one.
+"""
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from config.sharding import (
+    ACTIVE, MOVING, all_aliases, directory_lag, forget_shards, id_block, shard_for
+)
+from .models import WorkspaceShard
+
+MOVE_CHUNK_SIZE = 1000
+SETTLE_SECONDS = 2.0
+
+
+def _table(label, lookup, changed=None):
+    return {"label": label, "lookup": lookup, "changed": changed}
+
+
+# Parents before children. ``changed`` selects rows modified since a time
+# (None: rows are only ever inserted or deleted).
+TABLES = [
+    _table("articles.Article", "workspace_id", "updated_at__gte"),
+    _table("articles.Article_tags", "article__workspace_id"),
+    _table("articles.ArticleVersion", "article__workspace_id", "updated_at__gte"),
+    _table("articles.RenderedVersion", "workspace_id", "rendered_at__gte"),
+    _table("articles.Document", "workspace_id"),
+    _table("articles.ArticleSignature", "workspace_id", "updated_at__gte"),
+    _table("articles.VersionRetentionPolicy", "workspace_id", "updated_at__gte"),
+]
+
+
+def _model(label):
+    return apps.get_model(label)
+
+
+def _rows(table, workspace_id, alias):
+    model = _model(table["label"])
+    return model._base_manager.using(alias).filter(
+        **{table["lookup"]: workspace_id}
+    ).order_by("pk")
+
+
+# ---------------- PLACEMENT ---------------- #
+
+def place_workspace(workspace):
+    """Put a new workspace on the shard holding the fewest workspaces."""
+    shards = settings.DATABASE_SHARDS
+    if not shards:
+        return None
+
+    load = dict(
+        WorkspaceShard.objects.filter(alias__in=shards).values("alias").annotate(
+            n=Count("pk")
+        ).values_list("alias", "n")
+    )
+    alias = min(shards, key=lambda name: load.get(name, 0))
+    WorkspaceShard.objects.create(workspace=workspace, alias=alias)
+    forget_shards([workspace.pk])
+    return alias
+
+
+def _autoincrement_tables():
+    for table in TABLES:
+        model = _model(table["label"])
+        if model._meta.pk.get_internal_type().endswith("AutoField"):
+            yield model._meta.db_table, model._meta.pk.column
+
+
+def reserve_id_block(alias):
+    """
+    Start the shard's id sequences at its block (shardN: N * SHARD_ID_BLOCK)
+    so ids stay unique across shards and ``get_by_pk`` knows where to look.
+
+    Moved rows keep their ids. PostgreSQL sequences ignore them; SQLite
+    numbers new rows above the largest id in the table, so on the SQLite
+    stand-ins a database that received a workspace can hand out ids from
+    the source's block.
+    """
+    index = all_aliases().index(alias)
+    if index == 0:
+        return
+
+    start = index * id_block()
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        for name, column in _autoincrement_tables():
+            if connection.vendor == "sqlite":
+                cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [name])
+                row = cursor.fetchone()
+                if row is None:
+                    cursor.execute(
+                        "INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)",
+                        [name, start]
+                    )
+                elif row[0] < start:
+                    cursor.execute(
+                        "UPDATE sqlite_sequence SET seq = %s WHERE name = %s",
+                        [start, name]
+                    )
+            elif connection.vendor == "postgresql":
+                cursor.execute(
+                    "SELECT setval(pg_get_serial_sequence(%s, %s), GREATEST(%s, "
+                    f"(SELECT COALESCE(MAX({connection.ops.quote_name(column)}), 0) "
+                    f"FROM {connection.ops.quote_name(name)})))",
+                    [name, column, start]
+                )
+
+
+# ---------------- REFERENCE TABLES ---------------- #
+
+def mirror_reference_rows(alias, batch_size=MOVE_CHUNK_SIZE):
+    """Copy every reference row (tags) from default onto ``alias``."""
+    for label in settings.SHARD_REFERENCE_MODELS:
+        model = _model(label)
+        rows = model._base_manager.using(DEFAULT_DB_ALIAS).order_by("pk")
+        last_id = 0
+        while True:
+            chunk = list(rows.filter(pk__gt=last_id)[:batch_size])
+            if not chunk:
+                break
+            last_id = chunk[-1].pk
+            _upsert(model, chunk, alias)
+
+
+def mirror_reference_row(instance, deleted=False):
+    model = type(instance)
+    for alias in settings.DATABASE_SHARDS:
+        if deleted:
+            model._base_manager.using(alias).filter(pk=instance.pk).delete()
+        else:
+            _upsert(model, [instance], alias)
+
+
+# ---------------- COPY / PURGE ---------------- #
+
+def _upsert(model, objs, alias):
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    # bulk_create would stamp auto_now / auto_now_add fields with the
+    # current time; keep the source values
+    stamped = [
+        field for field in fields
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+    ]
+    originals = [[getattr(obj, field.attname) for field in stamped] for obj in objs]
+
+    if fields:
+        kwargs = {
+            "update_conflicts": True,
+            "unique_fields": [model._meta.pk.name],
+            "update_fields": [field.name for field in fields],
+        }
+    else:
+        kwargs = {"ignore_conflicts": True}
+    model._base_manager.using(alias).bulk_create(objs, **kwargs)
+
+    if stamped:
+        for obj, values in zip(objs, originals):
+            for field, value in zip(stamped, values):
+                setattr(obj, field.attname, value)
+        model._base_manager.using(alias).bulk_update(objs, [field.name for field in stamped])
+
+
+def _copy(table, workspace_id, source, target, batch_size, after=0, since=None):
+    """Copy rows (id > ``after``, changed since ``since``). Returns the last id."""
+    model = _model(table["label"])
+    rows = _rows(table, workspace_id, source)
+    if since is not None:
+        rows = rows.filter(**{table["changed"]: since})
+
+    last_id = after
+    copied = 0
+    while True:
+        chunk = list(rows.filter(pk__gt=last_id)[:batch_size])
+        if not chunk:
+            break
+        last_id = chunk[-1].pk
+        with transaction.atomic(using=target):
+            _upsert(model, chunk, target)
+        copied += len(chunk)
+
+    return last_id, copied
+
+
+def _delete_missing(table, workspace_id, source, target, batch_size):
+    """Delete target rows whose source row was deleted during the copy."""
+    model = _model(table["label"])
+    target_ids = _rows(table, workspace_id, target).values_list("pk", flat=True)
+    source_rows = model._base_manager.using(source)
+
+    deleted = 0
+    last_id = 0
+    while True:
+        ids = list(target_ids.filter(pk__gt=last_id)[:batch_size])
+        if not ids:
+            break
+        last_id = ids[-1]
+        present = set(source_rows.filter(pk__in=ids).values_list("pk", flat=True))
+        gone = [pk for pk in ids if pk not in present]
+        if gone:
+            deleted += model._base_manager.using(target).filter(pk__in=gone).delete()[0]
+
+    return deleted
+
+
+def purge_workspace(workspace_id, alias, batch_size=MOVE_CHUNK_SIZE):
+    """Delete a workspace's sharded rows from ``alias``, children first."""
+    deleted = 0
+    for table in reversed(TABLES):
+        model = _model(table["label"])
+        ids = _rows(table, workspace_id, alias).values_list("pk", flat=True)
+        while True:
+            chunk = list(ids[:batch_size])
+            if not chunk:
+                break
+            with transaction.atomic(using=alias):
+                deleted += model._base_manager.using(alias).filter(pk__in=chunk).delete()[0]
+    return deleted
+
+
+# ---------------- MOVE ---------------- #
+
+def _set_directory(workspace_id, alias, state):
+    WorkspaceShard.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+        workspace_id=workspace_id,
+        defaults={"alias": alias, "state": state}
+    )
+    forget_shards([workspace_id])
+
+
+def move_workspace(workspace_id, target, batch_size=MOVE_CHUNK_SIZE,
+                   settle=SETTLE_SECONDS, on_progress=None):
+    """
+    Move a workspace's sharded rows to the ``target`` database. The
+    workspace stays readable throughout and writable except during the
+    catch-up phase, which lasts at least ``directory_lag()``. Returns the
+    source alias.
+    """
+    source = shard_for(workspace_id)
+    if target not in all_aliases():
+        raise ValueError(f"Unknown database {target!r}")
+    if target == source:
+        raise ValueError(f"Workspace {workspace_id} is already on {target}")
+
+    def report(phase, table, count):
+        if on_progress and count:
+            on_progress(phase, table["label"], count)
+
+    mirror_reference_rows(target, batch_size)
+    started = timezone.now()
+    moved = False
+
+    try:
+        # 1. Bulk copy while the workspace stays writable
+        marks = {}
+        for table in TABLES:
+            marks[table["label"]], copied = _copy(
+                table, workspace_id, source, target, batch_size
+            )
+            report("copy", table, copied)
+
+        # 2. Freeze writes, wait until every process has seen that and
+        # in-flight transactions have finished, then copy what changed
+        # during step 1
+        _set_directory(workspace_id, source, WorkspaceShard.State.MOVING)
+        time.sleep(max(settle, directory_lag(ACTIVE)))
+        # An entry cached from a read that raced the update is stale
+        forget_shards([workspace_id])
+
+        try:
+            for table in TABLES:
+                _, copied = _copy(
+                    table, workspace_id, source, target, batch_size,
+                    after=marks[table["label"]]
+                )
+                if table["changed"]:
+                    _, changed = _copy(
+                        table, workspace_id, source, target, batch_size, since=started
+                    )
+                    copied += changed
+                report("catch-up", table, copied)
+
+            for table in reversed(TABLES):
+                report("catch-up", table, _delete_missing(
+                    table, workspace_id, source, target, batch_size
+                ))
+        except Exception:
+            _set_directory(workspace_id, source, WorkspaceShard.State.ACTIVE)
+            raise
+
+        # 3. Cut over
+        _set_directory(workspace_id, target, WorkspaceShard.State.ACTIVE)
+        moved = True
+
+    finally:
+        if not moved:
+            purge_workspace(workspace_id, target, batch_size)
+
+    # 4. Drop the old copy once no process reads from it any more
+    time.sleep(directory_lag(MOVING))
+    forget_shards([workspace_id])
+    purge_workspace(workspace_id, source, batch_size)
+    return source
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+
+from config.sharding import forget_shards, shard_for
+from .activity import record_activity
+from .models import ActivityEvent, Workspace, WorkspaceMembership
+from .permissions import invalidate_membership_stamps
+from .sharding import place_workspace, purge_workspace, reserve_id_block
+
+
+@receiver(post_save, sender=WorkspaceMembership)
+@receiver(post_delete, sender=WorkspaceMembership)
+def membership_changed(sender, instance, **kwargs):
+    # Access tokens minted before this change now carry a stale stamp
+    invalidate_membership_stamps([instance.user_id])
+
+    if kwargs["signal"] is post_delete:
+        verb = ActivityEvent.Verb.MEMBER_REMOVED
+    elif kwargs.get("created"):
+        verb = ActivityEvent.Verb.MEMBER_ADDED
+    else:
+        verb = ActivityEvent.Verb.MEMBER_ROLE_CHANGED
+
+    record_activity(
+        instance.workspace_id,
+        verb,
+        "membership",
+        instance.pk,
+        user=instance.user_id,
+        role=instance.role
+    )
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, **kwargs):
+    # Tokens of a deactivated or deleted user must stop working
+    invalidate_membership_stamps([instance.pk])
+
+
+@receiver(post_save, sender=Workspace)
+def workspace_created(sender, instance, created, **kwargs):
+    if created:
+        place_workspace(instance)
+
+
+@receiver(pre_delete, sender=Workspace)
+def workspace_deleted(sender, instance, **kwargs):
+    # The delete cascade only reaches rows on default; clear the shard copy
+    alias = shard_for(instance.pk)
+    if alias != DEFAULT_DB_ALIAS:
+        purge_workspace(instance.pk, alias)
+    forget_shards([instance.pk])
+
+
+@receiver(post_migrate)
+def shard_migrated(sender, using, **kwargs):
+    if sender.name == "workspaces" and using in settings.DATABASE_SHARDS:
+        reserve_id_block(using)
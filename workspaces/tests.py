@@ -1,3 +1,359 @@
-from django.test import TestCase
+import gzip
+import json
+import multiprocessing
+import tempfile
+import time
+from unittest import mock, skipIf, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connections
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.articles import models as article_models
+from apps.articles.models import Article, ArticleVersion, Document
+from apps.users.authentication import WorkspaceJWTAuthentication, WorkspaceRefreshToken
+from config import batch, sharding
+from config.sharding import WorkspaceMoving, all_aliases, shard_for
+from . import services
+from .activity import ActivityBuffer, month_bucket
+from .models import ActivityEvent, Workspace, WorkspaceCloneJob, WorkspaceMembership
+from .sharding import move_workspace
+
+User = get_user_model()
+
+
+def _in_memory():
+    return any(connections[alias].is_in_memory_db() for alias in all_aliases())
+
+
+def _write_articles(workspace_id, user_id, ready, stop, results):
+    """Another process: create articles in the workspace until ``stop`` is set."""
+    # Connections inherited from the parent must not be used here
+    for connection in connections.all(initialized_only=True):
+        connection.connection = None
+    shard_for(workspace_id)  # caches the directory entry from before the move
+    ready.set()
+
+    created = []
+    refused = 0
+    while not stop.is_set():
+        try:
+            created.append(
+                Article.objects.create(workspace_id=workspace_id, created_by_id=user_id).pk
+            )
+        except WorkspaceMoving:
+            refused += 1
+            time.sleep(0.02)
+        time.sleep(0.005)
+    results.put((created, refused))
+
+
+@skipUnless(settings.DATABASE_SHARDS, "needs SQLITE_SHARD_PATHS or POSTGRES_SHARD_HOSTS")
+@skipIf(_in_memory(), "the writer process needs file-backed test databases")
+class MoveWorkspaceTests(TransactionTestCase):
+    databases = "__all__"
+
+    @mock.patch.object(sharding, "MOVING_TTL", 0.2)
+    @mock.patch.object(sharding, "DIRECTORY_TTL", 1.5)
+    def test_writes_from_another_process_survive_a_move(self):
+        user = User.objects.create_user("mover", "mover@example.com", "password")
+        workspace = Workspace.objects.create(name="Moving", created_by=user)
+        for _ in range(20):
+            Article.objects.create(workspace=workspace, created_by=user)
+        source = shard_for(workspace.pk)
+        target = next(alias for alias in all_aliases() if alias != source)
+
+        context = multiprocessing.get_context("fork")
+        ready, stop, results = context.Event(), context.Event(), context.Queue()
+        writer = context.Process(
+            target=_write_articles, args=(workspace.pk, user.pk, ready, stop, results)
+        )
+        writer.start()
+        try:
+            ready.wait(10)
+            time.sleep(0.2)
+            move_workspace(workspace.pk, target, batch_size=7, settle=0.1)
+            # Long enough for the writer to pick up the new entry
+            time.sleep(sharding.MOVING_TTL + 0.5)
+        finally:
+            stop.set()
+        created, refused = results.get(timeout=30)
+        writer.join()
+
+        self.assertTrue(refused, "the writer never saw the move")
+        on_target = Article.objects.using(target).filter(pk__in=created)
+        self.assertEqual(set(on_target.values_list("pk", flat=True)), set(created))
+        self.assertFalse(Article.objects.using(source).filter(workspace_id=workspace.pk).exists())
+
+    @mock.patch.object(sharding, "MOVING_TTL", 0.1)
+    @mock.patch.object(sharding, "DIRECTORY_TTL", 0.1)
+    def test_versions_edited_during_the_copy_are_caught_up(self):
+        user = User.objects.create_user("editor", "editor@example.com", "password")
+        workspace = Workspace.objects.create(name="Edited", created_by=user)
+        article = Article.objects.create(workspace=workspace, created_by=user)
+        first = ArticleVersion.objects.create(
+            article=article, title="First", content="Text", version_number=1, edited_by=user
+        )
+        source = shard_for(workspace.pk)
+        target = next(alias for alias in all_aliases() if alias != source)
+
+        def edit_versions(phase, label, count):
+            # The versions are copied; the article row is not touched again
+            if phase == "copy" and label == "articles.ArticleVersion":
+                first.change_summary = "Reworded"
+                first.save()
+                ArticleVersion.objects.create(
+                    article=article, title="Second", content="Text", version_number=2,
+                    edited_by=user
+                )
+
+        move_workspace(workspace.pk, target, settle=0.1, on_progress=edit_versions)
+
+        moved = ArticleVersion.objects.using(target).filter(article=article)
+        self.assertEqual(
+            sorted(moved.values_list("version_number", "is_current", "change_summary")),
+            [(1, False, "Reworded"), (2, True, "")]
+        )
+
+
+class CloneWorkspaceTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user("owner", "owner@example.com", "password")
+        self.workspace = Workspace.objects.create(name="Docs", created_by=self.user)
+        article = Article.objects.create(workspace=self.workspace, created_by=self.user)
+        for number in (1, 2):
+            ArticleVersion.objects.create(
+                article=article,
+                title=f"Title {number}",
+                content="Text",
+                version_number=number,
+                edited_by=self.user,
+                is_current=number == 2,
+                file=f"versions/article_{article.pk}_{number}.txt"
+            )
+        Document.objects.create(
+            workspace=self.workspace,
+            uploaded_by=self.user,
+            file="documents/spec.pdf",
+            file_size=10,
+            mime_type="application/pdf"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def clone(self, include_history):
+        response = self.client.post(
+            f"/api/workspaces/{self.workspace.pk}/clone/",
+            {"include_history": include_history}
+        )
+        self.assertEqual(response.status_code, 202)
+        job = WorkspaceCloneJob.objects.get(pk=response.data["job_id"])
+        # It would close the test's connection, which is inside a transaction
+        with mock.patch.object(services, "close_old_connections"):
+            services.run_clone_job(job.pk)
+        return job
+
+    def test_form_false_clones_current_versions_only(self):
+        job = self.clone("false")
+        self.assertFalse(job.include_history)
+        versions = ArticleVersion.objects.filter(article__workspace_id=job.target_id)
+        self.assertEqual(list(versions.values_list("version_number", flat=True)), [2])
+        self.assertEqual(Document.objects.filter(workspace_id=job.target_id).count(), 1)
+
+    def test_form_true_clones_history(self):
+        job = self.clone("true")
+        self.assertTrue(job.include_history)
+        self.assertEqual(
+            ArticleVersion.objects.filter(article__workspace_id=job.target_id).count(), 2
+        )
+
+    def test_clone_keeps_stored_files(self):
+        ArticleVersion.objects.filter(version_number=1).update(drive_missing_at=timezone.now())
+        job = self.clone("true")
+
+        def stored(workspace_id):
+            return sorted(
+                ArticleVersion.objects.filter(
+                    article__workspace_id=workspace_id
+                ).values_list("version_number", "file", "drive_missing_at")
+            )
+        self.assertEqual(stored(job.target_id), stored(self.workspace.pk))
+
+    def test_invalid_include_history_is_rejected(self):
+        response = self.client.post(
+            f"/api/workspaces/{self.workspace.pk}/clone/", {"include_history": "maybe"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class OnboardWorkspaceTests(TestCase):
+
+    def test_emails_match_regardless_of_case(self):
+        creator = User.objects.create_user("creator", "creator@example.com", "password")
+        invitee = User.objects.create_user("invitee", "Invitee@Example.com", "password")
+
+        workspace, added, unknown = services.onboard_workspace(creator, "Docs", members=[
+            {"email": "invitee@example.COM", "role": WorkspaceMembership.Role.EDITOR},
+            {"email": "Nobody@example.com"},
+        ])
+
+        self.assertEqual(added, 1)
+        self.assertEqual(unknown, ["Nobody@example.com"])
+        self.assertEqual(
+            WorkspaceMembership.objects.get(workspace=workspace, user=invitee).role,
+            WorkspaceMembership.Role.EDITOR
+        )
+
+    def test_malformed_payloads_are_rejected(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user("creator", "c@example.com", "password"))
+
+        def onboard(payload):
+            return client.post("/api/workspaces/onboard/", payload, format="json")
+
+        for payload in (
+            {"members": []},
+            {"name": "Docs", "members": [{"email": 123}]},
+            {"name": "Docs", "members": [{"email": "a@example.com", "role": "OWNER"}]},
+            {"name": "Docs", "members": ["a@example.com"]},
+            {"name": "Docs", "members": {"email": "a@example.com"}},
+        ):
+            with self.subTest(payload=payload):
+                self.assertEqual(onboard(payload).status_code, 400)
+        self.assertFalse(Workspace.objects.exists())
+
+        response = onboard({"name": "Docs", "members": [{"email": "Nobody@example.com"}]})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["unknown_emails"], ["Nobody@example.com"])
+
+
+class BatchTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("batcher", "batcher@example.com", "password")
+        self.workspace = Workspace.objects.create(name="Docs", created_by=self.user)
+        token = WorkspaceRefreshToken.for_user(self.user).access_token
+        self.client.defaults["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+
+    def post(self, operations, **options):
+        return self.client.post(
+            "/api/batch/", {"operations": operations, **options}, content_type="application/json"
+        )
+
+    def test_batch_is_authenticated_once(self):
+        authenticate = WorkspaceJWTAuthentication.authenticate
+        with mock.patch.object(
+            WorkspaceJWTAuthentication, "authenticate", autospec=True, side_effect=authenticate
+        ) as spy:
+            response = self.post([
+                {"path": "/api/articles/"},
+                {"path": f"/api/articles/async/?workspace={self.workspace.pk}"},
+                {"path": f"/api/articles/async/?workspace={self.workspace.pk}"},
+            ])
+
+        self.assertEqual([r["status"] for r in response.json()["results"]], [200, 200, 200])
+        self.assertEqual(spy.call_count, 1)
+
+    def test_roles_are_refreshed_after_workspace_changes(self):
+        refreshed = []
+
+        def workspace_roles_for(user_id):
+            refreshed.append(WorkspaceMembership.objects.filter(user_id=user_id).count())
+            return {}
+
+        with mock.patch.object(batch, "workspace_roles_for", side_effect=workspace_roles_for):
+            response = self.post([
+                {"path": "/api/articles/"},
+                {"method": "POST", "path": "/api/workspaces/create/", "body": {"name": "New"}},
+                {"path": "/api/articles/"},
+            ])
+
+        self.assertEqual([r["status"] for r in response.json()["results"]], [200, 200, 200])
+        # Only after the workspace was created, which made the user its owner
+        self.assertEqual(refreshed, [2])
+
+    def test_atomic_is_parsed_as_a_boolean(self):
+        operations = [{"path": "/api/articles/"}]
+
+        self.assertFalse(self.post(operations, atomic="false").json()["atomic"])
+        self.assertTrue(self.post(operations, atomic="true").json()["atomic"])
+        self.assertEqual(self.post(operations, atomic="sometimes").status_code, 400)
+
+
+class ActivityTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user("owner", "owner@example.com", "password")
+        self.workspace = Workspace.objects.create(name="Docs", created_by=self.user)
+        # The interval is long enough that only the test flushes
+        self.buffer = ActivityBuffer(flush_size=3, interval=3600, max_events=4)
+
+    def event(self, target_id, bucket=None):
+        now = timezone.now()
+        return ActivityEvent(
+            bucket=bucket or month_bucket(now),
+            workspace=self.workspace,
+            verb=ActivityEvent.Verb.APPROVED,
+            target_type="article",
+            target_id=target_id,
+            created_at=now
+        )
+
+    def written(self):
+        return list(ActivityEvent.objects.order_by("id").values_list("target_id", flat=True))
+
+    def test_buffer_writes_once_full(self):
+        self.buffer.append(self.event(1))
+        self.buffer.append(self.event(2))
+        self.assertEqual(self.written(), [])
+
+        self.buffer.append(self.event(3))
+        self.assertEqual(self.written(), [1, 2, 3])
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_failed_write_is_retried(self):
+        self.buffer.events = [self.event(1), self.event(2)]
+        locked = OperationalError("database table is locked")
+        with mock.patch.object(ActivityEvent.objects, "bulk_create", side_effect=locked):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.buffer.events.append(self.event(3))
+
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(self.written(), [1, 2, 3])
+
+    def test_oldest_events_go_when_the_buffer_overflows(self):
+        self.buffer.events = [self.event(n) for n in range(1, 6)]
+        with mock.patch.object(ActivityEvent.objects, "bulk_create", side_effect=OperationalError):
+            self.buffer.flush()
+
+        self.assertEqual([e.target_id for e in self.buffer.events], [2, 3, 4, 5])
+
+    def test_archive_activity_exports_and_drops_old_months(self):
+        ActivityEvent.objects.bulk_create([self.event(1, 202301), self.event(2, 202302)])
+        recent = self.event(3)
+        recent.save()
+        output = tempfile.mkdtemp()
+
+        call_command("archive_activity", before=202302, output=output, drop=True, stdout=mock.Mock())
+
+        with gzip.open(f"{output}/activity-202301.jsonl.gz", "rt") as archived:
+            self.assertEqual([json.loads(line)["target_id"] for line in archived], [1])
+        self.assertEqual(self.written(), [2, recent.target_id])
+
+    def test_article_events_follow_the_article_database(self):
+        article = Article.objects.create(workspace=self.workspace, created_by=self.user)
+        with mock.patch.object(article_models, "record_activity") as record:
+            article.approve(self.user)
+            article.archive(self.user)
+
+        self.assertEqual(
+            [call.kwargs["using"] for call in record.call_args_list],
+            [article._state.db, article._state.db]
+        )
@@ -4,4 +4,8 @@ from .views import create_workspace
 from . import views
 urlpatterns = [
     path('create/', create_workspace, name='create-workspace'),
+    path('onboard/', views.onboard_workspace, name='onboard-workspace'),
+    path('<int:pk>/clone/', views.clone_workspace, name='clone-workspace'),
+    path('clone-jobs/<int:pk>/', views.clone_job_status, name='clone-job-status'),
+    path('<int:pk>/activity/', views.workspace_activity, name='workspace-activity'),
 ]
\ No newline at end of file
@@ -1,7 +1,13 @@
 from rest_framework.decorators import api_view
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import BooleanField
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Workspace, WorkspaceMembership
+from .activity import workspace_feed
+from .models import Workspace, WorkspaceCloneJob
+from .permissions import is_workspace_member
+from .serializers import OnboardWorkspaceSerializer
+from . import services
 
 
 @api_view(['POST'])
@@ -15,11 +21,125 @@ def create_workspace(request):
         created_by=request.user
     )
 
-    # Make creator ADMIN
-    WorkspaceMembership.objects.create(
-        user=request.user,
-        workspace=workspace,
-        role='ADMIN'
+    # Workspace.save() already made the creator OWNER
+
+    return Response({"message": "Workspace created"})
+
+
+@api_view(['POST'])
+def onboard_workspace(request):
+    serializer = OnboardWorkspaceSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    data = serializer.validated_data
+
+    workspace, added, unknown = services.onboard_workspace(
+        creator=request.user,
+        name=data['name'],
+        description=data['description'],
+        members=data['members']
+    )
+
+    return Response(
+        {
+            "workspace_id": workspace.id,
+            "members_added": added,
+            "unknown_emails": unknown,
+        },
+        status=status.HTTP_201_CREATED
+    )
+
+
+@api_view(['POST'])
+def clone_workspace(request, pk):
+    source = Workspace.objects.filter(pk=pk).first()
+
+    if source is None or not is_workspace_member(request.user, source.pk):
+        return Response(
+            {"error": "Workspace not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    try:
+        # Accepts JSON booleans and form values such as "false" or "0"
+        include_history = BooleanField().to_internal_value(
+            request.data.get('include_history', False)
+        )
+    except ValidationError:
+        return Response(
+            {"error": "include_history must be a boolean"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    job = services.start_clone(
+        source,
+        request.user,
+        name=request.data.get('name'),
+        include_history=include_history
+    )
+
+    return Response(
+        {"job_id": job.id, "workspace_id": job.target_id},
+        status=status.HTTP_202_ACCEPTED
     )
 
-    return Response({"message": "Workspace created"})
\ No newline at end of file
+
+@api_view(['GET'])
+def clone_job_status(request, pk):
+    job = WorkspaceCloneJob.objects.filter(
+        pk=pk,
+        requested_by_id=request.user.id
+    ).first()
+
+    if job is None:
+        return Response(
+            {"error": "Job not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    return Response({
+        "job_id": job.id,
+        "status": job.status,
+        "workspace_id": job.target_id,
+        "processed": job.processed,
+        "total": job.total,
+        "error": job.error,
+        "finished_at": job.finished_at,
+    })
+
+
+@api_view(['GET'])
+def workspace_activity(request, pk):
+    if not is_workspace_member(request.user, pk):
+        return Response(
+            {"error": "Workspace not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    try:
+        before = request.query_params.get('before')
+        before = int(before) if before else None
+        limit = min(int(request.query_params.get('limit', 50)), 200)
+    except ValueError:
+        return Response(
+            {"error": "before and limit must be integers"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    events, cursor = workspace_feed(pk, before=before, limit=max(limit, 1))
+
+    return Response({
+        "results": [
+            {
+                "id": event.id,
+                "actor": event.actor_id,
+                "verb": event.verb,
+                "target_type": event.target_type,
+                "target_id": event.target_id,
+                "data": event.data,
+                "created_at": event.created_at,
+            }
+            for event in events
+        ],
+        "next": cursor,
+    })